@@ -0,0 +1,75 @@
+from __future__ import annotations
+import argparse
+import struct
+from time import perf_counter
+from events import _Event, MessageEvent, WhisperEvent, SwitchEvent
+
+
+def legacy_serialise(event: MessageEvent) -> bytes:
+    # the per-call format string codec events.py used before the struct.Struct rewrite
+    return struct.pack("!I", event.type) + struct.pack(
+        f"!I{len(event.name)}sI{len(event.message)}s",
+        len(event.name),
+        event.name.encode(),
+        len(event.message),
+        event.message.encode(),
+    )
+
+
+def legacy_deserialise(data: bytes) -> MessageEvent:
+    data = data[4:]
+    name_length = struct.unpack("!I", data[:4])[0]
+    name = struct.unpack(f"{name_length}s", data[4 : 4 + name_length])[0].decode()
+    message_length = struct.unpack("!I", data[4 + name_length : 8 + name_length])[0]
+    message = struct.unpack(
+        f"{message_length}s",
+        data[8 + name_length : 8 + name_length + message_length],
+    )[0].decode()
+    return MessageEvent(name=name, message=message)
+
+
+CASES = {
+    "message-short": MessageEvent(name="alice", message="hello there"),
+    "message-4k": MessageEvent(name="alice", message="x" * 4096),
+    "message-unicode": MessageEvent(name="zoë", message="こんにちは 🌏 " * 8),
+    "whisper": WhisperEvent(name="alice", target="bob", message="psst, over here"),
+    "switch": SwitchEvent(name="alice", channel="channel_abc"),
+}
+
+
+def rate(fn, arg, iterations: int) -> float:
+    start = perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return iterations / (perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="event codec benchmark")
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--cases", nargs="+", choices=tuple(CASES), default=list(CASES))
+    args = parser.parse_args()
+
+    print(f"{'case':<16} {'op':<12} {'ops/s':>12}")
+    for name in args.cases:
+        event = CASES[name]
+        data = _Event.serialise(event)
+        assert _Event.deserialise(data) == event
+        rows = [
+            ("serialise", _Event.serialise, event),
+            ("frame", _Event.frame, event),
+            ("deserialise", _Event.deserialise, data),
+        ]
+        if isinstance(event, MessageEvent) and event.name.isascii() and event.message.isascii():
+            # the legacy codec measured character counts, so it is only valid for ASCII
+            assert legacy_serialise(event) == data
+            rows += [
+                ("legacy-ser", legacy_serialise, event),
+                ("legacy-de", legacy_deserialise, data),
+            ]
+        for op, fn, arg in rows:
+            print(f"{name:<16} {op:<12} {rate(fn, arg, args.iterations):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
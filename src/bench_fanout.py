@@ -0,0 +1,73 @@
+from __future__ import annotations
+import argparse
+import struct
+import threading
+from socket import socketpair, socket
+from time import perf_counter
+from events import _Event, MessageEvent
+
+
+def fanout_per_recipient(event, sinks) -> None:
+    # the old broadcast path: serialise and prefix again for every recipient
+    for sink in sinks:
+        message = _Event.serialise(event)
+        sink(struct.pack(f"!I", len(message)) + message)
+
+
+def fanout_shared_frame(event, sinks) -> None:
+    frame = _Event.frame(event)
+    for sink in sinks:
+        sink(frame)
+
+
+def null_sinks(count: int) -> tuple[list, list, list]:
+    return [len] * count, [], []
+
+
+def socket_sinks(count: int) -> tuple[list, list, list]:
+    # drain each pair from a reader thread so sends never block on a full window
+    pairs = [socketpair() for _ in range(count)]
+
+    def drain(sock: socket) -> None:
+        while sock.recv(1 << 16):
+            pass
+
+    readers = [threading.Thread(target=drain, args=(r,), daemon=True) for _, r in pairs]
+    for reader in readers:
+        reader.start()
+    return [w.sendall for w, _ in pairs], pairs, readers
+
+
+def run(fanout, recipients: int, broadcasts: int, sink_kind: str) -> float:
+    sinks, pairs, readers = (socket_sinks if sink_kind == "socket" else null_sinks)(recipients)
+    event = MessageEvent(name="bench", message="x" * 64)
+    start = perf_counter()
+    for _ in range(broadcasts):
+        fanout(event, sinks)
+    elapsed = perf_counter() - start
+    for w, _ in pairs:
+        w.close()
+    for reader in readers:
+        reader.join()
+    for _, r in pairs:
+        r.close()
+    return recipients * broadcasts / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="broadcast fan-out microbenchmark")
+    parser.add_argument("--recipients", type=int, nargs="+", default=[8, 100, 1000])
+    parser.add_argument("--frames", type=int, default=200_000, help="frames written per run")
+    parser.add_argument("--sink", choices=("null", "socket"), default="null")
+    args = parser.parse_args()
+
+    print(f"{'recipients':>10} {'before f/s':>14} {'after f/s':>14} {'speedup':>8}")
+    for recipients in args.recipients:
+        broadcasts = max(1, args.frames // recipients)
+        before = run(fanout_per_recipient, recipients, broadcasts, args.sink)
+        after = run(fanout_shared_frame, recipients, broadcasts, args.sink)
+        print(f"{recipients:>10} {before:>14,.0f} {after:>14,.0f} {after / before:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
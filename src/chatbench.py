@@ -0,0 +1,417 @@
+from __future__ import annotations
+from dataclasses import dataclass, field, asdict
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from chatserver import raise_fd_limit
+from events import MessageEvent, QuitEvent, WhisperEvent, ListEvent, SwitchEvent, JoinEvent, KickEvent, ShutdownEvent
+from chatlib import ChatConnection, HandshakeError, connect
+
+
+# traffic a seated client generates, picked per action by weight
+OPERATIONS = ("chat", "whisper", "switch", "list", "churn")
+# chat and whisper messages start with this marker and the send time, so every
+# recipient can work out the end-to-end latency
+STAMP = "@"
+
+
+@dataclass(kw_only=True)
+class Channel:
+    name: str
+    port: int
+    capacity: int
+    large: bool = False
+
+
+@dataclass(kw_only=True, eq=False)
+class Client:
+    id: int
+    name: str
+    channel: Channel
+    connection: ChatConnection | None = None
+    seated: bool = False
+    # what the next JoinEvent completes and when it started: ("join", t), ("switch", t)
+    joining: tuple[str, int] | None = None
+    list_started: int | None = None
+
+
+@dataclass(kw_only=True)
+class Bench:
+    channels: list[Channel]
+    mix: dict[str, float]
+    rate: float
+    size: int
+    host: str
+    # codecs each client offers in its handshake; empty sends plain frames
+    codecs: tuple[str, ...] = ()
+    clients: list[Client] = field(default_factory=list)
+    # seated clients per channel, for picking whisper targets
+    members: dict[str, set[Client]] = field(default_factory=dict)
+    running: bool = True
+    measuring: bool = False
+    latencies: dict[str, list[int]] = field(default_factory=lambda: {op: [] for op in ("chat", "whisper", "list", "switch", "join")})
+    sent: dict[str, int] = field(default_factory=lambda: dict.fromkeys(OPERATIONS, 0))
+    delivered: int = 0
+    failures: int = 0
+
+    def record(self, op: str, started: int) -> None:
+        if self.measuring:
+            self.latencies[op].append(time.perf_counter_ns() - started)
+
+    def seat(self, client: Client, seated: bool) -> None:
+        client.seated = seated
+        members = self.members.setdefault(client.channel.name, set())
+        if seated:
+            members.add(client)
+        else:
+            members.discard(client)
+
+    async def connect(self, client: Client, channel: Channel, op: str) -> bool:
+        self.seat(client, False)
+        client.channel = channel
+        client.joining = (op, time.perf_counter_ns())
+        try:
+            client.connection = await connect(channel.port, client.name, host=self.host, codecs=self.codecs)
+        except (OSError, HandshakeError):
+            self.failures += 1
+            client.connection = None
+            return False
+        return True
+
+    async def session(self, client: Client) -> None:
+        # churn reconnects after the server confirms the quit; anything else ends the session
+        while self.running and client.connection is not None:
+            rejoin = False
+            try:
+                async for event in client.connection:
+                    if self.measuring:
+                        self.delivered += 1
+                    if not self.handle(client, event):
+                        rejoin = isinstance(event, QuitEvent)
+                        break
+            except (OSError, HandshakeError):
+                # a switch could not reconnect
+                self.failures += 1
+            await client.connection.close()
+            client.connection = None
+            if not (rejoin and self.running and await self.connect(client, random.choice(self.channels), "join")):
+                break
+        self.seat(client, False)
+
+    def handle(self, client: Client, event) -> bool:
+        # False once the connection is finished with
+        match event:
+            case MessageEvent(name="Channel") if client.list_started is not None:
+                self.record("list", client.list_started)
+                client.list_started = None
+            case MessageEvent(name=name, message=message) if message.startswith(STAMP):
+                # the whisperer's own copy is not a delivery
+                if " whispers to " not in name or name.endswith(" whispers to you"):
+                    started = int(message[len(STAMP):message.index(" ")])
+                    self.record("whisper" if name.endswith(" whispers to you") else "chat", started)
+            case JoinEvent(channel=name):
+                # an in-place switch names its new channel only here
+                client.channel = next((c for c in self.channels if c.name == name), client.channel)
+                self.seat(client, True)
+                if client.joining is not None:
+                    self.record(*client.joining)
+                    client.joining = None
+            case SwitchEvent():
+                # the connection has already moved, reconnected or in place on a multiplexed
+                # port; the JoinEvent that follows seats it and times the switch
+                self.seat(client, False)
+            case QuitEvent() | KickEvent() | ShutdownEvent():
+                return False
+        return True
+
+    async def drive(self, client: Client) -> None:
+        ops = list(self.mix)
+        weights = [self.mix[op] for op in ops]
+        while self.running:
+            await asyncio.sleep(random.expovariate(self.rate))
+            if not client.seated or client.connection is None or client.joining is not None:
+                continue
+            op = random.choices(ops, weights)[0]
+            stamp = f"{STAMP}{time.perf_counter_ns()} {'x' * self.size}"
+            match op:
+                case "whisper":
+                    peers = [c for c in self.members.get(client.channel.name, ()) if c is not client]
+                    if not peers:
+                        continue
+                    event = WhisperEvent(name=client.name, target=random.choice(peers).name, message=stamp)
+                case "switch":
+                    others = [c for c in self.channels if c is not client.channel]
+                    if not others:
+                        continue
+                    client.joining = ("switch", time.perf_counter_ns())
+                    event = SwitchEvent(name=client.name, channel=random.choice(others).name)
+                case "list":
+                    client.list_started = time.perf_counter_ns()
+                    event = ListEvent(name=client.name)
+                case "churn":
+                    self.seat(client, False)
+                    event = QuitEvent(name=client.name)
+                case _:
+                    event = MessageEvent(name=client.name, message=stamp)
+            if self.measuring:
+                self.sent[op] += 1
+            try:
+                await client.connection.send(event)
+            except (OSError, AttributeError):
+                pass
+
+
+@dataclass(kw_only=True)
+class ServerProbe:
+    # CPU and peak RSS of the server and any worker processes it started
+    pid: int
+    peak_rss: int = 0
+    _ticks: int = field(default=0, init=False)
+    _start: float = field(default=0.0, init=False)
+    _stop: threading.Event = field(default_factory=threading.Event, init=False)
+    _thread: threading.Thread | None = field(default=None, init=False)
+
+    def _tree(self) -> list[int]:
+        pids = [self.pid]
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        if int(f.read().rsplit(")", 1)[1].split()[1]) in pids:
+                            pids.append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    pass
+        return pids
+
+    def _sample(self) -> tuple[int, int]:
+        ticks = rss = 0
+        for pid in self._tree():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                ticks += int(fields[11]) + int(fields[12])
+                rss += int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+            except (OSError, IndexError, ValueError):
+                pass
+        return ticks, rss
+
+    def start(self) -> None:
+        if not os.path.isdir("/proc"):
+            return
+        self._ticks, self.peak_rss = self._sample()
+        self._start = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(0.5):
+            self.peak_rss = max(self.peak_rss, self._sample()[1])
+
+    def stop(self) -> dict[str, float] | None:
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        ticks, rss = self._sample()
+        cpu = (ticks - self._ticks) / os.sysconf("SC_CLK_TCK")
+        return {
+            "cpu_seconds": cpu,
+            "cpu_percent": 100 * cpu / (time.monotonic() - self._start),
+            "peak_rss_mb": max(self.peak_rss, rss) / 2**20,
+        }
+
+
+def load_channels(path: str) -> tuple[list[Channel], list[str]]:
+    channels, options = [], []
+    with open(path) as f:
+        for line in f:
+            match line.split():
+                case ["channel", name, port, capacity, *mode]:
+                    channels.append(Channel(name=name, port=int(port), capacity=int(capacity), large=mode == ["large"]))
+                case ["server", *_]:
+                    options.append(line.strip())
+    return channels, options
+
+
+def start_server(channels: list[Channel], options: list[str]) -> tuple[subprocess.Popen, str]:
+    fd, path = tempfile.mkstemp(prefix="chatbench_", suffix=".txt")
+    with os.fdopen(fd, "w") as f:
+        for c in channels:
+            f.write(f"channel {c.name} {c.port} {c.capacity}{' large' if c.large else ''}\n")
+        for option in options:
+            f.write(option + "\n")
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "chatserver.py"), path],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    ready = threading.Event()
+
+    def drain() -> None:
+        # the server logs every message; keep reading so it never blocks on stdout
+        assert server.stdout is not None
+        for line in server.stdout:
+            if line.startswith("Welcome to chatserver."):
+                ready.set()
+            elif line.startswith("Error"):
+                print(line, end="", file=sys.stderr)
+        ready.set()
+
+    threading.Thread(target=drain, daemon=True).start()
+    ready.wait()
+    if server.poll() is not None:
+        sys.exit(f"chatserver exited with code {server.returncode}")
+    return server, path
+
+
+def percentiles(samples: list[int]) -> dict[str, float | int | None]:
+    ordered = sorted(samples)
+
+    def at(q: float) -> float | None:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] / 1e6 if ordered else None
+
+    return {"count": len(ordered), "p50_ms": at(0.5), "p99_ms": at(0.99), "p999_ms": at(0.999)}
+
+
+async def run(bench: Bench, count: int, ramp: float, duration: float, concurrency: int) -> float:
+    gate = asyncio.Semaphore(concurrency)
+    tasks = []
+
+    async def start(client: Client) -> None:
+        async with gate:
+            ok = await bench.connect(client, client.channel, "join")
+        if ok:
+            await asyncio.gather(bench.session(client), bench.drive(client))
+
+    for i in range(count):
+        client = Client(id=i, name=f"bench{i}", channel=bench.channels[i % len(bench.channels)])
+        bench.clients.append(client)
+        tasks.append(asyncio.create_task(start(client)))
+    await asyncio.sleep(ramp)
+    bench.measuring = True
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    bench.measuring = False
+    elapsed = time.perf_counter() - started
+    bench.running = False
+    for client in bench.clients:
+        if client.connection is not None:
+            await client.connection.close()
+    await asyncio.wait(tasks, timeout=5)
+    for task in tasks:
+        task.cancel()
+    return elapsed
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict) -> None:
+    def change(new, old) -> str:
+        return f"{100 * (new - old) / old:+.1f}%" if new is not None and old else "n/a"
+
+    print(f"against {baseline.get('commit')} ({baseline.get('label')}):")
+    for key in ("ops_per_s", "deliveries_per_s"):
+        print(f"  {key:<18} {change(current['throughput'][key], baseline['throughput'][key])}")
+    for op, stats in current["latency"].items():
+        old = baseline["latency"].get(op, {})
+        print(f"  {op:<8} p50 {change(stats['p50_ms'], old.get('p50_ms'))}  p99 {change(stats['p99_ms'], old.get('p99_ms'))}  p999 {change(stats['p999_ms'], old.get('p999_ms'))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="chatserver load generator")
+    parser.add_argument("config", nargs="?", default="config.txt", help="server config to start chatserver with")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--channels", type=int, default=0, help="replace the config's channels with this many full-capacity ones")
+    parser.add_argument("--base-port", type=int, default=30000, help="first port of generated channels")
+    parser.add_argument("--capacity", type=int, default=8, help="seats per generated channel; above 8 they are large channels")
+    parser.add_argument("--option", action="append", default=[], help='extra server option, e.g. "mode eventloop"')
+    parser.add_argument("--mix", default="chat=85,whisper=8,list=3,switch=2,churn=2", help="operation weights")
+    parser.add_argument("--rate", type=float, default=1.0, help="operations per second per client")
+    parser.add_argument("--size", type=int, default=32, help="padding bytes per chat message")
+    parser.add_argument("--compress", default="", help='codecs clients offer, e.g. "deflate"; none by default')
+    parser.add_argument("--ramp", type=float, default=3.0, help="seconds to connect before measuring")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=200, help="connections opened at once during ramp-up")
+    parser.add_argument("--attach", metavar="HOST", help="benchmark a server already running on HOST instead of starting one")
+    parser.add_argument("--label", default="", help="free text stored with the results")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="JSON", help="print the change against earlier results")
+    args = parser.parse_args()
+
+    mix = {}
+    for part in args.mix.split(","):
+        op, _, weight = part.partition("=")
+        if op not in OPERATIONS:
+            parser.error(f"unknown operation {op!r}; choose from {', '.join(OPERATIONS)}")
+        mix[op] = float(weight or 1)
+    channels, options = load_channels(args.config)
+    if args.channels:
+        channels = [Channel(name=f"bench_{i}", port=args.base_port + i, capacity=args.capacity, large=args.capacity > 8) for i in range(args.channels)]
+    options += [f"server {option}" for option in args.option]
+    raise_fd_limit()
+
+    server = path = probe = None
+    if args.attach is None:
+        server, path = start_server(channels, options)
+        probe = ServerProbe(pid=server.pid)
+    bench = Bench(channels=channels, mix=mix, rate=args.rate, size=args.size, host=args.attach or "localhost", codecs=tuple(filter(None, args.compress.split(","))))
+    try:
+        if probe is not None:
+            probe.start()
+        elapsed = asyncio.run(run(bench, args.clients, args.ramp, args.duration, args.concurrency))
+        resources = probe.stop() if probe is not None else None
+    finally:
+        if server is not None:
+            assert server.stdin is not None
+            try:
+                server.stdin.write("/shutdown\n")
+                server.stdin.flush()
+                server.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                server.kill()
+            os.unlink(path)
+
+    results = {
+        "commit": git_commit(),
+        "label": args.label,
+        "time": time.time(),
+        "settings": {**vars(args), "mix": mix, "channels": [asdict(c) for c in channels], "options": options},
+        "elapsed_s": elapsed,
+        "throughput": {
+            "ops_per_s": sum(bench.sent.values()) / elapsed,
+            "deliveries_per_s": bench.delivered / elapsed,
+            "ops": bench.sent,
+        },
+        "latency": {op: percentiles(samples) for op, samples in bench.latencies.items()},
+        "connect_failures": bench.failures,
+        "server": resources,
+    }
+    print(f"{args.clients} clients, {len(channels)} channel(s), {elapsed:.1f} s measured")
+    print(f"  {results['throughput']['ops_per_s']:,.0f} ops/s sent, {results['throughput']['deliveries_per_s']:,.0f} frames/s delivered, {bench.failures} failed connect(s)")
+    print(f"  {'op':<8} {'samples':>8} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9}")
+    for op, stats in results["latency"].items():
+        cells = [f"{stats[k]:>9.2f}" if stats[k] is not None else f"{'-':>9}" for k in ("p50_ms", "p99_ms", "p999_ms")]
+        print(f"  {op:<8} {stats['count']:>8} {' '.join(cells)}")
+    if resources is not None:
+        print(f"  server: {resources['cpu_percent']:.0f}% CPU ({resources['cpu_seconds']:.1f} s), peak RSS {resources['peak_rss_mb']:.1f} MB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
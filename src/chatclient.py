@@ -2,25 +2,31 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from sys import argv
 from threading import Thread
-from re import match
+from collections import deque
+from typing import BinaryIO
+import asyncio
+import os
+import signal
 import sys
-import struct
-import threading
-from events import _Event, MessageEvent,QuitEvent,WhisperEvent,ShutdownEvent,KickEvent,MuteEvent,EmptyEvent,SendEvent,ListEvent,SwitchEvent,JoinEvent,Event
-from socket import AF_INET, SOCK_STREAM, socket
-import select
+from events import MessageEvent,QuitEvent,ShutdownEvent,KickEvent,SendEvent,SwitchEvent,JoinEvent,FileChunkEvent,FileAckEvent,TRANSFER_ABORTED,Event
+from compress import CODECS
+from chatlib import ChatConnection, HandshakeError, NameTaken, UnknownChannel, connect
 
 
 def print_usage_and_exit():
-    print("Usage: chatclient port_number client_username", file=sys.stderr, flush=True)
+    print("Usage: chatclient [--resume] port_number client_username [channel_name]", file=sys.stderr, flush=True)
     sys.exit(3)
     
 def port_exit():
     print(f"Error: Unable to connect to port {argv[1]}.", file=sys.stderr, flush=True)
     sys.exit(7)
 
-def check_args():
-    if len(sys.argv) != 3 or " " in argv[2]:
+def check_args() -> bool:
+    # --resume asks the server to hold the seat through a dropped connection
+    resumable = "--resume" in argv
+    if resumable:
+        argv.remove("--resume")
+    if len(sys.argv) not in (3, 4) or " " in argv[2]:
         print_usage_and_exit()
     try:
         port_number = int(sys.argv[1])
@@ -31,155 +37,296 @@ def check_args():
     client_username = sys.argv[2]
     if not client_username:
         print_usage_and_exit()
+    return resumable
 
+def unique_path(name: str) -> str:
+    # never overwrite an existing file with a received one
+    stem, ext = os.path.splitext(name)
+    path, n = name, 1
+    while os.path.exists(path):
+        path = f"{stem} ({n}){ext}"
+        n += 1
+    return path
 
-@dataclass
+
+@dataclass(kw_only=True)
+class OutgoingFile:
+    transfer: int
+    path: str
+    file: str
+    target: str
+    size: int
+
+
+@dataclass(kw_only=True)
+class IncomingFile:
+    transfer: int
+    sender: str
+    file: str
+    size: int
+    part: str
+    handle: BinaryIO
+    received: int = 0
+
+
+@dataclass(kw_only=True)
 class ChatClient:
-    socket: socket = field(init=False)
-    name: str
-    _receive_thread: Thread = field(init=False)
-    running: bool = True
-    
-    def __post_init__(self):
-        port = int(argv[1])
-        self.socket = socket(AF_INET, SOCK_STREAM)
+    # the terminal front end; the protocol lives in chatlib
+    connection: ChatConnection
+    # paths of /send offers waiting for the server to assign a transfer id, in order
+    _pending_offers: deque[str] = field(default_factory=deque, init=False)
+    _outgoing: dict[int, OutgoingFile] = field(default_factory=dict, init=False)
+    _incoming: dict[int, IncomingFile] = field(default_factory=dict, init=False)
+    _tasks: set[asyncio.Task] = field(default_factory=set, init=False)
+    # stdin lines handed over by the reader thread; None once stdin is closed
+    _lines: asyncio.Queue[str | None] = field(default_factory=asyncio.Queue, init=False)
+    exit_code: int = 0
+
+    @property
+    def name(self) -> str:
+        return self.connection.name
+
+    async def run(self) -> int:
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGINT, lambda: self._spawn(self._interrupted()))
+        # blocking stdin reads stay off the loop, on a thread that never holds up exit
+        Thread(target=self._read_stdin, args=(loop,), daemon=True).start()
+        interact = asyncio.create_task(self.interact())
+        # the session lasts as long as the connection
+        await self.receive_handler()
+        interact.cancel()
+        self._abort_transfers()
+        await self.connection.close()
+        return self.exit_code
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _read_stdin(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            for line in sys.stdin:
+                loop.call_soon_threadsafe(self._lines.put_nowait, line)
+            loop.call_soon_threadsafe(self._lines.put_nowait, None)
+        except (RuntimeError, ValueError):
+            # the loop has already finished
+            pass
+
+    async def _interrupted(self) -> None:
+        try:
+            await self.connection.quit()
+        except OSError:
+            pass
+        await self.connection.close()
+
+    async def interact(self):
+        # stdin closing leaves the client waiting for the server or shutdown
+        while (line := await self._lines.get()) is not None:
+            message = line.strip('\n')
+            if not message:
+                continue
+            if not message.startswith("/"):
+                await self.send(MessageEvent(name=self.name, message=message))
+                continue
+            try:
+                match message.split()[0]:
+                    case "/send":
+                        if len(message.split()) != 3 or message != message.strip():
+                            print("[Server Message] Usage: /send target_client_username file_path", flush=True)
+                        elif message.split()[1] == self.name:
+                            print("[Server Message] Cannot send file to yourself.", flush=True)
+                        elif not os.path.isfile(message.split()[2]):
+                            print(f'[Server Message] File "{message.split()[2]}" does not exist.', flush=True)
+                        else:
+                            path = message.split()[2]
+                            self._pending_offers.append(path)
+                            await self.send(SendEvent(name=self.name, target=message.split()[1], file=os.path.basename(path), size=os.path.getsize(path)))
+                    case "/quit":
+                        if len(message.split()) != 1 or message != message.strip():
+                            print("[Server Message] Usage: /quit", flush=True)
+                        else:
+                            await self.connection.quit()
+                    case "/list":
+                        if len(message.split()) != 1 or message != message.strip():
+                            print("[Server Message] Usage: /list", flush=True)
+                        else:
+                            await self.connection.list_channels()
+                    case "/whisper":
+                        parts = message.split(maxsplit=2)
+                        if len(parts) < 3 or message != message.strip():
+                            print("[Server Message] Usage: /whisper receiver_client_username chat_message", flush=True)
+                        else:
+                            _, target, msg = parts
+                            await self.connection.whisper(target, msg)
+                    case "/switch":
+                        if len(message.split()) != 2 or message != message.strip():
+                            print("[Server Message] Usage: /switch channel_name", flush=True)
+                        else:
+                            await self.connection.switch(message.split()[1])
+                    case _:
+                        await self.send(MessageEvent(name=self.name, message=message))
+            except OSError:
+                pass
+
+    async def send(self, event: Event):
+        try:
+            await self.connection.send(event)
+        except OSError:
+            pass
+
+    async def _stream(self, outgoing: OutgoingFile) -> None:
         try:
-            self.socket.connect(('localhost', port))
-            self.socket.send(self.name.encode())
-        except:
-            port_exit()  
-        self.socket.settimeout(1)
-        allowed = self.socket.recv(1024).decode()
-        if allowed != "Y":
-            print(f'[Server Message] Channel "{allowed}" already has user {sys.argv[2]}.', flush=True)
-            sys.exit(2)
-        print(f"Welcome to chatclient, {self.name}.")  
-        self._receive_thread = Thread(target=self.receive_handler)
-        self._receive_thread.start()
-
-    def interact(self):
-        while self.running:
-            ready, _, _ = select.select([sys.stdin], [], [], 0.5)
-            if ready:
-                message = sys.stdin.readline().strip('\n')
-                if not message:
-                    continue
-                if not message.startswith("/"):
-                    event = MessageEvent(name=self.name, message=message)
-                    self.send(event)
-                    continue
+            with open(outgoing.path, "rb") as file:
+                await self.connection.stream_file(outgoing.transfer, file, outgoing.size)
+        except OSError:
+            # the file went away or the connection dropped; cancel it if we still can
+            if self._outgoing.pop(outgoing.transfer, None) is not None:
+                print(f'[Server Message] Failed to send "{outgoing.file}" to {outgoing.target}.', flush=True)
                 try:
-                    match message.split()[0]:
-                        case "/send":
-                            if len(message.split()) != 3 or message != message.strip():
-                                print("[Server Message] Usage: /send target_client_username file_path", flush=True)
-                            elif message.split()[1] == self.name:
-                                print("[Server Message] Cannot send file to yourself.", flush=True)
-                            else:
-                                event = SendEvent(name=self.name, target=message.split()[1], file=message.split()[2])
-                                self.send(event)
-                        case "/quit":
-                            if len(message.split()) != 1 or message != message.strip():
-                                print("[Server Message] Usage: /quit", flush=True)
-                            else:
-                                event = QuitEvent(name=self.name)
-                                self.send(event)
-                        case "/list":
-                            if len(message.split()) != 1 or message != message.strip():
-                                print("[Server Message] Usage: /list", flush=True)
-                            else:
-                                event = ListEvent(name=self.name)
-                                self.send(event)
-                        case "/whisper":
-                            parts = message.split(maxsplit=2)
-                            if len(parts) < 3 or message != message.strip():
-                                print("[Server Message] Usage: /whisper receiver_client_username chat_message", flush=True)
-                            else:
-                                _, target, msg = parts
-                                event = WhisperEvent(name=self.name, target=target, message=msg)
-                                self.send(event)
-                        case "/switch":
-                            if len(message.split()) != 2 or message != message.strip():
-                                print("[Server Message] Usage: /switch channel_name", flush=True)
-                            else:    
-                                event = SwitchEvent(name=self.name, channel=message.split()[1])
-                                self.send(event)
-                        case _:
-                            event = MessageEvent(name=self.name, message=message)
-                            self.send(event)
-                except:
+                    await self.connection.abort_file(outgoing.transfer)
+                except OSError:
                     pass
-  
-    def send(self,event:Event):
-        message = _Event.serialise(event)
-        length = len(message)
-        self.socket.send(struct.pack(f"!I", length) + message)
-                     
-    def receive_handler(self):
-        while self.running:
-            try:
-                message_length_b = self.socket.recv(4)
-            except KeyboardInterrupt as e:
-                self.shutdown()
-                break
-            except:
-                continue
-            if not message_length_b:
-                break
-            message_length = struct.unpack("!I",message_length_b)[0]
-            message = self.socket.recv(message_length)
-            self.receive(message)
 
-    def receive(self, message:bytes):
-        event = _Event.deserialise(message)
+    def _offer_answered(self, target: str, transfer: int, size: int) -> None:
+        # a transfer id of 0 means the server refused the offer
+        path = self._pending_offers.popleft()
+        if not transfer:
+            return
+        outgoing = OutgoingFile(transfer=transfer, path=path, file=os.path.basename(path), target=target, size=size)
+        self._outgoing[transfer] = outgoing
+        self._spawn(self._stream(outgoing))
+
+    async def _offer_received(self, sender: str, file: str, size: int, transfer: int) -> None:
+        file = os.path.basename(file)
+        if file in ("", ".", ".."):
+            file = "file"
+        part = unique_path(f"{file}.part")
+        incoming = IncomingFile(transfer=transfer, sender=sender, file=file, size=size, part=part, handle=open(part, "xb"))
+        self._incoming[transfer] = incoming
+        print(f'[Server Message] {sender} is sending you "{file}".', flush=True)
+        if size == 0:
+            await self._chunk_received(transfer, memoryview(b""))
+
+    async def _chunk_received(self, transfer: int, data: memoryview) -> None:
+        incoming = self._incoming.get(transfer)
+        if incoming is None:
+            return
+        incoming.handle.write(data)
+        incoming.received += len(data)
+        await self.send(FileAckEvent(transfer=transfer, received=incoming.received))
+        if incoming.received >= incoming.size:
+            del self._incoming[transfer]
+            incoming.handle.close()
+            path = unique_path(incoming.file)
+            os.rename(incoming.part, path)
+            print(f'[Server Message] Received "{path}" from {incoming.sender}.', flush=True)
+
+    def _ack_received(self, transfer: int, received: int) -> None:
+        # the connection has already moved the send window along
+        if (outgoing := self._outgoing.get(transfer)) is not None:
+            if received == TRANSFER_ABORTED:
+                del self._outgoing[transfer]
+                print(f'[Server Message] Failed to send "{outgoing.file}" to {outgoing.target}.', flush=True)
+            elif received >= outgoing.size:
+                del self._outgoing[transfer]
+                print(f'[Server Message] Sent "{outgoing.file}" to {outgoing.target}.', flush=True)
+        elif received == TRANSFER_ABORTED and (incoming := self._incoming.pop(transfer, None)) is not None:
+            incoming.handle.close()
+            os.remove(incoming.part)
+            print(f'[Server Message] Failed to receive "{incoming.file}" from {incoming.sender}.', flush=True)
+
+    def _abort_transfers(self) -> None:
+        # transfers are bound to the connection, so they end with it; the connection
+        # stops any outgoing stream itself
+        self._outgoing.clear()
+        self._pending_offers.clear()
+        for incoming in self._incoming.values():
+            incoming.handle.close()
+            os.remove(incoming.part)
+        self._incoming.clear()
+
+    async def receive_handler(self):
+        try:
+            while True:
+                async for event in self.connection:
+                    if not await self.receive(event):
+                        return
+                if self.connection.closed or not await self._reconnect():
+                    return
+        except HandshakeError as e:
+            # the channel we were switched to turned us away
+            rejected(e)
+            self.exit_code = 2
+        except OSError:
+            pass
+
+    async def _reconnect(self) -> bool:
+        # the connection dropped without a goodbye; the server holds the seat for a while
+        if self.connection.resume_token is None:
+            return False
+        self._abort_transfers()
+        for delay in (0.1, 0.4, 1.0, 2.0):
+            await asyncio.sleep(delay)
+            try:
+                await self.connection.resume()
+                return True
+            except OSError:
+                pass
+        return False
 
+    async def receive(self, event: Event) -> bool:
+        # False once the session is over
         match event:
             case MessageEvent(name = n, message = m):
                 print(f"[{n}] {m}", flush=True)
             case ShutdownEvent():
                 print("Error: server connection closed.", file=sys.stderr, flush=True)
-                self.shutdown()
-                print("\n", file=sys.stdin, flush=True)
+                return False
             case JoinEvent(channel=c):
                 print(f'[Server Message] You have joined the channel "{c}".', flush=True)
             case QuitEvent(name=name):
-                self.socket.close()
-                self.shutdown()
+                return False
             case KickEvent(target=t):
                 print(f'[Server Message] You are removed from the channel.', flush=True)
-                self.socket.close()
-                self.shutdown()
-            case SwitchEvent(name=name, channel=channel_port):
-                self.socket.close()
-                port = int(channel_port)
-                self.socket = socket(AF_INET, SOCK_STREAM)
-                try:
-                    self.socket.connect(('localhost', port))
-                    self.socket.send(name.encode())
-                except:
-                    self.shutdown()
-                self.socket.settimeout(1)
-                allowed = self.socket.recv(1024).decode()
-                if allowed != "Y":
-                    print(f'[Server Message] Channel "{allowed}" already has user {sys.argv[2]}.', flush=True)
-                    sys.exit(2)
+                return False
+            case SwitchEvent(name=name):
+                # already on the new channel, in place on the multiplexed port or reconnected
+                self._abort_transfers()
                 print(f"Welcome to chatclient, {self.name}.")
-            case SendEvent(name=n, target=t, file=f):
-                print("should not print", flush=True)
-                
-    def shutdown(self):
-        self.running = False
-        self.socket.close()
-        if threading.current_thread() is not self._receive_thread:
-            self._receive_thread.join()
-        sys.exit(0)
-
- 
-
-check_args()    
-client = ChatClient(name=sys.argv[2])
-try:
-    client.interact()
-except:
-    client.send(QuitEvent(name=client.name))
-    client.shutdown()
\ No newline at end of file
+            case SendEvent(name=n, target=t, file=f, size=size, transfer=transfer):
+                if n == self.name:
+                    self._offer_answered(t, transfer, size)
+                elif t == self.name:
+                    await self._offer_received(n, f, size, transfer)
+            case FileChunkEvent(transfer=transfer, data=data):
+                await self._chunk_received(transfer, data)
+            case FileAckEvent(transfer=transfer, received=received):
+                self._ack_received(transfer, received)
+        return True
+
+
+def rejected(error: HandshakeError) -> None:
+    match error:
+        case UnknownChannel(channel=channel):
+            print(f'[Server Message] Channel "{channel}" does not exist.', flush=True)
+        case NameTaken(channel=channel):
+            print(f'[Server Message] Channel "{channel}" already has user {sys.argv[2]}.', flush=True)
+
+
+async def main(resumable: bool) -> int:
+    # naming a channel is only understood by the server's multiplexed port
+    options = {"channel": argv[3]} if len(argv) == 4 else {}
+    try:
+        connection = await connect(int(argv[1]), argv[2], codecs=tuple(CODECS), resumable=resumable, **options)
+    except HandshakeError as e:
+        rejected(e)
+        return 2
+    except OSError:
+        port_exit()
+    print(f"Welcome to chatclient, {connection.name}.")
+    return await ChatClient(connection=connection).run()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(check_args())))
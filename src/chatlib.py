@@ -0,0 +1,246 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from collections.abc import AsyncIterator
+from socket import AF_INET, IPPROTO_TCP, SOCK_STREAM, SHUT_RDWR, TCP_NODELAY, socket
+from typing import BinaryIO
+import asyncio
+import os
+from compress import CODECS, COMPRESS_THRESHOLD, Codec, compress_frame, decompress_body
+from events import FrameReader, MAX_FRAME_SIZE, hello, parse_accept, NAME_TAKEN, UNKNOWN_CHANNEL, _Event, Event, MessageEvent, QuitEvent, WhisperEvent, ListEvent, SwitchEvent, JoinEvent, FileChunkEvent, FileAckEvent, FILE_CHUNK_SIZE, FILE_WINDOW, TRANSFER_ABORTED
+
+
+class HandshakeError(Exception):
+    def __init__(self, channel: str) -> None:
+        super().__init__(channel)
+        self.channel = channel
+
+
+class NameTaken(HandshakeError):
+    pass
+
+
+class UnknownChannel(HandshakeError):
+    pass
+
+
+@dataclass(kw_only=True)
+class ChatConnection:
+    # one user's connection; everything runs on the caller's event loop, so any
+    # number of connections can share one loop and one process
+    name: str
+    port: int
+    host: str = "localhost"
+    # extra handshake options, e.g. channel= on the multiplexed port
+    options: dict[str, str] = field(default_factory=dict)
+    # codecs to offer, most preferred first; the server picks one or none
+    codecs: tuple[str, ...] = ()
+    codec: Codec | None = field(default=None, init=False)
+    # ask for a resume token, which lets resume() take the seat back after a drop
+    resumable: bool = False
+    resume_token: str | None = field(default=None, init=False)
+    _socket: socket = field(init=False)
+    _reader: FrameReader = field(default_factory=FrameReader, init=False)
+    # frames go out whole and file chunks go out with sendfile, one writer at a time
+    _write_lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False)
+    # frames sent while another write holds the lock, written together by the next holder
+    _pending: list[bytes] = field(default_factory=list, init=False)
+    # bytes acknowledged per outgoing transfer; a transfer missing here has ended
+    _acked: dict[int, int] = field(default_factory=dict, init=False)
+    _acks_changed: asyncio.Condition = field(default_factory=asyncio.Condition, init=False)
+    # an iteration waiting on the socket closes it itself once shutdown wakes it
+    _iterating: bool = field(default=False, init=False)
+    closed: bool = field(default=False, init=False)
+
+    async def open(self) -> None:
+        # raises OSError if the port cannot be reached and HandshakeError if the server refuses us
+        loop = asyncio.get_running_loop()
+        self._socket = socket(AF_INET, SOCK_STREAM)
+        self._socket.setblocking(False)
+        self._socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        offer = {"compress": ",".join(self.codecs)} if self.codecs else {}
+        if self.resumable:
+            offer["resume"] = self.resume_token or ""
+        try:
+            await loop.sock_connect(self._socket, (self.host, self.port))
+            await loop.sock_sendall(self._socket, hello(self.name, **self.options, **offer))
+            reply = await loop.sock_recv(self._socket, 1024)
+            # an offer is answered with the agreed options, up to a newline
+            while offer and reply[:1] == b"Y" and b"\n" not in reply:
+                more = await loop.sock_recv(self._socket, 1024)
+                if not more:
+                    raise ConnectionResetError("server closed the connection during the handshake")
+                reply += more
+        except OSError:
+            self._socket.close()
+            raise
+        self._reader.reset()
+        self._pending.clear()
+        if (accepted := parse_accept(reply, offered=bool(offer))) is not None:
+            agreed, frames = accepted
+            self.codec = CODECS.get(agreed.get("compress", ""))
+            self.resume_token = agreed.get("resume") or None
+            # the server may already be sending frames behind the answer
+            self._reader.feed(frames)
+            return
+        self._socket.close()
+        if not reply:
+            raise ConnectionResetError("server closed the connection during the handshake")
+        if reply[:1] == UNKNOWN_CHANNEL:
+            raise UnknownChannel(reply[1:].decode())
+        if reply[:1] == NAME_TAKEN:
+            raise NameTaken(reply[1:].decode())
+        raise ConnectionResetError("server sent an unexpected handshake reply")
+
+    async def send(self, event: Event) -> None:
+        frame = _Event.frame(event)
+        if self.codec is not None and len(frame) >= COMPRESS_THRESHOLD:
+            frame = compress_frame(frame, self.codec)
+        self._pending.append(frame)
+        async with self._write_lock:
+            if self._pending:
+                frames, self._pending = self._pending, []
+                await asyncio.get_running_loop().sock_sendall(self._socket, frames[0] if len(frames) == 1 else b"".join(frames))
+
+    async def send_message(self, message: str) -> None:
+        await self.send(MessageEvent(name=self.name, message=message))
+
+    async def whisper(self, target: str, message: str) -> None:
+        await self.send(WhisperEvent(name=self.name, target=target, message=message))
+
+    async def switch(self, channel: str) -> None:
+        # the server answers with a SwitchEvent, which iteration follows to the new channel
+        await self.send(SwitchEvent(name=self.name, channel=channel))
+
+    async def list_channels(self) -> None:
+        # the server answers with one MessageEvent from "Channel" per channel
+        await self.send(ListEvent(name=self.name))
+
+    async def quit(self) -> None:
+        await self.send(QuitEvent(name=self.name))
+
+    async def resume(self) -> None:
+        # reconnects after the connection dropped; within the server's grace period the
+        # seat is given back along with what was broadcast meanwhile, otherwise this is
+        # a fresh join. Raises as open() does
+        self._socket.close()
+        await self._end_transfer()
+        await self.open()
+
+    async def stream_file(self, transfer: int, file: BinaryIO, size: int) -> bool:
+        # sends an accepted offer's data, keeping at most FILE_WINDOW bytes unacknowledged so
+        # chat frames are never stuck behind the file; False if the transfer ended early
+        loop = asyncio.get_running_loop()
+        self._acked[transfer] = 0
+        offset = 0
+        compressing = self.codec is not None
+        while offset < size:
+            async with self._acks_changed:
+                await self._acks_changed.wait_for(lambda: transfer not in self._acked or offset - self._acked[transfer] < FILE_WINDOW)
+            if transfer not in self._acked:
+                return False
+            count = min(FILE_CHUNK_SIZE, size - offset)
+            frame = None
+            if compressing:
+                # the file shrinking since the offer is padded out, as below
+                plain = _Event.frame(FileChunkEvent(transfer=transfer, data=os.pread(file.fileno(), count, offset).ljust(count, b"\0")))
+                frame = compress_frame(plain, self.codec)
+                # a file that does not shrink goes out by sendfile from the next chunk on
+                compressing = frame is not plain
+            async with self._write_lock:
+                if frame is not None:
+                    await loop.sock_sendall(self._socket, frame)
+                    offset += count
+                    continue
+                await loop.sock_sendall(self._socket, FileChunkEvent.header(transfer, count))
+                # the kernel copies the file straight into the socket
+                sent = await loop.sock_sendfile(self._socket, file, offset, count)
+                if sent < count:
+                    # the file shrank since the offer; keep the frame well formed
+                    await loop.sock_sendall(self._socket, bytes(count - sent))
+            offset += count
+        # the final acknowledgement is only reported, there is nothing left to send
+        self._acked.pop(transfer, None)
+        return True
+
+    async def abort_file(self, transfer: int) -> None:
+        await self._end_transfer(transfer)
+        await self.send(FileAckEvent(transfer=transfer, received=TRANSFER_ABORTED))
+
+    async def _end_transfer(self, transfer: int | None = None) -> None:
+        # None ends every transfer, as moving to another connection does
+        async with self._acks_changed:
+            if transfer is None:
+                self._acked.clear()
+            else:
+                self._acked.pop(transfer, None)
+            self._acks_changed.notify_all()
+
+    def __aiter__(self) -> AsyncIterator[Event]:
+        return self._events()
+
+    async def _events(self) -> AsyncIterator[Event]:
+        # ends when the connection does; as with FrameReader, an event's memoryview
+        # fields are only valid until the next event is asked for
+        loop = asyncio.get_running_loop()
+        self._iterating = True
+        try:
+            async for event in self._receive(loop):
+                yield event
+        finally:
+            self._iterating = False
+            if self.closed:
+                self._socket.close()
+
+    async def _receive(self, loop: asyncio.AbstractEventLoop) -> AsyncIterator[Event]:
+        while not self.closed:
+            for frame in self._reader.frames():
+                event = _Event.deserialise(decompress_body(frame, self.codec, MAX_FRAME_SIZE))
+                match event:
+                    case FileAckEvent(transfer=transfer, received=received) if transfer in self._acked:
+                        async with self._acks_changed:
+                            if received == TRANSFER_ABORTED:
+                                del self._acked[transfer]
+                            else:
+                                self._acked[transfer] = received
+                            self._acks_changed.notify_all()
+                    case SwitchEvent(channel=""):
+                        # moved in place by the multiplexed port; transfers still end with the channel
+                        await self._end_transfer()
+                    case JoinEvent(channel=channel) if "channel" in self.options:
+                        # a fresh join after resuming fails goes back to the latest channel
+                        self.options["channel"] = channel
+                    case SwitchEvent(channel=port):
+                        # a switch away from a channel port means reconnecting to the new one
+                        await self._end_transfer()
+                        self._socket.close()
+                        self.port, self.options, self.resume_token = int(port), {}, None
+                        await self.open()
+                        yield event
+                        # the reader now holds the new connection's frames
+                        break
+                yield event
+            else:
+                with self._reader.space() as view:
+                    try:
+                        received = await loop.sock_recv_into(self._socket, view)
+                    except OSError:
+                        received = 0
+                if not received:
+                    return
+                self._reader.filled(received)
+
+    async def close(self) -> None:
+        self.closed = True
+        await self._end_transfer()
+        try:
+            self._socket.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+        if not self._iterating:
+            self._socket.close()
+
+
+async def connect(port: int, name: str, host: str = "localhost", codecs: tuple[str, ...] = (), resumable: bool = False, **options: str) -> ChatConnection:
+    connection = ChatConnection(name=name, port=port, host=host, options=options, codecs=codecs, resumable=resumable)
+    await connection.open()
+    return connection
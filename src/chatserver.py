@@ -1,8 +1,9 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 import os
+import resource
 from re import match
-from queue import Queue
+from queue import Queue, Empty
 from socket import *
 import sys
 from threading import Thread,Event as threading_Event
@@ -11,9 +12,30 @@ from enum import IntEnum, auto
 from typing import Literal, ClassVar, Type
 from abc import ABC, abstractmethod
 import struct
-from events import _Event, MessageEvent,QuitEvent,WhisperEvent,ShutdownEvent,KickEvent,MuteEvent,EmptyEvent,SendEvent,ListEvent,SwitchEvent,JoinEvent,Event
-from collections.abc import Sequence
-from time import time
+import itertools
+import math
+import multiprocessing
+import multiprocessing.managers
+import signal
+import time
+import secrets
+import ipaddress
+from reactor import Reactor
+from fanout import FanoutPool
+from outbound import OutboundQueue, OVERFLOW_POLICIES, WRITE_BATCH
+from waitlist import Waitlist
+from registry import Registry
+from timers import Timer, TimerWheel
+from logsink import LogSink, LOG_POLICIES, LOG_FORMATS
+from messagelog import MessageLog
+from metrics import Metrics, Counter, Histogram, Sample, relabel, render, total, quantile
+from ratelimit import RateLimit, RATE_POLICIES
+from compress import Codec, COMPRESS_THRESHOLD, negotiate, compress_frame, decompress_body
+from events import FrameReader, FrameError, MAX_FRAME_SIZE, hello, parse_hello, accept, parse_accept, refuse, NAME_TAKEN, UNKNOWN_CHANNEL, _Event, MessageEvent,QuitEvent,WhisperEvent,ShutdownEvent,KickEvent,MuteEvent,EmptyEvent,ResizeEvent,CloseEvent,SendEvent,ListEvent,SwitchEvent,JoinEvent,FileChunkEvent,FileAckEvent,FILE_CHUNK_SIZE,FILE_WINDOW,TRANSFER_ABORTED,Event
+from events import PeerRosterEvent, PeerPresenceEvent, PeerOccupancyEvent, PeerRelayEvent, PeerWhisperEvent, PeerEvent
+from collections import deque
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from types import MappingProxyType
 
 
 def print_usage_and_exit():
@@ -33,63 +55,748 @@ def check_args():
     else:
         print_usage_and_exit()
 
-def load_channel_configs(filename: str) -> list[ChannelConfig]:
-        configs = []
+class ConfigError(Exception):
+    pass
+
+def read_config(filename: str) -> ServerConfig:
+        # raises instead of exiting, so a reload can keep the running configuration
+        config = ServerConfig()
+        with open(filename, 'r') as file:
+            for line in file:
+                parts = line.strip().split()
+                try:
+                    match parts:
+                        case ["channel", name, port_str, capacity_str, *mode] if mode in ([], ["large"]):
+                            config.channels.append(ChannelConfig(
+                                name=name,
+                                port=int(port_str),
+                                capacity=int(capacity_str),
+                                large=bool(mode),
+                            ))
+                        case ["peer", host, port_str]:
+                            config.peers.append(PeerConfig(host=host, port=int(port_str)))
+                            config.__post_init__()
+                        case ["server", option, value]:
+                            config.set_option(option, value)
+                        case _:
+                            raise ConfigError(line)
+                except (ValueError, AssertionError) as e:
+                    raise ConfigError(line) from e
+        if len(config.channels) == 0:
+            raise ConfigError("no channels")
+        return config
+
+def load_config(filename: str) -> ServerConfig:
         try:
-            with open(filename, 'r') as file:
-                for line in file:
-                    parts = line.strip().split()
-                    try:
-                        channel, name, port_str, capacity_str = parts
-                        if channel != "channel":
-                            print("Error: Invalid configuration file.", file=sys.stderr, flush=True)
-                            sys.exit(5)
-                        config = ChannelConfig(
-                            name=name,
-                            port=int(port_str),
-                            capacity=int(capacity_str)
-                        )
-                        configs.append(config)
-                    except (ValueError, AssertionError):
-                        print(f"Error: Invalid configuration file.", file=sys.stderr, flush=True)
-                        sys.exit(5)
+            return read_config(filename)
         except FileNotFoundError:
             print_usage_and_exit()
-        except:
-            sys.exit(5)
-        if len(configs) == 0:
+        except ConfigError:
             print("Error: Invalid configuration file.", file=sys.stderr, flush=True)
             sys.exit(5)
-        return configs
+        except:
+            sys.exit(5)
+
+def send_frames(sock: socket, frames: list[bytes | memoryview]) -> None:
+    # a whole batch per sendmsg; a short write carries on from mid-frame
+    while frames:
+        sent = sock.sendmsg(frames)
+        i = 0
+        while i < len(frames) and sent >= len(frames[i]):
+            sent -= len(frames[i])
+            i += 1
+        frames = frames[i:]
+        if sent:
+            frames[0] = memoryview(frames[0])[sent:]
+
+def wake_listener(sock: socket) -> None:
+    # a thread blocked in accept() returns once the listening socket is shut down
+    try:
+        sock.shutdown(SHUT_RDWR)
+    except OSError:
+        pass
+
+def peer_allowed(address: str, peers: Sequence[PeerConfig]) -> bool:
+    # resolved on every link, so a peer whose address changes is still let in
+    if ipaddress.ip_address(address).is_loopback:
+        return True
+    for peer in peers:
+        try:
+            if any(info[4][0] == address for info in getaddrinfo(peer.host, None)):
+                return True
+        except OSError:
+            pass
+    return False
+
+def raise_fd_limit() -> None:
+    # one process holds every client socket in event loop mode
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+def load_channel_configs(filename: str) -> list[ChannelConfig]:
+    return load_config(filename).channels
     
     
+@dataclass(kw_only=True)
+class ServerConfig:
+    channels: list[ChannelConfig] = field(default_factory=list)
+    # other chatservers to link to; see PeerLink
+    peers: list[PeerConfig] = field(default_factory=list)
+    # "threaded" runs a thread per socket, "eventloop" runs every channel on one selector loop
+    mode: str = "threaded"
+    # per-client outbound queue limits and what to do when a client cannot keep up
+    queue_frames: int = 1024
+    queue_bytes: int = 4 * 1024 * 1024
+    overflow: str = "drop_oldest"
+    overflow_timeout: float = 5.0
+    # file chunk bytes a client's queue may hold across its incoming transfers; each sender
+    # is held to its window, so only several transfers at once to a stalled client reach it
+    queue_file_bytes: int = 4 * (FILE_WINDOW + FILE_CHUNK_SIZE)
+    # largest inbound frame accepted before the connection is dropped
+    max_frame_bytes: int = MAX_FRAME_SIZE
+    # a client's writer flushes once this many frames are queued, or once the oldest has
+    # waited flush_delay microseconds. With the defaults a threaded writer sends as soon
+    # as anything is queued and the event loop at the end of the pass that queued it;
+    # either way one sendmsg carries everything queued
+    flush_frames: int = 1
+    flush_delay: int = 0
+    # processes the channels are sharded across; 0 keeps every channel in this process
+    workers: int = 0
+    # one extra port where the handshake names the channel and /switch moves the
+    # connection without reconnecting; 0 disables it
+    mux_port: int = 0
+    # seconds a seated client may stay silent before it is removed; 0 disables it
+    afk_time: int = 0
+    # seconds a new connection has to send its name
+    handshake_timeout: int = 10
+    # console output is batched by a background writer; see LogSink
+    log_interval: float = 0.05
+    log_records: int = 10000
+    log_policy: str = "lossless"
+    log_format: str = "text"
+    # directory holding each channel's message log, replayed to clients as they join;
+    # empty keeps no history
+    history_dir: str = ""
+    # messages replayed on join, and the cap when the client asks for everything since a time
+    history_replay: int = 20
+    history_segment_bytes: int = 64 * 1024 * 1024
+    # seconds between group-committed fsyncs of the log; 0 syncs every message
+    history_fsync: float = 1.0
+    # local port serving Prometheus text metrics at /metrics; 0 disables it
+    metrics_port: int = 0
+    # frames at least this long are compressed for clients that negotiated a codec;
+    # 0 refuses every offer
+    compress_threshold: int = COMPRESS_THRESHOLD
+    # chat messages and bytes a second allowed per client and per channel, with bursts of
+    # rate_burst seconds' worth; 0 lifts that limit. A client over its own limit has the
+    # excess dropped, or is muted for rate_mute seconds; a channel over its limit drops
+    rate_messages: float = 0.0
+    rate_bytes: int = 0
+    channel_rate_messages: float = 0.0
+    channel_rate_bytes: int = 0
+    rate_burst: float = 2.0
+    rate_policy: str = "drop"
+    rate_mute: int = 10
+    # seconds a dropped client that asked for a resume token keeps its seat and name, and
+    # the broadcasts each channel keeps to replay to it; a grace of 0 issues no tokens
+    resume_grace: int = 15
+    resume_frames: int = 256
+    # writer threads delivering broadcasts in large channels, each owning a slice of the members
+    fanout_shards: int = 4
+    # port other chatservers link to; channels of the same name on linked servers are one
+    # channel. 0 accepts no links, though "peer" lines still dial out
+    peer_port: int = 0
+    # address the peer port listens on. A linked node can speak as any user, so links are
+    # only accepted from this host or from hosts named in "peer" lines; the loopback
+    # default keeps other hosts from reaching the port at all
+    peer_bind: str = "127.0.0.1"
+
+    def set_option(self, option: str, value: str) -> None:
+        assert option not in ("channels", "peers") and option in {f.name for f in fields(self)}
+        setattr(self, option, type(getattr(self, option))(value))
+        self.__post_init__()
+
+    def __post_init__(self) -> None:
+        assert self.mode in ("threaded", "eventloop")
+        assert self.queue_frames >= 1 and self.queue_bytes >= 1 and self.queue_file_bytes >= FILE_WINDOW + FILE_CHUNK_SIZE
+        assert self.overflow in OVERFLOW_POLICIES
+        assert self.overflow_timeout > 0
+        assert self.max_frame_bytes >= 1024
+        assert 1 <= self.flush_frames <= WRITE_BATCH and self.flush_delay >= 0
+        assert self.workers >= 0
+        assert 0 <= self.afk_time <= 1000
+        assert self.handshake_timeout >= 1
+        assert self.log_interval >= 0 and self.log_records >= 1
+        assert self.log_policy in LOG_POLICIES
+        assert self.log_format in LOG_FORMATS
+        assert self.history_replay >= 0 and self.history_segment_bytes >= 1 and self.history_fsync >= 0
+        assert self.mux_port == 0 or 1024 <= self.mux_port <= 65535
+        assert self.metrics_port == 0 or 1024 <= self.metrics_port <= 65535
+        assert self.peer_port == 0 or 1024 <= self.peer_port <= 65535
+        assert self.compress_threshold >= 0
+        assert min(self.rate_messages, self.rate_bytes, self.channel_rate_messages, self.channel_rate_bytes) >= 0
+        assert self.rate_burst > 0 and self.rate_policy in RATE_POLICIES and self.rate_mute >= 1
+        assert self.resume_grace >= 0 and self.resume_frames >= 0
+        assert self.fanout_shards >= 1
+        # a connection can only be moved between channels owned by one process
+        assert not (self.mux_port and self.workers)
+        # nor can one process relay for channels other workers own
+        assert not ((self.peer_port or self.peers) and self.workers)
+
+    def shard(self, shard: int) -> list[ChannelConfig]:
+        # contiguous blocks keep channel creation messages in config order
+        size = math.ceil(len(self.channels) / self.worker_count)
+        return self.channels[shard * size:(shard + 1) * size]
+
+    @property
+    def worker_count(self) -> int:
+        return min(self.workers, len(self.channels))
+
+
+# seats a channel marked "large" may have; every other channel has at most 8
+LARGE_CAPACITY = 100_000
+
+
 @dataclass(kw_only=True)
 class ChannelConfig:
     name: str
     port: int
     capacity: int
+    # fans broadcasts out through the server's writer shards and sends no departure notices
+    large: bool = False
 
     def __post_init__(self) -> None:
         assert match(r"^[a-zA-Z0-9_]+$", self.name)
         assert 1024 <= self.port <= 65535
-        assert 1 <= self.capacity <= 8
+        assert 1 <= self.capacity <= (LARGE_CAPACITY if self.large else 8)
+
+
+@dataclass(kw_only=True)
+class PeerConfig:
+    # another chatserver's peer port, dialed at startup and again whenever the link is down
+    host: str
+    port: int
+
+    def __post_init__(self) -> None:
+        assert 1 <= self.port <= 65535
+
+
+@dataclass(kw_only=True)
+class ChannelInfo:
+    # what /list and /switch need to know about a channel, possibly owned by another worker
+    name: str
+    port: int
+    capacity: int
+    members: int
+    waiting: int
+    client_names: tuple[str, ...]
+
+
+@dataclass(kw_only=True)
+class Worker:
+    process: multiprocessing.Process
+    commands: multiprocessing.Queue
+    # metric samples sent back for each "stats" command
+    replies: multiprocessing.Queue
+    channels: list[str]
+
+
+def run_worker(config: ServerConfig, shard: int, commands: multiprocessing.Queue, replies: multiprocessing.Queue, directory: dict[str, ChannelInfo], ready) -> None:
+    # the supervisor owns the terminal, so console commands arrive over the queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    server = ChatServer(config=config, shard=shard, directory=directory)
+    # the supervisor prints its own lines next, so ours must be out first
+    server.log.flush()
+    ready.set()
+    while True:
+        match commands.get():
+            case ["post", channel_name, event]:
+                server.post(channel_name, event)
+            case ["stats"]:
+                replies.put(server.metrics.collect())
+            case ["shutdown"]:
+                server.shutdown()
+                break
+    # worker processes skip atexit, so write out whatever is still queued
+    server.log.close()
+
+
+@dataclass(kw_only=True)
+class FileTransfer:
+    id: int
+    sender: ChannelClientHandler
+    receiver: ChannelClientHandler
+    file: str
+    size: int
+    # bytes relayed so far; the sender may not exceed the size it offered
+    relayed: int = 0
+    # bytes the receiver has acknowledged, which the sender may not run more than a window past
+    acked: int = 0
         
 
 @dataclass(kw_only=True)
 class ChatServer:
-    channel_configs: list[ChannelConfig]
+    config: ServerConfig
+    # set in worker processes: which block of config.channels this process owns
+    shard: int | None = None
+    # channel name -> ChannelInfo shared by every worker; None when not sharded
+    directory: dict[str, ChannelInfo] | None = None
+    # re-read by /reload and SIGHUP; None when there is nothing to reload from
+    config_path: str | None = None
     _channels: list[ChannelServer] = field(default_factory=list, init=False)
+    # channels and held usernames for every channel this process serves
+    registry: Registry[ChannelServer, ChannelClientHandler] = field(default_factory=Registry, init=False)
+    # every timer in the process: AFK, mute expiry and handshake deadlines
+    timers: TimerWheel = field(default_factory=TimerWheel, init=False)
+    _timer_thread: Thread | None = field(default=None, init=False)
+    log: LogSink = field(init=False)
+    metrics: Metrics = field(default_factory=Metrics, init=False)
+    connections_accepted: Counter = field(init=False)
+    connections_closed: Counter = field(init=False)
+    handshake_failures: Counter = field(init=False)
+    _metrics_sock: socket | None = field(default=None, init=False)
+    _metrics_thread: Thread | None = field(default=None, init=False)
+    # one stats round trip to the workers at a time, so replies pair up with requests
+    _stats_lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    # a SIGHUP arriving during /reload waits for it rather than diffing against a half-applied one
+    _reload_lock: threading.Lock = field(default_factory=threading.Lock, init=False)
     _server_thread: Thread = field(init=False)
+    reactor: Reactor | None = field(default=None, init=False)
+    # started with the first large channel
+    fanout: FanoutPool | None = field(default=None, init=False)
+    _loop_thread: Thread | None = field(default=None, init=False)
+    # sockets still registered with the reactor; the loop exits once these drain after shutdown
+    _open_connections: int = field(default=0, init=False)
+    # every connection not yet closed, mid-handshake, kicked or seated, so shutdown can drop them all
+    _handlers: set[ChannelClientHandler] = field(default_factory=set, init=False)
+    _handlers_lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    # file transfers in flight, relayed chunk by chunk between two members
+    _transfers: dict[int, FileTransfer] = field(default_factory=dict, init=False)
+    _transfer_ids: itertools.count = field(default_factory=lambda: itertools.count(1), init=False)
+    # dropped sessions waiting out their grace period, by resume token; whoever pops a
+    # session, the resuming connection or the expiry timer, has it
+    _parked: dict[str, ChannelClientHandler] = field(default_factory=dict, init=False)
+    _mux_sock: socket | None = field(default=None, init=False)
+    _mux_thread: Thread | None = field(default=None, init=False)
+    # this server's name to its peers
+    node: str = field(default="", init=False)
+    # the link to each peer by node name; replaced whole under _links_lock, like a channel's _clients
+    _links: Mapping[str, PeerLink] = field(default_factory=lambda: MappingProxyType({}), init=False)
+    _links_lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    _peer_sock: socket | None = field(default=None, init=False)
+    _peer_thread: Thread | None = field(default=None, init=False)
+    _dial_threads: list[Thread] = field(default_factory=list, init=False)
+    _peers_closed: threading_Event = field(default_factory=threading_Event, init=False)
+    _manager: multiprocessing.managers.SyncManager | None = field(default=None, init=False)
+    _workers: list[Worker] = field(default_factory=list, init=False)
+    _owners: dict[str, Worker] = field(default_factory=dict, init=False)
     running: bool = True
 
     def __post_init__(self) -> None:
-        for c in self.channel_configs:
-            self._channels.append(
-                ChannelServer(config=c, server=self),
-            )
-        print("Welcome to chatserver.", flush=True)
+        self.log = LogSink(
+            flush_interval=self.config.log_interval,
+            max_records=self.config.log_records,
+            policy=self.config.log_policy,
+            format=self.config.log_format,
+        )
+        self.connections_accepted = self.metrics.counter("chat_connections_accepted_total", "Connections accepted.")
+        self.connections_closed = self.metrics.counter("chat_connections_closed_total", "Connections closed.")
+        self.handshake_failures = self.metrics.counter("chat_handshake_failures_total", "Connections that never completed the name handshake.")
+        self.metrics.gauge("chat_connections_open", "Connections currently open.", lambda: self.connections_accepted.value - self.connections_closed.value)
+        if self.config.workers and self.shard is None:
+            self._start_workers()
+        else:
+            channels = self.config.channels if self.shard is None else self.config.shard(self.shard)
+            if self.config.mode == "eventloop" or any(c.large for c in channels):
+                raise_fd_limit()
+            if self.config.mode == "eventloop":
+                self.reactor = Reactor(timers=self.timers)
+            for c in channels:
+                try:
+                    self._channels.append(ChannelServer(config=c, server=self))
+                except OSError:
+                    print(f"Error: unable to listen on port {c.port}.", file=sys.stderr, flush=True)
+                    sys.exit(6)
+            if self.config.mux_port:
+                self._open_mux()
+            if self.config.peer_port or self.config.peers:
+                self._open_peers()
+            if self.reactor is not None:
+                self._loop_thread = Thread(target=self.reactor.run)
+                self._loop_thread.start()
+            else:
+                self._timer_thread = Thread(target=self._run_timers)
+                self._timer_thread.start()
+            if self.shard is not None:
+                return
+        if self.config.metrics_port:
+            self._open_metrics()
+        self.log.emit("Welcome to chatserver.")
         self._server_thread = Thread(target=self.start)
         self._server_thread.start()
+
+    def _run_timers(self) -> None:
+        # threaded mode drives the wheel from one thread; it only wakes per tick while timers are pending
+        while not self.timers.closed:
+            self.timers.wait()
+            self.timers.advance()
+
+    def _start_workers(self) -> None:
+        self._manager = multiprocessing.Manager()
+        self.directory = self._manager.dict()
+        # one worker at a time, so a port that fails to bind stops startup in config order
+        for shard in range(self.config.worker_count):
+            commands = multiprocessing.Queue()
+            replies = multiprocessing.Queue()
+            ready = multiprocessing.Event()
+            process = multiprocessing.Process(target=run_worker, args=(self.config, shard, commands, replies, self.directory, ready))
+            process.start()
+            worker = Worker(process=process, commands=commands, replies=replies, channels=[c.name for c in self.config.shard(shard)])
+            self._workers.append(worker)
+            self._owners.update(dict.fromkeys(worker.channels, worker))
+            while not ready.wait(0.1):
+                if not process.is_alive():
+                    self._stop_workers()
+                    sys.exit(process.exitcode)
+
+    def _stop_workers(self) -> None:
+        for worker in self._workers:
+            if worker.process.is_alive():
+                worker.commands.put(("shutdown",))
+        for worker in self._workers:
+            worker.process.join()
+        assert self._manager is not None
+        self._manager.shutdown()
+
+    def _open_mux(self) -> None:
+        self._mux_sock = socket(AF_INET, SOCK_STREAM)
+        try:
+            self._mux_sock.bind(("", self.config.mux_port))
+            self._mux_sock.listen()
+        except:
+            print(f"Error: unable to listen on port {self.config.mux_port}.", file=sys.stderr, flush=True)
+            sys.exit(6)
+        self.log.emit(f"Channels are also served on port {self.config.mux_port}.")
+        if self.reactor is not None:
+            self._mux_sock.setblocking(False)
+            self.reactor.add_reader(self._mux_sock, self._mux_accept)
+        else:
+            self._mux_thread = Thread(target=self._mux_listen)
+            self._mux_thread.start()
+
+    def _mux_listen(self) -> None:
+        assert self._mux_sock is not None
+        while self.running:
+            try:
+                client_sock, addr = self._mux_sock.accept()
+            except:
+                continue
+            # the handshake may name another channel, which the handler moves to
+            ChannelClientHandler(socket=client_sock, channel=self._channels[0], mux=True)
+
+    def _mux_accept(self) -> None:
+        assert self._mux_sock is not None
+        while self.running:
+            try:
+                client_sock, addr = self._mux_sock.accept()
+            except OSError:
+                return
+            ChannelClientHandler(socket=client_sock, channel=self._channels[0], mux=True)
+
+    def _close_mux(self) -> None:
+        if self._mux_sock is None:
+            return
+        if self.reactor is not None:
+            self.reactor.remove_reader(self._mux_sock)
+            self._mux_sock.close()
+        else:
+            assert self._mux_thread is not None
+            wake_listener(self._mux_sock)
+            self._mux_thread.join()
+            self._mux_sock.close()
+
+    def _open_peers(self) -> None:
+        self.node = f"{gethostname()}:{self.config.peer_port or os.getpid()}"
+        self.metrics.gauge("chat_peer_links", "Links to other chatservers that are up.", lambda: len(self._links))
+        if self.config.peer_port:
+            self._peer_sock = socket(AF_INET, SOCK_STREAM)
+            try:
+                self._peer_sock.bind((self.config.peer_bind, self.config.peer_port))
+                self._peer_sock.listen()
+            except:
+                print(f"Error: unable to listen on port {self.config.peer_port}.", file=sys.stderr, flush=True)
+                sys.exit(6)
+            self.log.emit(f"Peers link to port {self.config.peer_port}.")
+            self._peer_thread = Thread(target=self._peer_listen)
+            self._peer_thread.start()
+        for peer in self.config.peers:
+            thread = Thread(target=self._dial, args=(peer,))
+            thread.start()
+            self._dial_threads.append(thread)
+
+    def _peer_listen(self) -> None:
+        assert self._peer_sock is not None
+        while not self._peers_closed.is_set():
+            try:
+                peer_sock, addr = self._peer_sock.accept()
+            except OSError:
+                continue
+            if not peer_allowed(addr[0], self.config.peers):
+                peer_sock.close()
+                self.log.emit(f"[Server Message] Refused a peer link from {addr[0]}.")
+                continue
+            Thread(target=PeerLink(server=self, socket=peer_sock).run).start()
+
+    def _dial(self, peer: PeerConfig) -> None:
+        # keeps a link to the peer up, redialing while it is down; a link the peer dialed
+        # to us serves just as well
+        link = None
+        while not self._peers_closed.is_set():
+            if link is None or link.node not in self._links:
+                try:
+                    peer_sock = create_connection((peer.host, peer.port), timeout=self.config.handshake_timeout)
+                except OSError:
+                    pass
+                else:
+                    link = PeerLink(server=self, socket=peer_sock, dialed=True)
+                    link.run()
+            self._peers_closed.wait(PEER_RETRY)
+
+    def _link(self, link: PeerLink) -> bool:
+        # two nodes listing each other dial twice; both ends keep the link dialed by the
+        # lower node name and drop the other
+        preferred = min(self.node, link.node)
+        with self._links_lock:
+            current = self._links.get(link.node)
+            if self._peers_closed.is_set() or (current is not None and current.dialer == preferred != link.dialer):
+                return False
+            self._links = MappingProxyType({**self._links, link.node: link})
+        if current is not None:
+            current.close()
+        else:
+            self.log.emit(f'[Server Message] Linked to node "{link.node}".')
+        return True
+
+    def _unlink(self, link: PeerLink) -> None:
+        with self._links_lock:
+            if self._links.get(link.node) is not link:
+                return
+            links = dict(self._links)
+            del links[link.node]
+            self._links = MappingProxyType(links)
+        self.log.emit(f'[Server Message] Lost the link to node "{link.node}".')
+
+    def relay(self, event: PeerEvent) -> None:
+        # framed once and sent once per peer, however many of its users share the channel;
+        # a peer that does not serve the channel ignores it
+        if not self._links:
+            return
+        frame = _Event.frame(event)
+        for link in self._links.values():
+            link.send(frame)
+
+    def peer_holding(self, channel: str, name: str) -> PeerLink | None:
+        for link in self._links.values():
+            if (roster := link.rosters.get(channel)) is not None and name in roster.names:
+                return link
+        return None
+
+    def rosters(self, channel: str) -> list[PeerRoster]:
+        return [roster for link in self._links.values() if (roster := link.rosters.get(channel)) is not None]
+
+    def _close_peers(self) -> None:
+        self._peers_closed.set()
+        if self._peer_sock is not None:
+            assert self._peer_thread is not None
+            wake_listener(self._peer_sock)
+            self._peer_thread.join()
+            self._peer_sock.close()
+        # _link refuses new links once closed, so none can slip in after this snapshot
+        with self._links_lock:
+            links = list(self._links.values())
+        for link in links:
+            link.close()
+        for thread in self._dial_threads:
+            thread.join()
+
+    def _open_metrics(self) -> None:
+        self._metrics_sock = socket(AF_INET, SOCK_STREAM)
+        try:
+            self._metrics_sock.bind(("127.0.0.1", self.config.metrics_port))
+            self._metrics_sock.listen()
+        except:
+            print(f"Error: unable to listen on port {self.config.metrics_port}.", file=sys.stderr, flush=True)
+            sys.exit(6)
+        self.log.emit(f"Metrics are served on port {self.config.metrics_port}.")
+        self._metrics_thread = Thread(target=self._serve_metrics)
+        self._metrics_thread.start()
+
+    def _serve_metrics(self) -> None:
+        # scrapes are rare and small, so each is answered in full before the next accept
+        assert self._metrics_sock is not None
+        while self.running:
+            try:
+                conn, addr = self._metrics_sock.accept()
+            except OSError:
+                continue
+            with conn:
+                conn.settimeout(1.0)
+                try:
+                    request = b""
+                    while b"\r\n\r\n" not in request and len(request) < 8192:
+                        chunk = conn.recv(4096)
+                        if not chunk:
+                            break
+                        request += chunk
+                    target = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+                    if target.split(b"?")[0] == b"/metrics":
+                        status, body = b"200 OK", render(self.samples()).encode()
+                    else:
+                        status, body = b"404 Not Found", b"Not found.\n"
+                    conn.sendall(
+                        b"HTTP/1.1 " + status + b"\r\n"
+                        b"Content-Type: text/plain; version=0.0.4\r\n"
+                        b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                        b"Connection: close\r\n\r\n" + body
+                    )
+                except OSError:
+                    pass
+
+    def _close_metrics(self) -> None:
+        if self._metrics_sock is None:
+            return
+        assert self._metrics_thread is not None
+        wake_listener(self._metrics_sock)
+        self._metrics_thread.join()
+        self._metrics_sock.close()
+
+    def samples(self) -> list[Sample]:
+        if not self._workers:
+            return self.metrics.collect()
+        # each worker reports its own; a worker label keeps their server-wide series apart
+        samples = []
+        with self._stats_lock:
+            live = [(shard, worker) for shard, worker in enumerate(self._workers) if worker.process.is_alive()]
+            for shard, worker in live:
+                worker.commands.put(("stats",))
+            for shard, worker in live:
+                try:
+                    samples += relabel(worker.replies.get(timeout=1.0), worker=str(shard))
+                except Empty:
+                    pass
+        return samples
+
+    def _stats(self) -> None:
+        samples = self.samples()
+        self.log.emit(
+            f"[Server Message] {total(samples, 'chat_connections_open'):.0f} connection(s) open, "
+            f"{total(samples, 'chat_connections_accepted_total'):.0f} accepted, "
+            f"{total(samples, 'chat_handshake_failures_total'):.0f} failed handshake(s)."
+        )
+        for c in self.config.channels:
+            def count(name: str) -> str:
+                return f"{total(samples, name, channel=c.name):.0f}"
+            latencies = []
+            for q in (0.5, 0.99):
+                bound = quantile(samples, "chat_fanout_seconds", q, channel=c.name)
+                latencies.append("-" if bound is None else "> 1 s" if bound == math.inf else f"<= {bound * 1000:g} ms")
+            self.log.emit(
+                f'[Server Message] "{c.name}": {count("chat_members")} member(s), {count("chat_waiting")} waiting, '
+                f'{count("chat_events_queued")} queued event(s), {count("chat_outbound_frames")} queued frame(s); '
+                f'{count("chat_messages_received_total")} frame(s) in ({count("chat_received_bytes_total")} bytes), '
+                f'{count("chat_messages_sent_total")} out ({count("chat_sent_bytes_total")} bytes); '
+                f"fan-out p50 {latencies[0]}, p99 {latencies[1]}."
+            )
+
+    def reload(self) -> None:
+        if self.config_path is None:
+            return
+        if self._workers:
+            self.log.emit("[Server Message] Reloading is not supported with workers; restart the server instead.")
+            return
+        try:
+            channels = read_config(self.config_path).channels
+        except Exception:
+            self.log.emit(f'[Server Message] Unable to reload "{self.config_path}"; the channels are unchanged.')
+            return
+        if self.reactor is not None:
+            # channels are owned by the loop thread, so they change there
+            self.reactor.call_soon_threadsafe(self._reload, channels)
+        else:
+            with self._reload_lock:
+                self._reload(channels)
+
+    def _reload(self, channels: list[ChannelConfig]) -> None:
+        # channels are matched by name; one whose port and capacity are unchanged is left alone
+        if not self.running:
+            return
+        current = {channel.config.name: channel for channel in self._channels}
+        wanted = {c.name for c in channels}
+        added, resized, removed = [], [], []
+        for c in channels:
+            channel = current.get(c.name)
+            if channel is None:
+                try:
+                    self._channels.append(ChannelServer(config=c, server=self))
+                except OSError:
+                    self.log.emit(f'[Server Message] Unable to listen on port {c.port}; channel "{c.name}" is not created.')
+                    continue
+                added.append(c.name)
+            elif c.port != channel.config.port:
+                self.log.emit(f'[Server Message] Channel "{c.name}" stays on port {channel.config.port}; moving it to port {c.port} needs a restart.')
+            elif c.large != channel.config.large:
+                self.log.emit(f'[Server Message] Channel "{c.name}" keeps its mode; making it {"large" if c.large else "small"} needs a restart.')
+            elif c.capacity != channel.config.capacity:
+                channel.post(ResizeEvent(capacity=c.capacity))
+                resized.append(c.name)
+        # whoever is left in a removed channel moves to the first channel that remains
+        survivors = [channel for channel in self._channels if channel.config.name in wanted]
+        for channel in self._channels:
+            if channel.config.name in wanted:
+                continue
+            if not survivors:
+                self.log.emit(f'[Server Message] Channel "{channel.config.name}" is kept open; no other channel could take its users.')
+                continue
+            channel.post(CloseEvent(successor=survivors[0].config.name))
+            removed.append(channel.config.name)
+        order = {c.name: i for i, c in enumerate(channels)}
+        self._channels = sorted(
+            (channel for channel in self._channels if channel.config.name not in removed),
+            key=lambda channel: order.get(channel.config.name, len(order)),
+        )
+        self.config.channels = [channel.config for channel in self._channels]
+        self.log.emit(f"[Server Message] Configuration reloaded: {len(added)} channel(s) added, {len(removed)} removed, {len(resized)} resized.")
+
+    def find_channel(self, channel_name: str) -> ChannelServer | None:
+        return self.registry.channel(channel_name)
+
+    def post(self, channel_name: str, event: Event) -> bool:
+        if (worker := self._owners.get(channel_name)) is not None:
+            worker.commands.put(("post", channel_name, event))
+            return True
+        if (channel := self.find_channel(channel_name)) is not None:
+            channel.post(event)
+            return True
+        return False
+
+    def channel_infos(self) -> list[ChannelInfo]:
+        local = {channel.config.name: channel.info() for channel in self._channels}
+        if self.directory is None:
+            return list(local.values())
+        # a single round trip for everything other workers own
+        shared = self.directory.copy()
+        return [local.get(c.name) or shared[c.name] for c in self.config.channels if c.name in local or c.name in shared]
+
+    def channel_info(self, channel_name: str) -> ChannelInfo | None:
+        for info in self.channel_infos():
+            if info.name == channel_name:
+                return info
+        return None
     
     def start(self):    
         while self.running:
@@ -102,66 +809,134 @@ class ChatServer:
                 match command[0]:
                     case "/shutdown":
                         if message != message.strip() or len(command) != 1:
-                            print("Usage: /shutdown", flush=True)
+                            self.log.emit("Usage: /shutdown")
                         else:
                             self.shutdown()
-                            print("[Server Message] Server shuts down.", flush=True)
+                            self.log.emit("[Server Message] Server shuts down.")
                             break
                     case "/kick":
                         if message != message.strip() or len(command) != 3:
-                            print("Usage: /kick channel_name client_username", flush=True)
+                            self.log.emit("Usage: /kick channel_name client_username")
                         else:
-                            for channel in self._channels:
-                                if channel.config.name == command[1]:
-                                    channel._events.put(KickEvent(target=command[2]))
-                                    break
-                            else:
-                                print(f'[Server Message] Channel "{command[1]}" does not exist.', flush=True)                                
+                            if not self.post(command[1], KickEvent(target=command[2])):
+                                self.log.emit(f'[Server Message] Channel "{command[1]}" does not exist.')
                     case "/mute":
                         if message != message.strip() or len(command) != 4:
-                            print("Usage: /mute channel_name client_username duration", flush=True)
+                            self.log.emit("Usage: /mute channel_name client_username duration")
                         else:
-                            for channel in self._channels:
-                                if channel.config.name == command[1]:
-                                    channel._events.put(MuteEvent(target=command[2], duration=command[3]))
-                                    break
-                            else:
-                                print(f'[Server Message] Channel "{command[1]}" does not exist.', flush=True)
+                            if not self.post(command[1], MuteEvent(target=command[2], duration=command[3])):
+                                self.log.emit(f'[Server Message] Channel "{command[1]}" does not exist.')
                     case "/empty":
                         if message != message.strip() or len(command) != 2:
-                            print("Usage: /empty channel_name", flush=True)
+                            self.log.emit("Usage: /empty channel_name")
                         else:
-                            for channel in self._channels:
-                                if channel.config.name == command[1]:
-                                    channel._events.put(EmptyEvent())
-                                    break
-                            else:
-                                print(f'[Server Message] Channel "{command[1]}" does not exist.', flush=True)  
+                            if not self.post(command[1], EmptyEvent()):
+                                self.log.emit(f'[Server Message] Channel "{command[1]}" does not exist.')
+                    case "/stats":
+                        if message != message.strip() or len(command) != 1:
+                            self.log.emit("Usage: /stats")
+                        else:
+                            self._stats()
+                    case "/reload":
+                        if message != message.strip() or len(command) != 1:
+                            self.log.emit("Usage: /reload")
+                        else:
+                            self.reload()
             except:
                 continue
                     
     def shutdown(self):
+        if self._workers:
+            self._stop_workers()
+        elif self.reactor is not None:
+            # channels are owned by the loop thread, so tear them down there
+            self.reactor.call_soon_threadsafe(self._shutdown_channels)
+            assert self._loop_thread is not None
+            self._loop_thread.join(timeout=1.0)
+        else:
+            self._shutdown_channels()
+        if self.fanout is not None:
+            self.fanout.stop()
+        self.running = False
+        self._close_peers()
+        self._close_metrics()
+        self.timers.close()
+
+    def _shutdown_channels(self) -> None:
+        self.running = False
+        self._close_mux()
         for channel in self._channels:
             channel.shutdown()
-            channel._events.put(ShutdownEvent())
-        self.running = False
+            channel.post(ShutdownEvent())
+        if self.reactor is not None:
+            # behind the flushes the shutdown notices have already queued
+            self.reactor.call_soon(self._drop_connections)
+        else:
+            self._drop_connections()
+        self._connection_closed(0)
+
+    def _track(self, handler: ChannelClientHandler) -> None:
+        with self._handlers_lock:
+            self._handlers.add(handler)
+
+    def _untrack(self, handler: ChannelClientHandler) -> None:
+        with self._handlers_lock:
+            self._handlers.discard(handler)
+
+    def _drop_connections(self) -> None:
+        # whoever is still connected once the channels are down, named or not, is let go,
+        # rather than keeping the process alive until they hang up themselves
+        with self._handlers_lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            handler.drop()
+
+    def _connection_closed(self, count: int = 1) -> None:
+        self._open_connections -= count
+        if not self.running and self._open_connections == 0 and self.reactor is not None:
+            self.reactor.stop()
 
 
 @dataclass(kw_only=True)
 class ChannelServer:
     config: ChannelConfig
     server: ChatServer
-    _clients: dict[str, ChannelClientHandler] = field(default_factory=dict, init=False)
-    _waitlist: list[ChannelClientHandler] = field(default_factory=list, init=False)
+    # seated clients; never changed in place, but replaced whole under _seats_lock, so
+    # readers iterate a stable snapshot; a broadcast takes the lock only to pick its snapshot
+    _clients: Mapping[str, ChannelClientHandler] = field(default_factory=lambda: MappingProxyType({}), init=False)
+    _seats_lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    # a large channel's members grouped by the reactor writing to them, kept like _clients;
+    # None holds members with a writer thread of their own
+    _slices: Mapping[Reactor | None, tuple[ChannelClientHandler, ...]] = field(default_factory=lambda: MappingProxyType({}), init=False)
+    _waitlist: Waitlist[ChannelClientHandler] = field(default_factory=Waitlist, init=False)
+    # held from a capacity check to the seat or queue place it decides on, as leaves and
+    # arrivals on several receive threads could otherwise fill the same seat twice
+    _waitlist_lock: threading.RLock = field(default_factory=threading.RLock, init=False)
+    history: MessageLog | None = field(default=None, init=False)
+    messages_in: Counter = field(init=False)
+    bytes_in: Counter = field(init=False)
+    messages_out: Counter = field(init=False)
+    bytes_out: Counter = field(init=False)
+    fanout: Histogram = field(init=False)
+    rate_limited: Counter = field(init=False)
+    # shared by every member's messages; see TokenBucket for why it takes no lock
+    _rate: RateLimit | None = field(default=None, init=False)
+    # the latest broadcasts by number, replayed to clients resuming a dropped session
+    _recent: deque[tuple[int, bytes]] = field(init=False)
+    _broadcast_ids: itertools.count = field(default_factory=lambda: itertools.count(1), init=False)
+    _last_broadcast: int = field(default=0, init=False)
+    # the capacity and queue length peers last heard of
+    _occupancy: tuple[int, int] | None = field(default=None, init=False)
     sock: socket = field(init=False)
-    _events: Queue[Event] = field(default_factory=Queue, init=False)
+    # admin events, and work handed over by timers, for the handler thread
+    _events: Queue[Event | tuple[Callable, tuple]] = field(default_factory=Queue, init=False)
     running: bool = True
     _listen_thread: Thread = field(init=False)
     _handle_thread: Thread = field(init=False)
     
     @property
     def client_names(self) -> Sequence[str]:
-        return (*self._clients.keys(), *(c.name for c in self._waitlist))
+        return self.server.registry.names(self.config.name)
 
     def __post_init__(self) -> None:
         # TODO: spin up a thread listening on our port
@@ -169,262 +944,1178 @@ class ChannelServer:
         try:
             self.sock.bind(("", self.config.port))
             self.sock.listen()
-            self.sock.settimeout(1.0)
+            if self.server.reactor is not None:
+                self.sock.setblocking(False)
         except:
-            print(f"Error: unable to listen on port {self.config.port}.", file=sys.stderr, flush=True)
-            sys.exit(6)
-        print(f'Channel "{self.config.name}" is created on port {self.config.port}, with a capacity of {self.config.capacity}.', flush=True)
+            # startup gives up on the port, a reload only skips the channel
+            self.sock.close()
+            raise
+        self.server.log.emit(f'Channel "{self.config.name}" is created on port {self.config.port}, with a capacity of {self.config.capacity}.')
+        self.server.registry.add_channel(self.config.name, self)
+        self._publish()
+        # peers linked before a reload added the channel learn of it here
+        self.server.relay(self.roster())
+        metrics, name = self.server.metrics, self.config.name
+        self.messages_in = metrics.counter("chat_messages_received_total", "Frames received from clients.", channel=name)
+        self.bytes_in = metrics.counter("chat_received_bytes_total", "Bytes of frames received from clients.", channel=name)
+        self.messages_out = metrics.counter("chat_messages_sent_total", "Frames queued to clients.", channel=name)
+        self.bytes_out = metrics.counter("chat_sent_bytes_total", "Bytes of frames queued to clients.", channel=name)
+        self.fanout = metrics.histogram("chat_fanout_seconds", "Time to queue one broadcast to every member.", channel=name)
+        self.rate_limited = metrics.counter("chat_rate_limited_total", "Chat messages dropped for exceeding a rate limit.", channel=name)
+        metrics.gauge("chat_members", "Seated clients.", lambda: len(self._clients), channel=name)
+        metrics.gauge("chat_waiting", "Clients in the waiting queue.", lambda: len(self._waitlist), channel=name)
+        metrics.gauge("chat_events_queued", "Admin events waiting for the channel's handler.", self._events.qsize, channel=name)
+        metrics.gauge("chat_outbound_frames", "Frames waiting in client send queues.", lambda: sum(frames for frames, _ in self.queue_depths().values()), channel=name)
+        config = self.server.config
+        self._rate = RateLimit.of(config.channel_rate_messages, config.channel_rate_bytes, config.rate_burst)
+        self._recent = deque(maxlen=config.resume_frames)
+        if self.config.large and self.server.fanout is None:
+            self.server.fanout = FanoutPool(size=config.fanout_shards)
+        if config.history_dir:
+            self.history = MessageLog(
+                directory=os.path.join(config.history_dir, self.config.name),
+                segment_bytes=config.history_segment_bytes,
+                fsync_interval=config.history_fsync,
+            )
         
+        if self.server.reactor is not None:
+            self.server.reactor.add_reader(self.sock, self._accept)
+            return
         self._listen_thread = threading.Thread(target=self._listen)
         self._handle_thread = threading.Thread(target=self._handler)
         self._listen_thread.start()
         self._handle_thread.start()
 
+    def post(self, event: Event) -> None:
+        if self.server.reactor is not None:
+            self.server.reactor.call_soon_threadsafe(self._handle, event)
+        else:
+            self._events.put(event)
+
+    def call(self, callback: Callable, *args) -> None:
+        # runs work where post()ed events are handled; timers hand theirs over here, so
+        # one slow client holds up its own channel rather than every timer in the server
+        if self.server.reactor is not None:
+            self.server.reactor.call_soon_threadsafe(callback, *args)
+        else:
+            self._events.put((callback, args))
+
     def _listen(self) -> None:
         while self.running:
             try:
                 client_sock, addr = self.sock.accept()
             except:
                 continue
-            client_handler = ChannelClientHandler(socket=client_sock, channel=self)
-            if client_handler.name not in self.client_names:
-                if len(self._clients) >= self.config.capacity:
-                    client_handler.send(_Event.serialise(MessageEvent(name="Server Message", message=f"You are in the waiting queue and there are {len(self._waitlist)} user(s) ahead of you.")))
-                    self._waitlist.append(client_handler)
+            # the handler reads the handshake on its own thread and then calls _admit
+            ChannelClientHandler(socket=client_sock, channel=self)
+
+    def _accept(self) -> None:
+        while self.running:
+            try:
+                client_sock, addr = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            # the handler finishes its name handshake on the loop and then calls _admit
+            ChannelClientHandler(socket=client_sock, channel=self)
+
+    def _admit(self, client_handler: ChannelClientHandler) -> None:
+        # the handshake or an in-place switch has already reserved the name
+        if client_handler.running and self.server.registry.holder(self.config.name, client_handler.name) is client_handler:
+            if client_handler._resuming is not None:
+                self._resume(client_handler)
+                return
+            with self._waitlist_lock:
+                waiting = len(self._clients) >= self.config.capacity
+                if waiting:
+                    ahead = self._waitlist.append(client_handler.name, client_handler)
                 else:
                     self._join(client_handler)
+            if waiting:
+                client_handler.send_event(MessageEvent(name="Server Message", message=f"You are in the waiting queue and there are {ahead} user(s) ahead of you."))
+                self._publish()
 
     def _handler(self) -> None:
+        # blocks until an event arrives; shutdown() queues one to wake it
         while self.running:
-            try:
-                event = self._events.get(timeout=1)
-            except:
-                continue
-            match event:
-                case KickEvent(target=t):
-                    for all in list(self._clients.values()) + self._waitlist:
-                        if all.name == t:
-                            self._quit(t)
-                            all.send(_Event.serialise(KickEvent(target=t)))
-                            all.joined = False
-                            print(f"[Server Message] Kicked {t}.", flush=True)
-                            for client in self._clients:
-                                if client != t and client not in self._waitlist:
-                                    client_handler = self._clients.get(client)
-                                    if client_handler != None:
-                                        client_handler.send(_Event.serialise(MessageEvent(name="Server Message",message=f"{t} has left the channel.")))
-                                else:
-                                    pass
-                            if len(self._waitlist):
-                                self._join(self._waitlist.pop(0))
-                                for idx, c in enumerate(self._waitlist):
-                                    c.send(_Event.serialise(MessageEvent(name="Server Message" ,message=f"You are in the waiting queue and there are {idx} user(s) ahead of you.")))
-                            break
-                    else:
-                        print(f'[Server Message] {t} is not in the channel.', flush=True)
-                case ShutdownEvent():
-                    self.running = False
-                case MuteEvent(target=t, duration=d):
-                    target_client = self._clients.get(t)
-                    if target_client:
-                        try:
-                            mute_seconds = int(d)
-                            if mute_seconds <= 0:
-                                raise ValueError
-                            target_client.original_muted = d
-                            target_client.mute_expiry = time() + mute_seconds
-                            target_client.send(_Event.serialise(MessageEvent(name="Server Message", message=f'You have been muted for {mute_seconds} seconds.')))
-                            print(f'[Server Message] Muted {t} for {d} seconds.', flush=True)
-                            for client in self._clients:
-                                if client != t and client not in self._waitlist:
-                                    client_handler = self._clients.get(client)
-                                    if client_handler != None:
-                                        client_handler.send(_Event.serialise(MessageEvent(name="Server Message", message=f'{t} has been muted for {d} seconds.')))
-                                else:
-                                    pass
-                        except ValueError:
-                            print(f"[Server Message] Invalid mute duration.", flush=True)                        
-                    else:
-                        print(f"[Server Message] {t} is not in the channel.", flush=True)
-                case EmptyEvent():
-                    print(f'[Server Message] "{self.config.name}" has been emptied.', flush=True)
-                    for c in list(self._clients.values()):
-                        self._quit(c.name)
-                        c.send(_Event.serialise(KickEvent(target=c.name)))
-                        c.joined = False        
-                        if len(self._waitlist):
-                            self._join(self._waitlist.pop(0))
-                            for idx, c in enumerate(self._waitlist):
-                                c.send(_Event.serialise(MessageEvent(name="Server Message" ,message=f"You are in the waiting queue and there are {idx} user(s) ahead of you.")))
+            match self._events.get():
+                case (callback, args):
+                    callback(*args)
+                case event:
+                    self._handle(event)
+
+    def _handle(self, event: Event) -> None:
+        match event:
+            case KickEvent(target=t):
+                target_client = self._clients.get(t) or self._waitlist.get(t)
+                if target_client:
+                    # leave first: the kicked client closes as soon as it sees the event
+                    self._leave(target_client)
+                    target_client.send_event(KickEvent(target=t))
+                    self.server.log.emit(f"[Server Message] Kicked {t}.")
+                else:
+                    self.server.log.emit(f'[Server Message] {t} is not in the channel.')
+            case ShutdownEvent():
+                self.running = False
+            case MuteEvent(target=t, duration=d):
+                target_client = self._clients.get(t)
+                if target_client:
+                    try:
+                        mute_seconds = int(d)
+                        if mute_seconds <= 0:
+                            raise ValueError
+                        target_client.original_muted = d
+                        target_client.mute(mute_seconds)
+                        target_client.send_event(MessageEvent(name="Server Message", message=f'You have been muted for {mute_seconds} seconds.'))
+                        self.server.log.emit(f'[Server Message] Muted {t} for {d} seconds.')
+                        for client in self._clients:
+                            if client != t and client not in self._waitlist:
+                                client_handler = self._clients.get(client)
+                                if client_handler != None:
+                                    client_handler.send_event(MessageEvent(name="Server Message", message=f'{t} has been muted for {d} seconds.'))
+                            else:
+                                pass
+                    except ValueError:
+                        self.server.log.emit(f"[Server Message] Invalid mute duration.")
+                else:
+                    self.server.log.emit(f"[Server Message] {t} is not in the channel.")
+            case EmptyEvent():
+                self.server.log.emit(f'[Server Message] "{self.config.name}" has been emptied.')
+                for c in self._clients.values():
+                    self._quit(c.name)
+                    c.send_event(KickEvent(target=c.name))
+                    c.joined = False
+                self._fill()
+            case ResizeEvent(capacity=capacity):
+                # a smaller capacity seats nobody new; nobody already seated is removed
+                self.config.capacity = capacity
+                self.server.log.emit(f'[Server Message] "{self.config.name}" now has a capacity of {capacity}.')
+                self._fill()
+            case CloseEvent(successor=successor):
+                self._close(successor)
+
+    def _close(self, successor: str) -> None:
+        # removed by a reload: stop admitting, move everyone to the successor, then let go
+        self.running = False
+        self.server.log.emit(f'[Server Message] Channel "{self.config.name}" is closed; its users are moved to "{successor}".')
+        registry = self.server.registry
+        target = registry.channel(successor)
+        # the back of the queue first, so nobody still waiting sees their position change
+        for client in [*list(self._waitlist)[::-1], *self._clients.values()]:
+            client.send_event(MessageEvent(name="Server Message", message=f'Channel "{self.config.name}" has been closed.'))
+            taken = target is None or (not registry.reserve(successor, client.name, client) if client.mux else registry.holder(successor, client.name) is not None)
+            if taken:
+                self._leave(client)
+                client.send_event(KickEvent(target=client.name))
+                self.server.log.emit(f"[Server Message] Kicked {client.name}.")
+            else:
+                client._move(target)
+        if self.server.reactor is not None:
+            self.server.reactor.remove_reader(self.sock)
+        else:
+            # the handler thread is this one and returns once running is False
+            wake_listener(self.sock)
+            self._listen_thread.join()
+        self.sock.close()
+        registry.remove_channel(self.config.name)
+        # peers stop counting this node's seats
+        self.server.relay(PeerRosterEvent(channel=self.config.name, capacity=0, waiting=0, names=""))
+        self.server.metrics.remove(channel=self.config.name)
+        self._close_history()
 
     def _join(self, client: ChannelClientHandler) -> None:
         if self.running:
-            self._clients[client.name] = client
-            print(f'[Server Message] {client.name} has joined the channel "{self.config.name}".', flush=True)      
+            self._seat(client)
+            self._publish()
+            self.server.log.emit(f'[Server Message] {client.name} has joined the channel "{self.config.name}".', event="join", channel=self.config.name, user=client.name)
             client.join()
+            self._replay(client)
+
+    def _park(self, client: ChannelClientHandler) -> None:
+        # the dropped client keeps its seat and name; broadcasts to it are discarded meanwhile
+        grace = self.server.config.resume_grace
+        client._parked_at = self._last_broadcast
+        self.server._parked[client.resume_token] = client
+        client._grace_timer = self.server.timers.schedule(grace, self.call, self._expire, client)
+        self.server.log.emit(f"[Server Message] {client.name} lost its connection; the seat is held for {grace} seconds.")
+
+    def _expire(self, client: ChannelClientHandler) -> None:
+        if self.server._parked.pop(client.resume_token, None) is not client:
+            return
+        self.server.timers.cancel(client._mute_timer)
+        self.server.log.emit(f"[Server Message] {client.name} has left the channel.", event="leave", channel=self.config.name, user=client.name)
+        self._leave(client)
+
+    def _resume(self, client: ChannelClientHandler) -> None:
+        # the new connection takes the parked session's seat and mute, then gets what it missed
+        parked, client._resuming = client._resuming, None
+        timers = self.server.timers
+        if parked._mute_timer is not None and timers.cancel(parked._mute_timer):
+            client.original_muted = parked.original_muted
+            client.mute(timers.seconds(parked._mute_timer.deadline - timers.now))
+        client._rate = parked._rate
+        lost, missed = self._seat(client, parked)
+        self.server.log.emit(f'[Server Message] {client.name} has resumed in the channel "{self.config.name}".', event="resume", channel=self.config.name, user=client.name)
+        client.join()
+        if lost:
+            client.send_event(MessageEvent(name="Server Message", message=f"{lost} message(s) were missed while you were away."))
+        for frame in missed:
+            client.send(client.compressed(frame))
+
+    def _replay(self, client: ChannelClientHandler) -> None:
+        # the stored frames go out as they were broadcast, straight from the mapped log
+        limit = self.server.config.history_replay
+        if self.history is None or not limit:
+            return
+        if client.replay_since is not None:
+            frames = self.history.since(client.replay_since, limit)
+        else:
+            frames = self.history.tail(limit)
+        for frame in frames:
+            client.send(client.compressed(frame))
+
+    def _seat(self, client: ChannelClientHandler, parked: ChannelClientHandler | None = None) -> tuple[int, list[bytes]]:
+        # a resumed client takes the seat of its parked session, which leaves its slice, and
+        # gets back how many broadcasts since it was parked are gone and the ones still kept.
+        # _fan_out numbers a broadcast and picks its members under the same lock, so each
+        # one is either in that replay or sent to the new seat, never both or neither
+        lost, missed = 0, []
+        with self._seats_lock:
+            self._clients = MappingProxyType({**self._clients, client.name: client})
+            if self.config.large:
+                slices = dict(self._slices)
+                if parked is not None:
+                    slices[parked._writer] = tuple(c for c in slices[parked._writer] if c is not parked)
+                slices[client._writer] = (*slices.get(client._writer, ()), client)
+                self._slices = MappingProxyType(slices)
+            if parked is not None:
+                missed = [frame for number, frame in self._recent if number > parked._parked_at]
+                lost = self._last_broadcast - parked._parked_at - len(missed)
+        self.server.relay(PeerPresenceEvent(channel=self.config.name, name=client.name, seated=1))
+        return lost, missed
+
+    def _unseat(self, name: str) -> ChannelClientHandler:
+        with self._seats_lock:
+            clients = dict(self._clients)
+            client = clients.pop(name)
+            self._clients = MappingProxyType(clients)
+            if self.config.large:
+                writer = client._writer
+                self._slices = MappingProxyType({**self._slices, writer: tuple(c for c in self._slices[writer] if c is not client)})
+        self.server.relay(PeerPresenceEvent(channel=self.config.name, name=name, seated=0))
+        return client
 
     def _quit(self, name) -> None:
-        self._clients.pop(name)
+        client = self._unseat(name)
+        if client.resume_token is not None:
+            # kicked or emptied out while parked
+            self.server._parked.pop(client.resume_token, None)
+        self.server.registry.release(self.config.name, name, client)
+        self._publish()
+
+    def _leave(self, client: ChannelClientHandler) -> bool:
+        # every way out of the channel ends here; True if the client held a seat
+        with self._waitlist_lock:
+            # _fill may be seating this very client
+            waiting = not client.joined
+            if waiting:
+                self._waitlist.remove(client.name)
+        if waiting:
+            self.server.registry.release(self.config.name, client.name, client)
+            self._fill()
+            return False
+        self._quit(client.name)
+        client.joined = False
+        if not self.config.large:
+            # in a large channel every departure would cost a frame to every member
+            self.broadcast(MessageEvent(name="Server Message", message=f"{client.name} has left the channel."))
+        self._fill()
+        return True
+
+    def _fill(self) -> None:
+        # seat waiting clients while there is room, then send each one whose
+        # position changed a single update, however many clients left
+        with self._waitlist_lock:
+            while self._waitlist and len(self._clients) < self.config.capacity and self.running:
+                self._join(self._waitlist.popleft())
+            moved = list(self._waitlist.moved())
+        for c, ahead in moved:
+            c.send_event(MessageEvent(name="Server Message", message=f"You are in the waiting queue and there are {ahead} user(s) ahead of you."))
+        self._publish()
+
+    def info(self) -> ChannelInfo:
+        # a channel shared with peers counts their seats and queues too
+        rosters = self.server.rosters(self.config.name)
+        return ChannelInfo(
+            name=self.config.name,
+            port=self.config.port,
+            capacity=self.config.capacity + sum(r.capacity for r in rosters),
+            members=len(self._clients) + sum(len(r.names) for r in rosters),
+            waiting=len(self._waitlist) + sum(r.waiting for r in rosters),
+            client_names=tuple(self.client_names),
+        )
+
+    def roster(self) -> PeerRosterEvent:
+        return PeerRosterEvent(channel=self.config.name, capacity=self.config.capacity, waiting=len(self._waitlist), names="\0".join(self._clients))
+
+    def _publish(self) -> None:
+        # peers keep this node's capacity and queue length for /list; names go as presence
+        occupancy = (self.config.capacity, len(self._waitlist))
+        if occupancy != self._occupancy:
+            self._occupancy = occupancy
+            self.server.relay(PeerOccupancyEvent(channel=self.config.name, capacity=occupancy[0], waiting=occupancy[1]))
+        # keep the cross-worker directory current for /list and /switch in other processes
+        if self.server.directory is None:
+            return
+        try:
+            self.server.directory[self.config.name] = self.info()
+        except (OSError, EOFError):
+            # the supervisor has already shut the directory down
+            pass
+
+    def queue_depths(self) -> dict[str, tuple[int, int]]:
+        # (frames, bytes) waiting in each member's outbound queue
+        return {c.name: (c.queue_depth, c.queue_bytes) for c in [*self._clients.values(), *self._waitlist]}
         
     def broadcast(self, event: Event) -> None:
-        for client in self._clients.values():
-            client.send(_Event.serialise(event))
+        frame = _Event.frame(event)
+        self._fan_out(frame)
+        # each peer fans it out to its own members, and passes on nothing it was relayed
+        self.server.relay(PeerRelayEvent(channel=self.config.name, frame=frame))
+
+    def _fan_out(self, frame: bytes) -> None:
+        if self.history is not None:
+            self.history.append(frame)
+        with self._seats_lock:
+            self._last_broadcast = number = next(self._broadcast_ids)
+            self._recent.append((number, frame))
+            clients, slices = self._clients, self._slices
+        started = time.perf_counter()
+        if self.config.large:
+            for writer, members in slices.items():
+                if writer is None or writer.in_loop_thread():
+                    self._deliver(members, frame)
+                else:
+                    # the shard writes its slice; this thread only hands it over
+                    writer.call_soon_threadsafe(self._deliver, members, frame)
+        else:
+            self._deliver(clients.values(), frame)
+        self.fanout.observe(time.perf_counter() - started)
+
+    def _deliver(self, members: Iterable[ChannelClientHandler], frame: bytes) -> None:
+        threshold = self.server.config.compress_threshold
+        if threshold and len(frame) >= threshold:
+            # compressed at most once per codec, however many members negotiated it
+            packed: dict[Codec | None, bytes] = {None: frame}
+            for client in members:
+                if (variant := packed.get(client.codec)) is None:
+                    variant = packed[client.codec] = compress_frame(frame, client.codec)
+                client.send(variant)
+        else:
+            for client in members:
+                client.send(frame)
     
     def all_broadcast(self, event: Event) -> None:
-        for all in list(self._clients.values()) + self._waitlist:
-            all.send(_Event.serialise(event))
+        frame = _Event.frame(event)
+        for all in [*self._clients.values(), *self._waitlist]:
+            all.send(frame)
     
     def shutdown(self):
         self.running = False
         self.all_broadcast(ShutdownEvent())
+        if self.server.reactor is not None:
+            self.server.reactor.remove_reader(self.sock)
+            self.sock.close()
+            self._close_history()
+            return
+        # every thread blocks without a timeout, so each one is woken explicitly
+        wake_listener(self.sock)
+        self._events.put(ShutdownEvent())
+        clients = [*self._clients.values(), *self._waitlist]
+        for client in clients:
+            client.stop_reading()
+        # let every member log its departure before the server reports it has shut down
+        for client in clients:
+            if client._receive_thread is not None:
+                client._receive_thread.join(timeout=1.0)
         self._listen_thread.join()
         self._handle_thread.join()
+        self.sock.close()
+        self._close_history()
+
+    def _close_history(self) -> None:
+        if self.history is not None:
+            self.history.close()
                 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, eq=False)
 class ChannelClientHandler:
     socket: socket
     channel: ChannelServer
-    name: str = field(init=False)
-    mute_expiry: float = 0.0
+    # accepted on the multiplexed port: the handshake picks the channel and /switch moves in place
+    mux: bool = False
+    name: str = field(default="", init=False)
     joined: bool = False
     running: bool = True
     original_muted: int = field(init=False)
+    # wheel tick of the last event received, checked when the AFK timer fires
+    last_active: int = field(default=0, init=False)
+    # unix time from the "since" handshake option: replay history from then instead of the last few
+    replay_since: float | None = field(default=None, init=False)
+    # agreed in the handshake; None sends and accepts only plain frames
+    codec: Codec | None = field(default=None, init=False)
+    _compress_offer: str | None = field(default=None, init=False)
+    # issued at the handshake to a client that asked; presenting it after a drop resumes the session
+    resume_token: str | None = field(default=None, init=False)
+    _resume_offer: str | None = field(default=None, init=False)
+    # the parked session this connection takes over, from handshake until admission
+    _resuming: ChannelClientHandler | None = field(default=None, init=False)
+    # number of the last broadcast before the connection dropped
+    _parked_at: int = field(default=0, init=False)
+    _grace_timer: Timer | None = field(default=None, init=False)
+    _handshake_timer: Timer | None = field(default=None, init=False)
+    _afk_timer: Timer | None = field(default=None, init=False)
+    _mute_timer: Timer | None = field(default=None, init=False)
+    _rate: RateLimit | None = field(init=False)
+    # set by the first message over a limit so the sender hears about it once, not per message
+    _throttled: bool = field(default=False, init=False)
+    _outbound: OutboundQueue = field(init=False)
+    # the reactor that writes this connection: the server's loop, or a fan-out shard for a
+    # large channel's member; None while a writer thread of its own does
+    _writer: Reactor | None = field(default=None, init=False)
+    _writer_thread: Thread | None = field(default=None, init=False)
+    _receive_thread: Thread | None = field(default=None, init=False)
+    _reader: FrameReader = field(init=False)
+    # event loop mode: waiting for the socket to drain, with the writer registered
+    _blocked: bool = field(default=False, init=False)
+    _closed: bool = field(default=False, init=False)
 
     def __post_init__(self) -> None:
-        self.name = self.socket.recv(1024).decode()
-        channel_client_names = self.channel.client_names
-        self.socket.settimeout(1)
-        if self.name in channel_client_names:
-            self.socket.send(self.channel.config.name.encode())
+        config = self.channel.server.config
+        self._reader = FrameReader(max_frame_size=config.max_frame_bytes)
+        self._rate = RateLimit.of(config.rate_messages, config.rate_bytes, config.rate_burst)
+        # writes are already batched here, so Nagle would only add delay
+        self.socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        policy = config.overflow
+        if self.channel.server.reactor is not None and policy == "block":
+            # the loop thread must never block on one client, so a full queue disconnects instead
+            policy = "disconnect"
+        self._outbound = OutboundQueue(
+            max_frames=config.queue_frames,
+            max_bytes=config.queue_bytes,
+            policy=policy,
+            timeout=config.overflow_timeout,
+            max_bulk_bytes=config.queue_file_bytes,
+        )
+        self._writer = self.channel.server.reactor
+        self._handshake_timer = self.channel.server.timers.schedule(config.handshake_timeout, self._handshake_expired)
+        self.channel.server.connections_accepted.inc()
+        self.channel.server._track(self)
+        if self.channel.server.reactor is not None:
+            # event loop mode: the name arrives as the first readable chunk
+            self.socket.setblocking(False)
+            self.channel.server.reactor.add_reader(self.socket, self._on_readable)
+            self.channel.server._open_connections += 1
+            return
+        self._receive_thread = Thread(target=self.receive_handler)
+        self._receive_thread.start()
+
+    def _greet(self) -> bool:
+        # threaded mode reads the name on the connection's own thread, so a silent
+        # client cannot stall the listener; the handshake timer closes it instead
+        try:
+            hello = self.socket.recv(1024)
+        except OSError:
+            hello = b""
+        expired = not self.channel.server.timers.cancel(self._handshake_timer)
+        if not expired and not hello:
+            self.channel.server.handshake_failures.inc()
+        if expired or not hello or not self._hello(hello):
             self.running = False
-        else:
-            self.socket.send(b"Y")
-            receive_thread = Thread(target=self.receive_handler)
-            receive_thread.start()
+            self.socket.close()
+            self.channel.server.connections_closed.inc()
+            self.channel.server._untrack(self)
+            return False
+        self._assign_writer()
+        self.channel._admit(self)
+        return True
+
+    def _assign_writer(self) -> None:
+        # once the handshake has settled the channel; a shard must never block on one
+        # client any more than the loop may
+        server = self.channel.server
+        if self.channel.config.large:
+            self._writer = server.fanout.assign()
+            if self._outbound.policy == "block":
+                self._outbound.policy = "disconnect"
+        elif server.reactor is None:
+            self._writer_thread = Thread(target=self.write_handler)
+            self._writer_thread.start()
+
+    def _handshake_expired(self) -> None:
+        self.channel.server.handshake_failures.inc()
+        self.channel.server.log.emit(f"[Server Message] A connection to \"{self.channel.config.name}\" did not send a name in time.")
+        if self.channel.server.reactor is not None:
+            self._close()
+            return
+        try:
+            self.socket.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+
+    def drop(self) -> None:
+        # shutdown's last word: closes the connection whatever state it is in
+        if self.channel.server.reactor is not None:
+            self._close()
+            return
+        # wakes the receive thread, even from the handshake's recv; it closes the socket
+        self.channel.server.timers.cancel(self._handshake_timer)
+        try:
+            self.socket.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+        if self._receive_thread is not None:
+            self._receive_thread.join(timeout=1.0)
+
+    def stop_reading(self) -> None:
+        # wakes the blocked receive thread, which then drains the writer and closes
+        try:
+            self.socket.shutdown(SHUT_RD)
+        except OSError:
+            pass
+
+    def _hello(self, data: bytes) -> bool:
+        self.name, options = parse_hello(data)
+        try:
+            self.replay_since = float(options["since"]) if "since" in options else None
+        except ValueError:
+            pass
+        self._compress_offer = options.get("compress")
+        self._resume_offer = options.get("resume")
+        if self.mux and "channel" in options:
+            channel = self.channel.server.find_channel(options["channel"])
+            if channel is None:
+                self.channel.server.handshake_failures.inc()
+                self.socket.send(refuse(UNKNOWN_CHANNEL, options["channel"]))
+                self.running = False
+                return False
+            self.channel = channel
+        return self._handshake()
+
+    def _take_over(self) -> bool:
+        # claims the parked session named by the offered token, if it is this user's and the
+        # connection can reach its channel
+        server = self.channel.server
+        parked = server._parked.get(self._resume_offer)
+        if parked is None or parked.name != self.name or not (self.mux or parked.channel is self.channel):
+            return False
+        if server._parked.pop(self._resume_offer, None) is not parked:
+            # expired meanwhile
+            return False
+        server.timers.cancel(parked._grace_timer)
+        self.channel = parked.channel
+        if not server.registry.replace(self.channel.config.name, self.name, parked, self):
+            return False
+        self._resuming = parked
+        return True
+
+    def _handshake(self) -> bool:
+        resumed = bool(self._resume_offer) and self._take_over()
+        # a name seated on a peer is taken too; two nodes admitting it at the same moment both win
+        taken = self.channel.server.peer_holding(self.channel.config.name, self.name) is not None
+        if not resumed and (taken or not self.channel.server.registry.reserve(self.channel.config.name, self.name, self)):
+            self.channel.server.handshake_failures.inc()
+            self.socket.send(refuse(NAME_TAKEN, self.channel.config.name))
+            self.running = False
+            return False
+        agreed = {}
+        if self._compress_offer is not None:
+            if self.channel.server.config.compress_threshold:
+                self.codec = negotiate(self._compress_offer)
+            agreed["compress"] = "" if self.codec is None else self.codec.name
+        if self._resume_offer is not None:
+            # a fresh token every connection; an empty one means the server keeps no sessions
+            if self.channel.server.config.resume_grace:
+                self.resume_token = secrets.token_urlsafe(16)
+            agreed["resume"] = self.resume_token or ""
+        self.socket.send(accept(**agreed))
+        return True
     
     @property
     def is_muted(self):
-        return time() < self.mute_expiry
-    
-    def remaining_mute(self) -> int:
-        return int(max(0, self.mute_expiry - time()))
+        return self._mute_timer is not None
+
+    def mute(self, seconds: int) -> None:
+        timers = self.channel.server.timers
+        timers.cancel(self._mute_timer)
+        self._mute_timer = timers.schedule(seconds, self._on_channel, self._unmute)
+
+    def _on_channel(self, callback: Callable, *args) -> None:
+        # a timer's work goes to whichever channel the client is in when it fires
+        self.channel.call(callback, *args)
+
+    def _unmute(self) -> None:
+        if self._mute_timer is None or not self._mute_timer.fired:
+            # muted again after this timer fired
+            return
+        self._mute_timer = None
+        if self.joined:
+            self.send_event(MessageEvent(name="Server Message", message="You are no longer muted."))
     
+    def _within_rate(self, size: int) -> bool:
+        now = time.monotonic()
+        if self._rate is not None and not self._rate.allow(size, now):
+            self._over_rate(self.channel.server.config.rate_policy)
+            return False
+        if (limit := self.channel._rate) is not None and not limit.allow(size, now):
+            # the whole channel is over budget, which is no reason to mute this sender
+            self._over_rate("drop")
+            return False
+        self._throttled = False
+        return True
+
+    def _over_rate(self, policy: str) -> None:
+        self.channel.rate_limited.inc()
+        if self._throttled:
+            return
+        self._throttled = True
+        match policy:
+            case "mute":
+                # the admin /mute path, so expiry and the notices are the same
+                self.channel.server.log.emit(f"[Server Message] {self.name} exceeded the rate limit.")
+                self.channel.post(MuteEvent(target=self.name, duration=str(self.channel.server.config.rate_mute)))
+            case "drop":
+                self.send_event(MessageEvent(name="Server Message", message="You are sending too fast; your messages are being dropped."))
+
     def join(self) -> None:
         self.joined = True
-        self.send(_Event.serialise(JoinEvent(channel=self.channel.config.name)))
+        if afk_time := self.channel.server.config.afk_time:
+            timers = self.channel.server.timers
+            timers.cancel(self._afk_timer)
+            self._afk_timer = timers.schedule(afk_time, self._on_channel, self._afk_check)
+            self.last_active = timers.now
+        self.send_event(JoinEvent(channel=self.channel.config.name))
+
+    def _afk_check(self) -> None:
+        if not self.joined or not self.running:
+            return
+        timers = self.channel.server.timers
+        afk_time = self.channel.server.config.afk_time
+        idle = timers.seconds(timers.now - self.last_active)
+        if idle < afk_time:
+            # the client spoke since the timer was set, so wait out the rest of the window
+            self._afk_timer = timers.schedule(afk_time - idle, self._on_channel, self._afk_check)
+            return
+        self.channel.server.log.emit(f"[Server Message] {self.name} went AFK.")
+        self.channel._leave(self)
+        self.send_event(MessageEvent(name="Server Message", message="You went AFK."))
+        self.send_event(QuitEvent(name=self.name))
 
     def message(self,message: str):
         message_event = MessageEvent(name="server", message=message)
         self.socket.send(message_event._serialise())        
             
-    def send(self,message:bytes):
-        length = len(message)
-        self.socket.send(struct.pack(f"!I", length) + message)
-                
-    def receive_handler(self):
-        while self.running:
+    def send_event(self, event: Event) -> None:
+        self.send(self.compressed(_Event.frame(event)))
+
+    def compressed(self, frame: bytes) -> bytes:
+        # for frames to this client alone; broadcasts compress once for every member
+        if self.codec is None or len(frame) < self.channel.server.config.compress_threshold:
+            return frame
+        return compress_frame(frame, self.codec)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._outbound.depth
+
+    @property
+    def queue_bytes(self) -> int:
+        return self._outbound.nbytes
+
+    def send(self, frame: bytes) -> None:
+        # frames are shared between recipients of a broadcast and must not be mutated
+        writer = self._writer
+        if writer is not None and not writer.in_loop_thread():
+            # a shard's member, sent to from outside its slice of a broadcast
+            writer.call_soon_threadsafe(self.send, frame)
+            return
+        self.channel.messages_out.inc()
+        self.channel.bytes_out.inc(len(frame))
+        if not self._outbound.put(frame):
+            self._slow_consumer()
+        elif writer is not None and not self._blocked:
+            config = self.channel.server.config
+            depth = self._outbound.depth
+            # a full batch goes at once, or one loop pass of a burst could overflow the queue
+            if depth >= WRITE_BATCH or depth >= config.flush_frames > 1:
+                self._flush()
+            elif depth == 1:
+                # the first frame of a batch sets its deadline; with no delay, everything
+                # queued in the same loop pass still goes out together
+                if config.flush_delay:
+                    writer.call_later(config.flush_delay / 1e6, self._flush)
+                else:
+                    writer.call_soon(self._flush)
+
+    def send_bulk(self, frame: bytes) -> None:
+        # file chunks skip the overflow policy; the receive side holds each sender to its window
+        writer = self._writer
+        if writer is not None and not writer.in_loop_thread():
+            writer.call_soon_threadsafe(self.send_bulk, frame)
+            return
+        self.channel.messages_out.inc()
+        self.channel.bytes_out.inc(len(frame))
+        if not self._outbound.put_bulk(frame):
+            self._slow_consumer()
+        elif writer is not None and not self._blocked:
+            self._flush()
+
+    def _slow_consumer(self) -> None:
+        self._outbound.close()
+        self._outbound.clear()
+        self.channel.server.log.emit(f"[Server Message] {self.name} is not keeping up and has been disconnected.")
+        self._hang_up()
+
+    def _hang_up(self) -> None:
+        # the writing side gives up on the connection; the reading side tears it down
+        reactor = self.channel.server.reactor
+        if reactor is None:
             try:
-                message_length_b = self.socket.recv(4)
-                if not message_length_b:
-                    break
-                message_length = struct.unpack("!I",message_length_b)[0]
-                message = self.socket.recv(message_length)
-            except TimeoutError:
-                continue
-            except (ConnectionResetError, BrokenPipeError):
+                self.socket.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
+        elif reactor is self._writer:
+            # we may be inside a broadcast, so leave on the next loop pass
+            reactor.call_soon(self._close)
+        else:
+            reactor.call_soon_threadsafe(self._close)
+
+    def write_handler(self) -> None:
+        config = self.channel.server.config
+        while (frames := self._outbound.take(config.flush_frames, config.flush_delay / 1e6)) is not None:
+            try:
+                send_frames(self.socket, frames)
+            except OSError:
+                self._outbound.close()
+                self._outbound.clear()
+                try:
+                    self.socket.shutdown(SHUT_RDWR)
+                except OSError:
+                    pass
                 break
-            except:
+
+    def _flush(self) -> None:
+        reactor = self._writer
+        assert reactor is not None
+        if self.socket.fileno() < 0:
+            # a deferred flush for a connection closed since
+            return
+        while frames := self._outbound.heads():
+            try:
+                # a lone frame skips building the iovec; a threaded connection's socket
+                # blocks for its reader, so a shard asks for each write not to
+                sent = self.socket.send(frames[0], MSG_DONTWAIT) if len(frames) == 1 else self.socket.sendmsg(frames, (), MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
                 break
-            if not message_length_b:
+            except OSError:
+                self._outbound.close()
+                self._outbound.clear()
+                self._hang_up()
+                return
+            self._outbound.consume(sent)
+            if sent < (len(frames[0]) if len(frames) == 1 else sum(map(len, frames))):
                 break
-            self.receive(message)
-            
-        self.running = False
-        if self.joined:
-            self.channel._quit(self.name)
-            self.joined = False
-            print(f"[Server Message] {self.name} has left the channel.", flush=True)
-            for client in self.channel._clients:
-                if client != self.name and client not in self.channel._waitlist:
-                    client_handler = self.channel._clients.get(client)
-                    if client_handler:
-                        client_handler.send(_Event.serialise(MessageEvent(name="Server Message", message=f"{self.name} has left the channel.")))
-            if len(self.channel._waitlist):
-                self.channel._join(self.channel._waitlist.pop(0))
-                for idx, c in enumerate(self.channel._waitlist):
-                    c.send(_Event.serialise(MessageEvent(name="Server Message", message=f"You are in the waiting queue and there are {idx} user(s) ahead of you.")))
+        self._blocked = self._outbound.depth > 0
+        if self._blocked:
+            reactor.add_writer(self.socket, self._flush)
+        else:
+            reactor.remove_writer(self.socket)
+
+    def _on_readable(self) -> None:
+        if not self.name:
+            try:
+                data = self.socket.recv(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                data = b""
+            self.channel.server.timers.cancel(self._handshake_timer)
+            if not data:
+                self.channel.server.handshake_failures.inc()
+                self._close()
+            else:
+                if self._hello(data):
+                    self._assign_writer()
+                    self.channel._admit(self)
+                else:
+                    self._close()
+            return
+        try:
+            received = self._reader.recv_from(self.socket)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            received = 0
+        if not received:
+            self._close()
+            return
+        try:
+            for message in self._reader.frames():
+                self.receive(message)
+                if not self.running:
+                    return
+        except FrameError:
+            self._close()
+
+    def _close(self) -> None:
+        reactor = self.channel.server.reactor
+        assert reactor is not None
+        if self._closed:
+            return
+        self._closed = True
+        self._outbound.close()
+        reactor.remove_reader(self.socket)
+        self._release_socket()
+        if self.running:
+            self.running = False
+            self._disconnected()
+        self.channel.server.connections_closed.inc()
+        self.channel.server._untrack(self)
+        self.channel.server._connection_closed()
                 
-    def receive(self, message:bytes):
-        event = _Event.deserialise(message)
+    def receive_handler(self):
+        if not self._greet():
+            return
+        try:
+            while self.running:
+                try:
+                    received = self._reader.recv_from(self.socket)
+                except OSError:
+                    break
+                if not received:
+                    break
+                for message in self._reader.frames():
+                    self.receive(message)
+        except FrameError:
+            pass
+        finally:
+            # runs even if a bad frame raised, so the writer thread is never left behind
+            self.running = False
+            self._disconnected()
+            self._outbound.close()
+            if self._writer_thread is not None:
+                self._writer_thread.join()
+            self._release_socket()
+            self.channel.server.connections_closed.inc()
+            self.channel.server._untrack(self)
+
+    def _release_socket(self) -> None:
+        # a shard lets go of the socket on its own thread, after writing what it can of
+        # what is still queued, as a writer thread drains before it exits
+        writer = self._writer
+        if writer is not None and writer is not self.channel.server.reactor and writer.running:
+            # once the shards have stopped, at shutdown, the socket is simply closed here
+            if not writer.in_loop_thread():
+                writer.call_soon_threadsafe(self._release_socket)
+                return
+            self._flush()
+        if writer is not None and writer.running:
+            writer.remove_writer(self.socket)
+        self.socket.close()
+
+    def _abort_transfers(self) -> None:
+        transfers = self.channel.server._transfers
+        for transfer in list(transfers.values()):
+            if transfer.sender is self or transfer.receiver is self:
+                transfers.pop(transfer.id, None)
+                other = transfer.receiver if transfer.sender is self else transfer.sender
+                other.send_event(FileAckEvent(transfer=transfer.id, received=TRANSFER_ABORTED))
+
+    def _disconnected(self) -> None:
+        timers = self.channel.server.timers
+        # a parked session keeps its mute; resuming or expiring settles it
+        parking = self.joined and self.resume_token is not None and self.channel.running
+        for timer in (self._handshake_timer, self._afk_timer, *(() if parking else (self._mute_timer,))):
+            timers.cancel(timer)
+        self._abort_transfers()
+        if parking:
+            self.channel._park(self)
+            return
+        if self.joined or self._resuming is not None:
+            # a resuming connection that drops before admission gives up the parked seat
+            self.channel.server.log.emit(f"[Server Message] {self.name} has left the channel.", event="leave", channel=self.channel.config.name, user=self.name)
+            self.channel._leave(self if self.joined else self._resuming)
+        elif self.channel._waitlist.get(self.name) is self:
+            self.channel._leave(self)
+        # a connection that dropped between handshake and admission still holds its name
+        self.channel.server.registry.release(self.channel.config.name, self.name, self)
+                
+    def receive(self, message: bytes | memoryview):
+        # counted as on the wire, length prefix included
+        self.channel.messages_in.inc()
+        self.channel.bytes_in.inc(len(message) + 4)
+        body = decompress_body(message, self.codec, self.channel.server.config.max_frame_bytes)
+        event = _Event.deserialise(body)
+        self.last_active = self.channel.server.timers.now
         match event:
                 case MessageEvent(name=n, message=m):
                     if self.joined and not self.is_muted:
                         assert self.name == n
-                        print(f"[{n}] {m}", flush=True)
+                        if not self._within_rate(len(message) + 4):
+                            return
+                        self.channel.server.log.emit(f"[{n}] {m}", event="message", channel=self.channel.config.name, user=n)
                         self.channel.broadcast(event)
                     elif self.is_muted:
-                        self.send(_Event.serialise(MessageEvent(name="Server Message", message=f'You are still in mute for {self.original_muted} seconds.')))
+                        self.send_event(MessageEvent(name="Server Message", message=f'You are still in mute for {self.original_muted} seconds.'))
                 case QuitEvent(name=name):
-                    self.channel._quit(name)
-                    self.send(_Event.serialise(QuitEvent(name=name)))
-                    self.joined = False
-                    print(f"[Server Message] {name} has left the channel.", flush=True)
-                    for client in self.channel._clients:
-                        if client != name and client not in self.channel._waitlist:
-                            client_handler = self.channel._clients.get(client)
-                            if client_handler != None:
-                                client_handler.send(_Event.serialise(MessageEvent(name="Server Message",message=f"{name} has left the channel.")))
-                        else:
-                            pass
-                    if len(self.channel._waitlist):
-                        self.channel._join(self.channel._waitlist.pop(0))
-                        for idx, c in enumerate(self.channel._waitlist):
-                            c.send(_Event.serialise(MessageEvent(name="Server Message" ,message=f"You are in the waiting queue and there are {idx} user(s) ahead of you.")))
-                case SendEvent(name=n, target=receiver, file=f):
+                    self.send_event(QuitEvent(name=name))
+                    if self.joined:
+                        self.channel.server.log.emit(f"[Server Message] {name} has left the channel.", event="leave", channel=self.channel.config.name, user=name)
+                    self.channel._leave(self)
+                case SendEvent(name=n, target=receiver, file=f, size=size):
                     r = self.channel._clients.get(receiver)
-                    if r != None:
-                        self.send(_Event.serialise(SendEvent(name=n, target=receiver, file=f)))
+                    if r != None and self.joined:
+                        transfer = FileTransfer(id=next(self.channel.server._transfer_ids), sender=self, receiver=r, file=f, size=size)
+                        self.channel.server._transfers[transfer.id] = transfer
+                        offer = SendEvent(name=n, target=receiver, file=f, size=size, transfer=transfer.id)
+                        r.send_event(offer)
+                        self.send_event(offer)
                     else:
-                        self.send(_Event.serialise(MessageEvent(name="Server Message", message=f"{receiver} is not in the channel.")))
+                        self.send_event(MessageEvent(name="Server Message", message=f"{receiver} is not in the channel."))
+                        self.send_event(SendEvent(name=n, target=receiver, file=f, size=size))
+                case FileChunkEvent(transfer=t, data=data):
+                    transfer = self.channel.server._transfers.get(t)
+                    if transfer is not None and transfer.sender is self:
+                        transfer.relayed += len(data)
+                        # a sender keeping to its window has at most one chunk beyond it in flight
+                        if transfer.relayed > transfer.size or transfer.relayed - transfer.acked > FILE_WINDOW + FILE_CHUNK_SIZE:
+                            self.channel.server._transfers.pop(t, None)
+                            abort = FileAckEvent(transfer=t, received=TRANSFER_ABORTED)
+                            self.send_event(abort)
+                            transfer.receiver.send_event(abort)
+                        elif body is not message and transfer.receiver.codec is self.codec:
+                            # compressed by the sender with the receiver's codec: pass it on as it came
+                            transfer.receiver.send_bulk(struct.pack("!I", len(message)) + message)
+                        else:
+                            # chunks are never compressed here; that is the sender's choice to make
+                            transfer.receiver.send_bulk(_Event.frame(event))
+                case FileAckEvent(transfer=t, received=received):
+                    transfer = self.channel.server._transfers.get(t)
+                    if transfer is not None and (transfer.sender is self or transfer.receiver is self):
+                        if self is transfer.receiver and received != TRANSFER_ABORTED:
+                            transfer.acked = max(transfer.acked, min(received, transfer.relayed))
+                        if received == TRANSFER_ABORTED or received == transfer.size:
+                            self.channel.server._transfers.pop(t, None)
+                        if received == transfer.size and self is transfer.receiver:
+                            self.channel.server.log.emit(f'[Server Message] {transfer.sender.name} sent "{transfer.file}" to {transfer.receiver.name}.')
+                        other = transfer.sender if self is transfer.receiver else transfer.receiver
+                        other.send_event(event)
                 case WhisperEvent(name=sender, target=receiver, message=msg):
                     r = self.channel._clients.get(receiver)
-                    if r != None:
-                        self.send(_Event.serialise(MessageEvent(name=f"{self.name} whispers to {receiver}", message=msg)))
-                        r.send(_Event.serialise(MessageEvent(name=f"{sender} whispers to you", message=msg)))
-                        print(f"[{sender} whispers to {receiver}] {msg}", flush=True)
-                    else:
-                        self.send(_Event.serialise(MessageEvent(name="Server Message", message=f"{receiver} is not in the channel.")))
+                    peer = None if r != None else self.channel.server.peer_holding(self.channel.config.name, receiver)
+                    if r == None and peer is None:
+                        self.send_event(MessageEvent(name="Server Message", message=f"{receiver} is not in the channel."))
+                    elif self._within_rate(len(message) + 4):
+                        self.send_event(MessageEvent(name=f"{self.name} whispers to {receiver}", message=msg))
+                        if r != None:
+                            r.send_event(MessageEvent(name=f"{sender} whispers to you", message=msg))
+                        else:
+                            # seated on a peer, which delivers it
+                            peer.send(_Event.frame(PeerWhisperEvent(channel=self.channel.config.name, name=sender, target=receiver, message=msg)))
+                        self.channel.server.log.emit(f"[{sender} whispers to {receiver}] {msg}", event="whisper", channel=self.channel.config.name, user=sender, target=receiver)
                 case ListEvent():
-                    for channel in self.channel.server._channels:
-                        self.send(_Event.serialise(MessageEvent(name="Channel", message=f"{channel.config.name} {channel.config.port} Capacity: {len(channel._clients)}/{channel.config.capacity}, Queue: {len(channel._waitlist)}")))
+                    for channel in self.channel.server.channel_infos():
+                        self.send_event(MessageEvent(name="Channel", message=f"{channel.name} {channel.port} Capacity: {channel.members}/{channel.capacity}, Queue: {channel.waiting}"))
                 case SwitchEvent(name=name, channel=channel_name):
-                    original_channel = self.channel
-                    for channel in self.channel.server._channels:
-                        if channel.config.name == channel_name:
-                            if name in channel.client_names:
-                                self.send(_Event.serialise(MessageEvent(name="Server Message", message=f'Channel "{channel.config.name}" already has user {name}.')))
-                                break
-                            else:
-                                self.channel._quit(name)
-                                self.joined = False
-                                print(f'[Server Message] {name} has left the channel.', flush=True)
-                                original_channel.broadcast(event=MessageEvent(name="Server Message", message=f"{name} has left the channel."))
-                                if len(original_channel._waitlist):
-                                    original_channel._join(self.channel._waitlist.pop(0))
-                                    for idx, c in enumerate(original_channel._waitlist):
-                                        c.send(_Event.serialise(MessageEvent(name="Server Message" ,message=f"You are in the waiting queue and there are {idx} user(s) ahead of you.")))
-                                self.send(_Event.serialise(SwitchEvent(name=name, channel=str(channel.config.port))))
-                                break
+                    registry = self.channel.server.registry
+                    target = registry.channel(channel_name)
+                    if target is not None:
+                        port = target.config.port
+                        # an in-place move claims the name in the new channel before leaving the old
+                        taken = self.channel.server.peer_holding(channel_name, name) is not None or (
+                            not registry.reserve(channel_name, name, self) if self.mux else registry.holder(channel_name, name) is not None
+                        )
+                    elif (info := self.channel.server.channel_info(channel_name)) is not None:
+                        # owned by another worker, whose handshake makes the final check
+                        port = info.port
+                        taken = name in info.client_names
                     else:
-                        self.send(_Event.serialise(MessageEvent(name="Server Message", message=f'Channel "{channel_name}" does not exist.')))
-                        
-                    
+                        self.send_event(MessageEvent(name="Server Message", message=f'Channel "{channel_name}" does not exist.'))
+                        return
+                    if taken:
+                        self.send_event(MessageEvent(name="Server Message", message=f'Channel "{channel_name}" already has user {name}.'))
+                    else:
+                        self._move(target, port)
+
+    def _move(self, target: ChannelServer | None, port: int | None = None) -> None:
+        # an in-place move must already hold the name in the target
+        if self.joined:
+            self.channel.server.log.emit(f'[Server Message] {self.name} has left the channel.', event="leave", channel=self.channel.config.name, user=self.name)
+        self.channel._leave(self)
+        if self.mux:
+            # an empty port tells the client it has been moved on this connection
+            self._abort_transfers()
+            self.channel = target
+            self.send_event(SwitchEvent(name=self.name, channel=""))
+            self.channel._admit(self)
+        else:
+            if port is None:
+                port = target.config.port
+            self.send_event(SwitchEvent(name=self.name, channel=str(port)))
+
+
+# seconds between attempts to reach a peer whose link is down
+PEER_RETRY = 1.0
+
+
+@dataclass(kw_only=True)
+class PeerRoster:
+    # a peer's side of a channel
+    capacity: int = 0
+    waiting: int = 0
+    names: set[str] = field(default_factory=set)
+
 
-check_args()
-if len(sys.argv) == 3:
-    channel_configs = load_channel_configs(sys.argv[2])
-else:
-    channel_configs = load_channel_configs(sys.argv[1])
-server = ChatServer(channel_configs=channel_configs)
-sys.exit()
\ No newline at end of file
+@dataclass(kw_only=True)
+class PeerLink:
+    # a connection to another chatserver. Each end relays its own channels' broadcasts and
+    # membership changes and never passes on what it was relayed, so every node must be
+    # linked to every other. Links are few, so each has its own threads in either mode
+    server: ChatServer
+    socket: socket
+    dialed: bool = False
+    # the other end's node name, and the name of whichever end dialed
+    node: str = field(default="", init=False)
+    dialer: str = field(default="", init=False)
+    # the peer's side of each channel it serves, by name; only this link's receiving side
+    # changes them
+    rosters: dict[str, PeerRoster] = field(default_factory=dict, init=False)
+    _outbound: OutboundQueue = field(init=False)
+    _reader: FrameReader = field(default_factory=FrameReader, init=False)
+    _writer_thread: Thread | None = field(default=None, init=False)
+
+    def __post_init__(self) -> None:
+        config = self.server.config
+        self.socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        # a peer that falls as far behind as a slow client would is dropped and redialed
+        # rather than left to hold up every channel
+        self._outbound = OutboundQueue(max_frames=config.queue_frames, max_bytes=config.queue_bytes, policy="disconnect")
+
+    def _handshake(self) -> bool:
+        # the client handshake, with node names for usernames
+        self.socket.settimeout(self.server.config.handshake_timeout)
+        try:
+            if self.dialed:
+                self.socket.sendall(hello(self.server.node))
+                reply = self.socket.recv(1024)
+                while reply[:1] == b"Y" and b"\n" not in reply and (more := self.socket.recv(1024)):
+                    reply += more
+                if (accepted := parse_accept(reply)) is None:
+                    return False
+                options, rest = accepted
+                self.node, self.dialer = options.get("node", ""), self.server.node
+                self._reader.feed(rest)
+            else:
+                self.node, _ = parse_hello(self.socket.recv(1024))
+                self.dialer = self.node
+                self.socket.sendall(accept(node=self.server.node))
+        except (OSError, UnicodeDecodeError):
+            return False
+        self.socket.settimeout(None)
+        return bool(self.node) and self.node != self.server.node
+
+    def run(self) -> None:
+        if not self._handshake():
+            self.socket.close()
+            return
+        self._writer_thread = Thread(target=self._write)
+        self._writer_thread.start()
+        self._dispatch(self._established)
+        try:
+            while self._reader.recv_from(self.socket):
+                for frame in self._reader.frames():
+                    self._dispatch(self._receive, _Event.deserialise(frame))
+        except (OSError, FrameError):
+            pass
+        finally:
+            self._outbound.close()
+            self._writer_thread.join()
+            self.socket.close()
+            self.server._unlink(self)
+
+    def _dispatch(self, callback, *args) -> None:
+        # in event loop mode the channels belong to the loop thread
+        reactor = self.server.reactor
+        if reactor is None:
+            callback(*args)
+        else:
+            reactor.call_soon_threadsafe(callback, *args)
+
+    def _established(self) -> None:
+        if not self.server._link(self):
+            self.close()
+            return
+        for channel in self.server._channels:
+            self.send(_Event.frame(channel.roster()))
+
+    def _receive(self, event: Event | PeerEvent) -> None:
+        match event:
+            case PeerRosterEvent(channel=c, capacity=capacity, waiting=waiting, names=names):
+                self.rosters[c] = PeerRoster(capacity=capacity, waiting=waiting, names=set(names.split("\0")) - {""})
+            case PeerPresenceEvent(channel=c, name=name, seated=seated):
+                roster = self.rosters.setdefault(c, PeerRoster())
+                if seated:
+                    roster.names.add(name)
+                else:
+                    roster.names.discard(name)
+            case PeerOccupancyEvent(channel=c, capacity=capacity, waiting=waiting):
+                roster = self.rosters.setdefault(c, PeerRoster())
+                roster.capacity, roster.waiting = capacity, waiting
+            case PeerRelayEvent(channel=c, frame=frame):
+                if (channel := self.server.find_channel(c)) is not None:
+                    channel._fan_out(frame)
+            case PeerWhisperEvent(channel=c, name=sender, target=target, message=message):
+                channel = self.server.find_channel(c)
+                r = None if channel is None else channel._clients.get(target)
+                if r is not None:
+                    r.send_event(MessageEvent(name=f"{sender} whispers to you", message=message))
+
+    def send(self, frame: bytes) -> None:
+        if not self._outbound.put(frame):
+            self.server.log.emit(f'[Server Message] Node "{self.node}" is not keeping up; its link is dropped.')
+            self.close()
+
+    def _write(self) -> None:
+        while (frames := self._outbound.take()) is not None:
+            try:
+                send_frames(self.socket, frames)
+            except OSError:
+                self.close()
+                break
+
+    def close(self) -> None:
+        # the receiving side notices and lets go of the link
+        self._outbound.close()
+        try:
+            self.socket.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    check_args()
+    if len(sys.argv) == 3:
+        server_config = load_config(sys.argv[2])
+        server_config.afk_time = int(sys.argv[1])
+    else:
+        server_config = load_config(sys.argv[1])
+    # a SIGHUP once the ports are open but before the handler is set would end the
+    # server, so it is held until then; threads started meanwhile keep it blocked
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGHUP})
+    server = ChatServer(config=server_config, config_path=sys.argv[-1])
+    # signal handlers run on this thread, so it stays until the console does
+    signal.signal(signal.SIGHUP, lambda signum, frame: Thread(target=server.reload).start())
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGHUP})
+    server._server_thread.join()
+    sys.exit()
\ No newline at end of file
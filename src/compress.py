@@ -0,0 +1,113 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from collections.abc import Callable
+import struct
+import zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+from events import FrameError
+
+
+# set in a frame's type word when everything after the type is compressed
+COMPRESSED = 0x80000000
+# frames shorter than this go out as they are; the saving would not pay for the work
+COMPRESS_THRESHOLD = 512
+
+_U32 = struct.Struct("!I")
+_FRAME_HEADER = struct.Struct("!II")
+
+# preset dictionary loaded before every frame, so even a short frame can refer back to
+# the strings chat traffic repeats; deflate matches best against its end. Frames stay
+# independent of each other, which lets one compressed broadcast serve every recipient
+DICTIONARY = (
+    b" whispers to you whispers to  is not in the channel. does not exist. already has user "
+    b"You are no longer muted.You have been muted for  seconds. has been muted for "
+    b"Capacity: /, Queue: Channel You are in the waiting queue and there are  user(s) ahead of you."
+    b" has left the channel. has joined the channel \"Server Message"
+)
+
+
+@dataclass(kw_only=True, frozen=True)
+class Codec:
+    # the name is what the handshake offers and answers
+    name: str
+    compress: Callable[[bytes | memoryview], bytes]
+    # raises FrameError if the data is corrupt or inflates past the limit
+    decompress: Callable[[bytes | memoryview, int], bytes]
+
+
+# primed once; every frame starts from a copy, which skips loading the dictionary again
+_DEFLATE = zlib.compressobj(1, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=DICTIONARY)
+_INFLATE = zlib.decompressobj(-zlib.MAX_WBITS, zdict=DICTIONARY)
+
+
+def _deflate(data: bytes | memoryview) -> bytes:
+    compressor = _DEFLATE.copy()
+    return compressor.compress(data) + compressor.flush()
+
+
+def _inflate(data: bytes | memoryview, limit: int) -> bytes:
+    decompressor = _INFLATE.copy()
+    try:
+        body = decompressor.decompress(data, limit + 1)
+    except zlib.error as e:
+        raise FrameError(f"corrupt compressed frame: {e}") from None
+    if len(body) > limit:
+        raise FrameError(f"compressed frame inflates past the limit of {limit} bytes")
+    if not decompressor.eof or decompressor.unused_data:
+        raise FrameError("compressed frame does not end where its data does")
+    return body
+
+
+CODECS: dict[str, Codec] = {}
+
+if zstandard is not None:
+    _ZSTD_DICTIONARY = zstandard.ZstdCompressionDict(DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+
+    def _zstd_compress(data: bytes | memoryview) -> bytes:
+        # compressors keep state between calls, and broadcasts may come from any thread
+        return zstandard.ZstdCompressor(level=3, dict_data=_ZSTD_DICTIONARY).compress(data)
+
+    def _zstd_decompress(data: bytes | memoryview, limit: int) -> bytes:
+        try:
+            size = zstandard.frame_content_size(data)
+            if size < 0 or size > limit:
+                raise FrameError(f"compressed frame inflates past the limit of {limit} bytes")
+            return zstandard.ZstdDecompressor(dict_data=_ZSTD_DICTIONARY).decompress(data)
+        except zstandard.ZstdError as e:
+            raise FrameError(f"corrupt compressed frame: {e}") from None
+
+    CODECS["zstd"] = Codec(name="zstd", compress=_zstd_compress, decompress=_zstd_decompress)
+
+CODECS["deflate"] = Codec(name="deflate", compress=_deflate, decompress=_inflate)
+
+
+def negotiate(offer: str) -> Codec | None:
+    # the client lists codecs in order of preference; the first one known here wins
+    for name in offer.split(","):
+        if name in CODECS:
+            return CODECS[name]
+    return None
+
+
+def compress_frame(frame: bytes, codec: Codec) -> bytes:
+    # takes a plain wire frame; hands it back unchanged if compressing does not shrink it
+    packed = codec.compress(memoryview(frame)[8:])
+    if len(packed) >= len(frame) - 8:
+        return frame
+    return _FRAME_HEADER.pack(4 + len(packed), _U32.unpack_from(frame, 4)[0] | COMPRESSED) + packed
+
+
+def decompress_body(body: bytes | memoryview, codec: Codec | None, limit: int) -> bytes | memoryview:
+    # takes a frame body as FrameReader hands it out, type word first
+    if len(body) < 4:
+        # too short to carry a type; deserialise reports it
+        return body
+    kind = _U32.unpack_from(body, 0)[0]
+    if not kind & COMPRESSED:
+        return body
+    if codec is None:
+        raise FrameError("compressed frame on a connection that did not negotiate compression")
+    return _U32.pack(kind & ~COMPRESSED) + codec.decompress(memoryview(body)[4:], limit)
@@ -1,9 +1,10 @@
 from __future__ import annotations
 from enum import IntEnum,auto
 from typing import Type,ClassVar,Literal,TYPE_CHECKING
+from collections.abc import Iterator
 from dataclasses import dataclass,field
 import struct
-from abc import ABC,abstractmethod
+from abc import ABC
 from socket import socket
 if TYPE_CHECKING: 
     from chatserver import ChannelClientHandler
@@ -21,329 +22,447 @@ class EventType(IntEnum):
     SWITCH = auto()
     MESSAGE = auto()
     JOIN = auto()
+    FILE_CHUNK = auto()
+    FILE_ACK = auto()
+    RESIZE = auto()
+    CLOSE = auto()
+    PEER_ROSTER = auto()
+    PEER_PRESENCE = auto()
+    PEER_OCCUPANCY = auto()
+    PEER_RELAY = auto()
+    PEER_WHISPER = auto()
+
+
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+_U32 = struct.Struct("!I")
+
+
+class FrameError(RuntimeError):
+    pass
+
+
+def hello(name: str, **options: str) -> bytes:
+    # connection handshake: the username, then any NUL separated key=value options
+    return "\0".join([name, *(f"{key}={value}" for key, value in options.items())]).encode()
+
+
+def parse_hello(data: bytes) -> tuple[str, dict[str, str]]:
+    name, *pairs = data.decode().split("\0")
+    return name, dict(pair.partition("=")[::2] for pair in pairs)
+
+
+def accept(**options: str) -> bytes:
+    # handshake answer: "Y", followed only when the hello offered something to agree
+    # on by the agreed NUL separated key=value options and a newline
+    if not options:
+        return b"Y"
+    return b"Y" + "".join(f"\0{key}={value}" for key, value in options.items()).encode() + b"\n"
+
+
+# a refused handshake is one of these markers and the channel's name; neither is ever
+# "Y", so no channel name can read as an accept
+NAME_TAKEN = b"!"
+UNKNOWN_CHANNEL = b"?"
+
+
+def refuse(marker: bytes, channel: str) -> bytes:
+    return marker + channel.encode()
+
+
+def parse_accept(data: bytes, offered: bool = True) -> tuple[dict[str, str], bytes] | None:
+    # None unless `data` is an accept: a bare "Y" when the hello offered nothing, else "Y"
+    # and the agreed options up to a newline. Also returns whatever frames the server
+    # sent right behind it
+    if data[:1] != b"Y":
+        return None
+    if not offered:
+        return {}, data[1:]
+    head, newline, rest = data[1:].partition(b"\n")
+    if not newline or head[:1] != b"\0":
+        return None
+    return dict(pair.partition("=")[::2] for pair in head.decode().split("\0")[1:]), rest
 
 
 @dataclass(kw_only=True)
+class FrameReader:
+    # accumulates recv_into() data and hands out every complete frame body as a
+    # memoryview into the buffer; views are only valid until the next recv_from/feed
+    max_frame_size: int = MAX_FRAME_SIZE
+    _buf: bytearray = field(default_factory=lambda: bytearray(64 * 1024), init=False)
+    _start: int = field(default=0, init=False)
+    _end: int = field(default=0, init=False)
+
+    def _reserve(self, size: int) -> None:
+        # make room for `size` more bytes after the unconsumed data
+        pending = self._end - self._start
+        if self._start and self._end + size > len(self._buf):
+            self._buf[:pending] = self._buf[self._start : self._end]
+            self._start, self._end = 0, pending
+        if self._end + size > len(self._buf):
+            # views handed out earlier keep the old buffer alive, so replace rather than resize
+            grown = bytearray(max(2 * len(self._buf), pending + size))
+            grown[:pending] = self._buf[self._start : self._end]
+            self._buf, self._start, self._end = grown, 0, pending
+
+    def _wanted(self) -> int:
+        # bytes needed to finish the frame at the head of the buffer
+        pending = self._end - self._start
+        if pending < 4:
+            return 4 - pending
+        length = _U32.unpack_from(self._buf, self._start)[0]
+        return max(0, 4 + length - pending)
+
+    def feed(self, data: bytes) -> None:
+        self._reserve(len(data))
+        self._buf[self._end : self._end + len(data)] = data
+        self._end += len(data)
+
+    def recv_from(self, sock: socket) -> int:
+        with self.space() as view:
+            received = sock.recv_into(view)
+        self.filled(received)
+        return received
+
+    def space(self) -> memoryview:
+        # free buffer space for the next read, for callers that receive into it
+        # themselves; pass the count received to filled()
+        if self._start == self._end:
+            self._start = self._end = 0
+        self._reserve(max(self._wanted(), 4096))
+        return memoryview(self._buf)[self._end :]
+
+    def filled(self, count: int) -> None:
+        self._end += count
+
+    def next_frame(self) -> memoryview | None:
+        if self._end - self._start < 4:
+            return None
+        length = _U32.unpack_from(self._buf, self._start)[0]
+        if length > self.max_frame_size:
+            raise FrameError(f"frame of {length} bytes exceeds limit of {self.max_frame_size}")
+        if self._end - self._start < 4 + length:
+            return None
+        start = self._start + 4
+        self._start = start + length
+        return memoryview(self._buf)[start : start + length]
+
+    def frames(self) -> Iterator[memoryview]:
+        while (frame := self.next_frame()) is not None:
+            yield frame
+
+    def reset(self) -> None:
+        self._start = self._end = 0
+
+
+_U64 = struct.Struct("!Q")
+_FRAME_HEADER = struct.Struct("!II")
+
+
+def _compile_codec(cls: Type[_Event]) -> None:
+    # generate straight-line pack/unpack functions for the event's _fields so
+    # the hot path has no per-call format strings, loops or getattr lookups;
+    # str, bytes and memoryview fields are a u32 byte length then the bytes,
+    # int is a u64; memoryview fields decode as views into the frame, no copy
+    kinds = {}
+    for klass in reversed(cls.__mro__):
+        kinds.update(getattr(klass, "__annotations__", {}))
+    pack = ["def _pack(self, framed):"]
+    pieces, size = [], ["4"]
+    # decoded events skip the keyword-only __init__ and fill their slots directly
+    unpack = ["def _unpack(cls, view, pos):", "    obj = _new(cls)"]
+    for name in cls._fields:
+        match kinds[name]:
+            case "str" | "bytes" | "memoryview" as kind:
+                pack.append(f"    {name} = self.{name}{'.encode()' if kind == 'str' else ''}")
+                pieces += [f"_U32.pack(len({name}))", name]
+                size.append(f"4 + len({name})")
+                decode = {
+                    "str": 'str(view[pos:end], "utf-8")',
+                    "bytes": "bytes(view[pos:end])",
+                    "memoryview": "view[pos:end]",
+                }[kind]
+                unpack += [
+                    "    end = pos + 4 + _U32.unpack_from(view, pos)[0]",
+                    "    pos += 4",
+                    f"    obj.{name} = {decode}",
+                    "    pos = end",
+                ]
+            case "int":
+                pieces.append(f"_U64.pack(self.{name})")
+                size.append("8")
+                unpack += [f"    obj.{name} = _U64.unpack_from(view, pos)[0]", "    pos += 8"]
+            case other:
+                raise TypeError(f"{cls.__name__}.{name}: cannot encode {other}")
+    pack += [
+        "    if framed:",
+        f"        return _join((_FRAME_HEADER.pack({' + '.join(size)}, {int(cls.type)}), {', '.join(pieces)}))",
+        f"    return _join((_U32.pack({int(cls.type)}), {', '.join(pieces)}))",
+    ]
+    unpack += [
+        "    if pos > len(view):",
+        '        raise ValueError("field runs past the end of the frame")',
+        "    return obj",
+    ]
+    namespace = {"_U32": _U32, "_U64": _U64, "_FRAME_HEADER": _FRAME_HEADER, "_join": b"".join, "_new": object.__new__}
+    exec("\n".join(pack) + "\n" + "\n".join(unpack), namespace)
+    cls._pack = namespace["_pack"]
+    cls._unpack = classmethod(namespace["_unpack"])
+
+
+@dataclass(kw_only=True, slots=True)
 class _Event(ABC):
     type: ClassVar[EventType]
 
-    # struct packing spec; must match dataclass attribute order
-    _event_map: ClassVar[dict[EventType, Type[_Event]]] = field(
-        repr=False, default={}, init=False
-    )
+    # struct packing spec: wire order of the fields, see _compile_codec
+    _fields: ClassVar[tuple[str, ...]] = ()
+    _event_map: ClassVar[dict[EventType, Type[_Event]]] = {}
 
     def __init_subclass__(cls):
-        # register a deserialise handler
-        if cls.type in _Event._event_map:
+        # register a deserialise handler; dataclass(slots=True) re-creates the
+        # class, so the same event may register twice under the same name
+        registered = _Event._event_map.get(cls.type)
+        if registered is not None and registered.__qualname__ != cls.__qualname__:
             raise RuntimeError("cannot reregister event type")
         _Event._event_map[cls.type] = cls
+        if "_pack" not in cls.__dict__:
+            _compile_codec(cls)
 
     @classmethod
     def serialise(cls, obj) -> bytes:
-        return struct.pack("!I", obj.type) + obj._serialise()
+        return obj._pack(False)
 
-    @abstractmethod
-    def _serialise(self) -> bytes: ...
+    @classmethod
+    def frame(cls, obj) -> bytes:
+        # length-prefixed wire frame; built once and shared by every recipient
+        return obj._pack(True)
+
+    def _pack(self, framed: bool) -> bytes: ...
+
+    def _serialise(self) -> bytes:
+        return self._pack(False)[4:]
 
     @classmethod
-    def deserialise(cls, data: bytes) -> _Event:
-        event_type = EventType(struct.unpack("!I", data[:4])[0])
-        return cls._event_map[event_type]._deserialise(data=data[4:])
+    def deserialise(cls, data: bytes | memoryview) -> _Event:
+        view = memoryview(data)
+        try:
+            # IntEnum keys hash like plain ints, so skip constructing the EventType
+            return cls._event_map[_U32.unpack_from(view, 0)[0]]._unpack(view, 4)
+        except (struct.error, ValueError, KeyError) as e:
+            # UnicodeDecodeError is a ValueError
+            raise FrameError(f"malformed event: {e}") from None
 
     @classmethod
-    @abstractmethod
-    def _deserialise(cls, data: bytes) -> _Event: ...
+    def _deserialise(cls, data: bytes | memoryview) -> _Event:
+        return cls._unpack(memoryview(data), 0)
 
+    @classmethod
+    def _unpack(cls, view: memoryview, pos: int) -> _Event: ...
 
-@dataclass(kw_only=True)
+
+@dataclass(kw_only=True, slots=True)
 class MessageEvent(_Event):
     type: ClassVar[Literal[EventType.MESSAGE]] = EventType.MESSAGE
+    _fields: ClassVar[tuple[str, ...]] = ("name", "message")
     name: str
     message: str
 
-    def _serialise(self) -> bytes:
-        return struct.pack(
-            f"!I{len(self.name)}sI{len(self.message)}s",
-            len(self.name),
-            self.name.encode(),
-            len(self.message),
-            self.message.encode(),
-        )
-
-    @classmethod
-    def _deserialise(cls, data: bytes) -> MessageEvent:
-        name_length = struct.unpack("!I", data[:4])[0]
-        name = struct.unpack(
-            f"{name_length}s",
-            data[4 : 4 + name_length],
-        )[0].decode()
-        message_length = struct.unpack("!I", data[4 + name_length : 8 + name_length])[0]
-        message = struct.unpack(
-            f"{message_length}s",
-            data[8 + name_length : 8 + name_length + message_length],
-        )[0].decode()
-
-        return MessageEvent(
-            name=name,
-            message=message,
-        )
 
-
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class QuitEvent(_Event):
     type: ClassVar[Literal[EventType.QUIT]] = EventType.QUIT
+    _fields: ClassVar[tuple[str, ...]] = ("name",)
     name: str
-    
-    def _serialise(self):
-        return struct.pack(
-            f"!I{len(self.name)}s",
-            len(self.name),
-            self.name.encode()
-        )
-    
-    @classmethod
-    def _deserialise(cls, data) -> QuitEvent:
-        name_length = struct.unpack("!I", data[:4])[0]
-        name = struct.unpack(
-            f"{name_length}s",
-            data[4 : 4 + name_length],
-        )[0].decode()
-
-        return QuitEvent(
-            name=name,
-        )
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class KickEvent(_Event):
     type: ClassVar[Literal[EventType.KICK]] = EventType.KICK
+    _fields: ClassVar[tuple[str, ...]] = ("target",)
     target: str
 
-    def _serialise(self) -> bytes:
-        return struct.pack(
-            f"!I{len(self.target)}s",
-            len(self.target),
-            self.target.encode()
-        )
-    
-    @classmethod
-    def _deserialise(cls, data) -> KickEvent:
-        target_length = struct.unpack("!I", data[:4])[0]
-        target = struct.unpack(
-            f"{target_length}s",
-            data[4 : 4 + target_length],
-        )[0].decode()
 
-        return KickEvent(
-            target=target,
-        )
-
-
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class ShutdownEvent(_Event):
     type: ClassVar[Literal[EventType.SHUTDOWN]] = EventType.SHUTDOWN
 
-    def _serialise(self):
-        return b''
-    
-    @classmethod
-    def _deserialise(cls, data) -> ShutdownEvent:
-        return ShutdownEvent()
 
-
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class MuteEvent(_Event):
     type: ClassVar[Literal[EventType.MUTE]] = EventType.MUTE
     target: str
     duration: int
 
-    def _serialise(self) -> bytes:
+    def _pack(self, framed: bool) -> bytes:
         raise RuntimeError("mute not serialisable")
     
     @classmethod
-    def _deserialise(cls, data):
-        raise RuntimeError("mute not deserialisable")
+    def _unpack(cls, view, pos):
+        # this and the other events only posted within the server are malformed from a client
+        raise FrameError("mute not deserialisable")
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class EmptyEvent(_Event):
     type: ClassVar[Literal[EventType.EMPTY]] = EventType.EMPTY
 
-    def _serialise(self) -> bytes:
+    def _pack(self, framed: bool) -> bytes:
         raise RuntimeError("empty not serialisable")
     
     @classmethod
-    def _deserialise(cls, data):
-        raise RuntimeError("empty not deserialisable")
+    def _unpack(cls, view, pos):
+        raise FrameError("empty not deserialisable")
 
-@dataclass(kw_only=True)
+
+@dataclass(kw_only=True, slots=True)
+class ResizeEvent(_Event):
+    type: ClassVar[Literal[EventType.RESIZE]] = EventType.RESIZE
+    capacity: int
+
+    def _pack(self, framed: bool) -> bytes:
+        raise RuntimeError("resize not serialisable")
+
+    @classmethod
+    def _unpack(cls, view, pos):
+        raise FrameError("resize not deserialisable")
+
+
+@dataclass(kw_only=True, slots=True)
+class CloseEvent(_Event):
+    type: ClassVar[Literal[EventType.CLOSE]] = EventType.CLOSE
+    # the channel everyone still in the closing channel is moved to
+    successor: str
+
+    def _pack(self, framed: bool) -> bytes:
+        raise RuntimeError("close not serialisable")
+
+    @classmethod
+    def _unpack(cls, view, pos):
+        raise FrameError("close not deserialisable")
+
+
+@dataclass(kw_only=True, slots=True)
 class SendEvent(_Event):
     type: ClassVar[Literal[EventType.SEND]] = EventType.SEND
+    _fields: ClassVar[tuple[str, ...]] = ("name", "target", "file", "size", "transfer")
     name: str
     target: str
     file: str
-    
-    def _serialise(self):
-        return struct.pack(
-            f"!I{len(self.name)}sI{len(self.target)}sI{len(self.file)}s",
-            len(self.name),
-            self.name.encode(),
-            len(self.target),
-            self.target.encode(),
-            len(self.file),
-            self.file.encode(),
-        )
-    
-    @classmethod
-    def _deserialise(cls, data) -> SendEvent:
-        name_length = struct.unpack("!I", data[:4])[0]
-        name = struct.unpack(
-            f"{name_length}s",
-            data[4 : 4 + name_length],
-        )[0].decode()
-        target_length = struct.unpack("!I", data[4 + name_length : 8 + name_length])[0]
-        target = struct.unpack(
-            f"{target_length}s",
-            data[8 + name_length : 8 + name_length + target_length],
-        )[0].decode()
-        file_length = struct.unpack("!I", data[8 + name_length + target_length : 12 + name_length + target_length])[0]
-        file = struct.unpack(
-            f"{file_length}s",
-            data[12 + name_length + target_length: 12 + name_length + target_length + file_length],
-        )[0].decode()
-
-        return SendEvent(
-            name=name,
-            target=target,
-            file=file
-        )
+    size: int = 0
+    # 0 in an offer or a refusal, otherwise the server-assigned transfer id
+    transfer: int = 0
 
 
-@dataclass(kw_only=True)
+FILE_CHUNK_SIZE = 256 * 1024
+# unacknowledged bytes a sender may have in flight per transfer
+FILE_WINDOW = 16 * FILE_CHUNK_SIZE
+# FileAckEvent.received value that cancels a transfer in either direction
+TRANSFER_ABORTED = 2**64 - 1
+
+_CHUNK_HEADER = struct.Struct("!IIQI")
+
+
+@dataclass(kw_only=True, slots=True)
+class FileChunkEvent(_Event):
+    type: ClassVar[Literal[EventType.FILE_CHUNK]] = EventType.FILE_CHUNK
+    _fields: ClassVar[tuple[str, ...]] = ("transfer", "data")
+    transfer: int
+    # decoded chunks view the receive buffer; copy before keeping them
+    data: memoryview
+
+    @staticmethod
+    def header(transfer: int, size: int) -> bytes:
+        # frame prefix for a chunk whose payload is written separately, e.g. by sendfile
+        return _CHUNK_HEADER.pack(_CHUNK_HEADER.size - 4 + size, EventType.FILE_CHUNK, transfer, size)
+
+
+@dataclass(kw_only=True, slots=True)
+class FileAckEvent(_Event):
+    type: ClassVar[Literal[EventType.FILE_ACK]] = EventType.FILE_ACK
+    _fields: ClassVar[tuple[str, ...]] = ("transfer", "received")
+    transfer: int
+    received: int
+
+
+@dataclass(kw_only=True, slots=True)
 class WhisperEvent(_Event):
     type: ClassVar[Literal[EventType.WHISPER]] = EventType.WHISPER
+    _fields: ClassVar[tuple[str, ...]] = ("name", "target", "message")
     name: str
     target: str
     message: str
-    
-    def _serialise(self):
-        return struct.pack(
-            f"!I{len(self.name)}sI{len(self.target)}sI{len(self.message)}s",
-            len(self.name),
-            self.name.encode(),
-            len(self.target),
-            self.target.encode(),
-            len(self.message),
-            self.message.encode(),
-        )
-    
-    @classmethod
-    def _deserialise(cls, data) -> WhisperEvent:
-        name_length = struct.unpack("!I", data[:4])[0]
-        name = struct.unpack(
-            f"{name_length}s",
-            data[4 : 4 + name_length],
-        )[0].decode()
-        target_length = struct.unpack("!I", data[4 + name_length : 8 + name_length])[0]
-        target = struct.unpack(
-            f"{target_length}s",
-            data[8 + name_length : 8 + name_length + target_length],
-        )[0].decode()
-        message_length = struct.unpack("!I", data[8 + name_length + target_length : 12 + name_length + target_length])[0]
-        message = struct.unpack(
-            f"{message_length}s",
-            data[12 + name_length + target_length: 12 + name_length + target_length + message_length],
-        )[0].decode()
-
-        return WhisperEvent(
-            name=name,
-            target=target,
-            message=message
-        )
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class ListEvent(_Event):
     type: ClassVar[Literal[EventType.LIST]] = EventType.LIST
+    _fields: ClassVar[tuple[str, ...]] = ("name",)
     name: str
-    
-    def _serialise(self):
-        return struct.pack(
-            f"!I{len(self.name)}s",
-            len(self.name),
-            self.name.encode()
-        )
-    
-    @classmethod
-    def _deserialise(cls, data) -> ListEvent:
-        name_length = struct.unpack("!I", data[:4])[0]
-        name = struct.unpack(
-            f"{name_length}s",
-            data[4 : 4 + name_length],
-        )[0].decode()
-
-        return ListEvent(
-            name=name,
-        )
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class SwitchEvent(_Event):
     type: ClassVar[Literal[EventType.SWITCH]] = EventType.SWITCH
+    _fields: ClassVar[tuple[str, ...]] = ("name", "channel")
     name: str
     channel: str
 
-    def _serialise(self) -> bytes:
-        return struct.pack(
-            f"!I{len(self.name)}sI{len(self.channel)}s",
-            len(self.name),
-            self.name.encode(),
-            len(self.channel),
-            self.channel.encode(),
-        )
-
-    @classmethod
-    def _deserialise(cls, data: bytes) -> SwitchEvent:
-        name_length = struct.unpack("!I", data[:4])[0]
-        name = struct.unpack(
-            f"{name_length}s",
-            data[4 : 4 + name_length],
-        )[0].decode()
-        channel_length = struct.unpack("!I", data[4 + name_length : 8 + name_length])[0]
-        channel = struct.unpack(
-            f"{channel_length}s",
-            data[8 + name_length : 8 + name_length + channel_length],
-        )[0].decode()
-
-        return SwitchEvent(
-            name=name,
-            channel=channel,
-        )
         
-        
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class JoinEvent(_Event):
     type: ClassVar[Literal[EventType.JOIN]] = EventType.JOIN
+    _fields: ClassVar[tuple[str, ...]] = ("channel",)
     channel: str
 
-    def _serialise(self):
-        return struct.pack(
-            f"!I{len(self.channel)}s",
-            len(self.channel),
-            self.channel.encode()
-        )
-    
-    @classmethod
-    def _deserialise(cls, data) -> JoinEvent:
-        channel_length = struct.unpack("!I", data[:4])[0]
-        channel = struct.unpack(
-            f"{channel_length}s",
-            data[4 : 4 + channel_length],
-        )[0].decode()
 
-        return JoinEvent(
-            channel=channel
-        )
+# the Peer events only travel between linked chatservers, over the peer port
+@dataclass(kw_only=True, slots=True)
+class PeerRosterEvent(_Event):
+    type: ClassVar[Literal[EventType.PEER_ROSTER]] = EventType.PEER_ROSTER
+    _fields: ClassVar[tuple[str, ...]] = ("channel", "capacity", "waiting", "names")
+    # the sender's whole side of a channel: seats, queue and NUL separated seated names
+    channel: str
+    capacity: int
+    waiting: int
+    names: str
+
+
+@dataclass(kw_only=True, slots=True)
+class PeerPresenceEvent(_Event):
+    type: ClassVar[Literal[EventType.PEER_PRESENCE]] = EventType.PEER_PRESENCE
+    _fields: ClassVar[tuple[str, ...]] = ("channel", "name", "seated")
+    channel: str
+    name: str
+    # 1 when the name took a seat on the sender, 0 when it gave it up
+    seated: int
+
+
+@dataclass(kw_only=True, slots=True)
+class PeerOccupancyEvent(_Event):
+    type: ClassVar[Literal[EventType.PEER_OCCUPANCY]] = EventType.PEER_OCCUPANCY
+    _fields: ClassVar[tuple[str, ...]] = ("channel", "capacity", "waiting")
+    channel: str
+    capacity: int
+    waiting: int
+
+
+@dataclass(kw_only=True, slots=True)
+class PeerRelayEvent(_Event):
+    type: ClassVar[Literal[EventType.PEER_RELAY]] = EventType.PEER_RELAY
+    _fields: ClassVar[tuple[str, ...]] = ("channel", "frame")
+    channel: str
+    # a broadcast as the sender framed it for its own members
+    frame: bytes
+
+
+@dataclass(kw_only=True, slots=True)
+class PeerWhisperEvent(_Event):
+    type: ClassVar[Literal[EventType.PEER_WHISPER]] = EventType.PEER_WHISPER
+    _fields: ClassVar[tuple[str, ...]] = ("channel", "name", "target", "message")
+    channel: str
+    name: str
+    target: str
+    message: str
 
 
 Event = (
@@ -358,4 +477,10 @@ Event = (
     | ListEvent
     | SwitchEvent
     | JoinEvent
+    | FileChunkEvent
+    | FileAckEvent
+    | ResizeEvent
+    | CloseEvent
 )
+
+PeerEvent = PeerRosterEvent | PeerPresenceEvent | PeerOccupancyEvent | PeerRelayEvent | PeerWhisperEvent
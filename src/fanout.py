@@ -0,0 +1,33 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+import itertools
+import threading
+from reactor import Reactor
+
+
+@dataclass(kw_only=True)
+class FanoutPool:
+    # writer shards for large channels: each is a reactor on its own thread that owns the
+    # writes of the connections assigned to it. A broadcast hands every shard its slice of
+    # the members in one call, so the sender never writes to thousands of sockets itself
+    size: int
+    _shards: list[Reactor] = field(init=False)
+    _threads: list[threading.Thread] = field(init=False)
+    _turn: itertools.count = field(default_factory=itertools.count, init=False)
+
+    def __post_init__(self) -> None:
+        self._shards = [Reactor() for _ in range(self.size)]
+        self._threads = [threading.Thread(target=shard.run, name=f"fanout-{i}") for i, shard in enumerate(self._shards)]
+        for thread in self._threads:
+            thread.start()
+
+    def assign(self) -> Reactor:
+        # round robin keeps the slices even; a connection stays on its shard until it closes
+        return self._shards[next(self._turn) % self.size]
+
+    def stop(self) -> None:
+        # callbacks already queued, such as closing sockets, still run
+        for shard in self._shards:
+            shard.stop()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
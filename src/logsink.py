@@ -0,0 +1,98 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from collections import deque
+from typing import TextIO
+import atexit
+import json
+import sys
+import threading
+import time
+
+
+LOG_POLICIES = ("lossless", "drop")
+LOG_FORMATS = ("text", "json")
+
+
+@dataclass(kw_only=True)
+class LogSink:
+    # records are queued by the caller and written in batches by one background thread,
+    # so a slow stdout consumer never stalls a broadcast
+    stream: TextIO = field(default_factory=lambda: sys.stdout)
+    # how long the writer waits for more records before writing a batch
+    flush_interval: float = 0.05
+    max_records: int = 10000
+    # "lossless" makes callers wait for room when the queue is full, "drop" discards and counts
+    policy: str = "lossless"
+    # "text" writes the console lines as they are, "json" writes one object per line
+    format: str = "text"
+    _records: deque[tuple[str, float, dict]] = field(default_factory=deque, init=False)
+    _cond: threading.Condition = field(default_factory=threading.Condition, init=False)
+    # records handed to the writer and not yet written, so flush() can wait for them
+    _writing: int = field(default=0, init=False)
+    _thread: threading.Thread = field(init=False)
+    dropped: int = field(default=0, init=False)
+    closed: bool = field(default=False, init=False)
+
+    def __post_init__(self) -> None:
+        assert self.policy in LOG_POLICIES
+        assert self.format in LOG_FORMATS
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+        # records still queued when the process exits are written, not lost
+        atexit.register(self.close)
+
+    def emit(self, text: str, **fields) -> None:
+        # fields only appear in json output, next to the text
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._records) >= self.max_records:
+                if self.policy == "drop":
+                    self.dropped += 1
+                    return
+                self._cond.wait_for(lambda: self.closed or len(self._records) < self.max_records)
+            self._records.append((text, time.time() if self.format == "json" else 0.0, fields))
+            if len(self._records) == 1 or len(self._records) >= self.max_records:
+                self._cond.notify_all()
+
+    def _format(self, text: str, stamp: float, fields: dict) -> str:
+        if self.format == "json":
+            return json.dumps({"time": stamp, "message": text, **fields}) + "\n"
+        return text + "\n"
+
+    def _write(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._records or self.closed)
+                if not self.closed:
+                    # let a burst accumulate so it costs one write
+                    self._cond.wait_for(lambda: self.closed or len(self._records) >= self.max_records, self.flush_interval)
+                batch, self._records = self._records, deque()
+                self._writing = len(batch)
+                dropped, self.dropped = self.dropped, 0
+                self._cond.notify_all()
+            if not batch and not dropped:
+                return
+            lines = [self._format(*record) for record in batch]
+            if dropped:
+                lines.append(self._format(f"[{dropped} log record(s) dropped]", time.time(), {"dropped": dropped}))
+            try:
+                self.stream.write("".join(lines))
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
+            with self._cond:
+                self._writing = 0
+                self._cond.notify_all()
+
+    def flush(self) -> None:
+        # blocks until everything emitted so far has been written
+        with self._cond:
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._records and not self._writing or not self._thread.is_alive())
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._thread.join()
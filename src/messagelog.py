@@ -0,0 +1,228 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from array import array
+from bisect import bisect_left
+from typing import BinaryIO
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+
+# a record is the append time in ms followed by the frame exactly as it was broadcast
+_RECORD = struct.Struct("<Q")
+_FRAME_LENGTH = struct.Struct("!I")
+# one index entry per record: append time and the record's offset in its segment
+_INDEX = struct.Struct("<QQ")
+
+
+@dataclass(kw_only=True, eq=False)
+class Segment:
+    path: str
+    # sequence number of the segment's first record, which also names its files
+    first: int
+    stamps: array = field(default_factory=lambda: array("Q"))
+    offsets: array = field(default_factory=lambda: array("Q"))
+    size: int = 0
+
+
+def _load_segment(path: str, first: int) -> Segment:
+    # trust the index only as far as the data backs it, then index any records the
+    # data has beyond it; a torn record at the end of the data is cut off
+    segment = Segment(path=path, first=first)
+    with open(path + ".idx", "rb") as index:
+        raw = index.read()
+    entries = array("Q")
+    entries.frombytes(raw[: len(raw) // _INDEX.size * _INDEX.size])
+    if sys.byteorder == "big":
+        entries.byteswap()
+    size = os.path.getsize(path + ".log")
+    with open(path + ".log", "rb") as log:
+        data = mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        position = 0
+        for stamp, offset in zip(entries[0::2], entries[1::2]):
+            if offset != position or offset + _RECORD.size + _FRAME_LENGTH.size > size:
+                break
+            end = offset + _RECORD.size + _FRAME_LENGTH.size + _FRAME_LENGTH.unpack_from(data, offset + _RECORD.size)[0]
+            if end > size:
+                break
+            segment.stamps.append(stamp)
+            segment.offsets.append(offset)
+            position = end
+        indexed = len(segment.offsets)
+        while position + _RECORD.size + _FRAME_LENGTH.size <= size:
+            end = position + _RECORD.size + _FRAME_LENGTH.size + _FRAME_LENGTH.unpack_from(data, position + _RECORD.size)[0]
+            if end > size:
+                break
+            segment.stamps.append(_RECORD.unpack_from(data, position)[0])
+            segment.offsets.append(position)
+            position = end
+    segment.size = position
+    if position != size:
+        os.truncate(path + ".log", position)
+    with open(path + ".idx", "r+b") as index:
+        index.truncate(indexed * _INDEX.size)
+        index.seek(0, os.SEEK_END)
+        for i in range(indexed, len(segment.offsets)):
+            index.write(_INDEX.pack(segment.stamps[i], segment.offsets[i]))
+    return segment
+
+
+@dataclass(kw_only=True)
+class MessageLog:
+    # append-only log of one channel's broadcast frames, split into segment files with
+    # an offset index; reads map the segment and hand out the stored frames as views
+    directory: str
+    segment_bytes: int = 64 * 1024 * 1024
+    # appends are fsynced together at most this often; 0 syncs every append
+    fsync_interval: float = 1.0
+    _segments: list[Segment] = field(default_factory=list, init=False)
+    _log: BinaryIO = field(init=False)
+    _index: BinaryIO = field(init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    _cond: threading.Condition = field(init=False)
+    _dirty: bool = field(default=False, init=False)
+    _sync_thread: threading.Thread | None = field(default=None, init=False)
+    closed: bool = field(default=False, init=False)
+
+    def __post_init__(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        firsts = sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith(".log"))
+        for first in firsts:
+            path = os.path.join(self.directory, f"{first:020d}")
+            if not os.path.exists(path + ".idx"):
+                open(path + ".idx", "wb").close()
+            self._segments.append(_load_segment(path, first))
+        if not self._segments:
+            self._segments.append(self._create(0))
+        self._open(self._segments[-1])
+        self._cond = threading.Condition(self._lock)
+        if self.fsync_interval > 0:
+            self._sync_thread = threading.Thread(target=self._syncer, daemon=True)
+            self._sync_thread.start()
+
+    def __len__(self) -> int:
+        last = self._segments[-1]
+        return last.first + len(last.offsets)
+
+    def _create(self, first: int) -> Segment:
+        path = os.path.join(self.directory, f"{first:020d}")
+        open(path + ".log", "wb").close()
+        open(path + ".idx", "wb").close()
+        return Segment(path=path, first=first)
+
+    def _open(self, segment: Segment) -> None:
+        self._log = open(segment.path + ".log", "ab")
+        self._index = open(segment.path + ".idx", "ab")
+
+    def append(self, frame: bytes) -> None:
+        stamp = int(time.time() * 1000)
+        with self._lock:
+            if self.closed:
+                return
+            segment = self._segments[-1]
+            if segment.size >= self.segment_bytes:
+                self._log.close()
+                self._index.close()
+                segment = self._create(segment.first + len(segment.offsets))
+                self._segments.append(segment)
+                self._open(segment)
+            self._log.write(_RECORD.pack(stamp))
+            self._log.write(frame)
+            self._index.write(_INDEX.pack(stamp, segment.size))
+            segment.stamps.append(stamp)
+            segment.offsets.append(segment.size)
+            segment.size += _RECORD.size + len(frame)
+            if self._sync_thread is None:
+                self._sync()
+            elif not self._dirty:
+                self._dirty = True
+                self._cond.notify_all()
+
+    def _sync(self) -> None:
+        self._log.flush()
+        self._index.flush()
+        os.fsync(self._log.fileno())
+        os.fsync(self._index.fileno())
+
+    def _syncer(self) -> None:
+        # group commit: the first append after a sync opens a window, then one fsync covers it
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty or self.closed)
+                if self.closed:
+                    return
+                self._cond.wait_for(lambda: self.closed, self.fsync_interval)
+                if self.closed:
+                    return
+                self._log.flush()
+                self._index.flush()
+                self._dirty = False
+                log, index = os.dup(self._log.fileno()), os.dup(self._index.fileno())
+            # fsync outside the lock so appends carry on meanwhile
+            try:
+                os.fsync(log)
+                os.fsync(index)
+            finally:
+                os.close(log)
+                os.close(index)
+
+    def _frames(self, picks: list[tuple[Segment, int, int, int]]) -> list[memoryview]:
+        # picks are (segment, first record, end record, segment size when picked); the
+        # views keep their mapping alive for as long as the frames sit in a send queue
+        frames = []
+        for segment, i, j, size in picks:
+            if i >= j:
+                continue
+            with open(segment.path + ".log", "rb") as log:
+                view = memoryview(mmap.mmap(log.fileno(), size, access=mmap.ACCESS_READ))
+            for k in range(i, j):
+                end = segment.offsets[k + 1] if k + 1 < j else size
+                frames.append(view[segment.offsets[k] + _RECORD.size:end])
+        return frames
+
+    def tail(self, count: int) -> list[memoryview]:
+        # the last `count` frames, oldest first
+        picks = []
+        with self._lock:
+            self._log.flush()
+            for segment in reversed(self._segments):
+                if count <= 0:
+                    break
+                n = len(segment.offsets)
+                take = min(n, count)
+                picks.append((segment, n - take, n, segment.size))
+                count -= take
+        return self._frames(picks[::-1])
+
+    def since(self, stamp: float, limit: int) -> list[memoryview]:
+        # frames appended at or after the unix time `stamp`, at most the last `limit` of them
+        ms = int(stamp * 1000)
+        picks = []
+        with self._lock:
+            self._log.flush()
+            for segment in reversed(self._segments):
+                if limit <= 0:
+                    break
+                n = len(segment.offsets)
+                start = max(bisect_left(segment.stamps, ms), n - limit)
+                picks.append((segment, start, n, segment.size))
+                limit -= n - start
+                if start > 0:
+                    break
+        return self._frames(picks[::-1])
+
+    def close(self) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._cond.notify_all()
+        if self._sync_thread is not None:
+            self._sync_thread.join()
+        with self._lock:
+            self._sync()
+            self._log.close()
+            self._index.close()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from bisect import bisect_left
+from collections.abc import Callable
+import math
+import threading
+import weakref
+
+
+# fan-out latency buckets, in seconds
+LATENCY_BOUNDS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+@dataclass(kw_only=True)
+class Sample:
+    # one exposition line; family groups a histogram's _bucket/_sum/_count lines under one TYPE
+    family: str
+    kind: str
+    help: str
+    name: str
+    labels: dict[str, str]
+    value: float
+
+
+class _Exit:
+    # held only by a thread's locals, so it is freed as the thread exits
+    pass
+
+
+@dataclass(kw_only=True, eq=False)
+class _PerThread:
+    # each thread adds into its own cell, so recording takes no lock; a thread's cell is
+    # folded into the base as the thread exits, whether or not anything ever collects
+    width: int
+    _local: threading.local = field(default_factory=threading.local, init=False)
+    _cells: dict[int, list] = field(default_factory=dict, init=False)
+    _base: list = field(init=False)
+    # reentrant, as a thread's locals may be freed while this thread holds it
+    _lock: threading.RLock = field(default_factory=threading.RLock, init=False)
+
+    def __post_init__(self) -> None:
+        self._base = [0] * self.width
+
+    def cell(self) -> list:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0] * self.width
+            self._local.exit = exit = _Exit()
+            with self._lock:
+                self._cells[id(cell)] = cell
+            weakref.finalize(exit, self._fold, cell)
+            return cell
+
+    def _fold(self, cell: list) -> None:
+        with self._lock:
+            del self._cells[id(cell)]
+            self._base = [a + b for a, b in zip(self._base, cell)]
+
+    def totals(self) -> list:
+        with self._lock:
+            totals = list(self._base)
+            for cell in self._cells.values():
+                totals = [a + b for a, b in zip(totals, cell)]
+            return totals
+
+
+@dataclass(kw_only=True, eq=False)
+class Counter:
+    name: str
+    help: str
+    labels: dict[str, str]
+    _values: _PerThread = field(default_factory=lambda: _PerThread(width=1), init=False)
+
+    def inc(self, amount: int = 1) -> None:
+        self._values.cell()[0] += amount
+
+    @property
+    def value(self) -> int:
+        return self._values.totals()[0]
+
+    def collect(self) -> list[Sample]:
+        return [Sample(family=self.name, kind="counter", help=self.help, name=self.name, labels=self.labels, value=self.value)]
+
+
+@dataclass(kw_only=True, eq=False)
+class Histogram:
+    name: str
+    help: str
+    labels: dict[str, str]
+    bounds: tuple[float, ...] = LATENCY_BOUNDS
+    # one count per bound plus +Inf, then the sum of observations
+    _values: _PerThread = field(init=False)
+
+    def __post_init__(self) -> None:
+        self._values = _PerThread(width=len(self.bounds) + 2)
+
+    def observe(self, value: float) -> None:
+        cell = self._values.cell()
+        cell[bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def collect(self) -> list[Sample]:
+        *counts, total = self._values.totals()
+        samples = []
+        cumulative = 0
+        for bound, count in zip([*self.bounds, math.inf], counts):
+            cumulative += count
+            le = "+Inf" if bound == math.inf else repr(bound)
+            samples.append(Sample(family=self.name, kind="histogram", help=self.help, name=self.name + "_bucket", labels={**self.labels, "le": le}, value=cumulative))
+        samples.append(Sample(family=self.name, kind="histogram", help=self.help, name=self.name + "_sum", labels=self.labels, value=total))
+        samples.append(Sample(family=self.name, kind="histogram", help=self.help, name=self.name + "_count", labels=self.labels, value=cumulative))
+        return samples
+
+
+@dataclass(kw_only=True, eq=False)
+class Gauge:
+    # read when collected, so it costs nothing while the server runs
+    name: str
+    help: str
+    labels: dict[str, str]
+    read: Callable[[], float]
+
+    def collect(self) -> list[Sample]:
+        return [Sample(family=self.name, kind="gauge", help=self.help, name=self.name, labels=self.labels, value=self.read())]
+
+
+@dataclass(kw_only=True)
+class Metrics:
+    _metrics: list[Counter | Histogram | Gauge] = field(default_factory=list, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, **labels: str) -> Counter:
+        return self._add(Counter(name=name, help=help, labels=labels))
+
+    def histogram(self, name: str, help: str, **labels: str) -> Histogram:
+        return self._add(Histogram(name=name, help=help, labels=labels))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float], **labels: str) -> Gauge:
+        return self._add(Gauge(name=name, help=help, labels=labels, read=read))
+
+    def remove(self, **labels: str) -> None:
+        # drops every metric carrying all of these labels
+        with self._lock:
+            self._metrics = [m for m in self._metrics if not labels.items() <= m.labels.items()]
+
+    def collect(self) -> list[Sample]:
+        with self._lock:
+            metrics = list(self._metrics)
+        return [sample for metric in metrics for sample in metric.collect()]
+
+
+def relabel(samples: list[Sample], **labels: str) -> list[Sample]:
+    return [Sample(family=s.family, kind=s.kind, help=s.help, name=s.name, labels={**labels, **s.labels}, value=s.value) for s in samples]
+
+
+def render(samples: list[Sample]) -> str:
+    # Prometheus text exposition format, one HELP/TYPE header per family
+    families: dict[str, list[Sample]] = {}
+    for sample in samples:
+        families.setdefault(sample.family, []).append(sample)
+    lines = []
+    for family, members in families.items():
+        lines.append(f"# HELP {family} {members[0].help}")
+        lines.append(f"# TYPE {family} {members[0].kind}")
+        for s in members:
+            labels = ",".join(f'{key}="{value}"' for key, value in s.labels.items())
+            value = int(s.value) if float(s.value).is_integer() else s.value
+            lines.append(f"{s.name}{{{labels}}} {value}" if labels else f"{s.name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def total(samples: list[Sample], name: str, **labels: str) -> float:
+    # summed over every label not given, e.g. across workers
+    return sum(s.value for s in samples if s.name == name and labels.items() <= s.labels.items())
+
+
+def quantile(samples: list[Sample], family: str, q: float, **labels: str) -> float | None:
+    # upper bound of the bucket holding the q-th observation; None without observations
+    buckets: dict[float, float] = {}
+    for s in samples:
+        if s.name == family + "_bucket" and labels.items() <= s.labels.items():
+            le = math.inf if s.labels["le"] == "+Inf" else float(s.labels["le"])
+            buckets[le] = buckets.get(le, 0) + s.value
+    if not buckets or not buckets[math.inf]:
+        return None
+    rank = q * buckets[math.inf]
+    return next(le for le in sorted(buckets) if buckets[le] >= rank)
@@ -0,0 +1,154 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from collections import deque
+import itertools
+import threading
+
+
+OVERFLOW_POLICIES = ("drop_oldest", "disconnect", "block")
+# most frames handed to one sendmsg; well under any IOV_MAX
+WRITE_BATCH = 64
+
+
+@dataclass(kw_only=True)
+class OutboundQueue:
+    # bounded per-client frame queue; producers are broadcasters, the consumer is the client's writer
+    max_frames: int
+    max_bytes: int
+    policy: str = "drop_oldest"
+    timeout: float = 5.0
+    # file chunk bytes held across every transfer to this client; 0 for a queue that carries none
+    max_bulk_bytes: int = 0
+    _frames: deque[bytes | memoryview] = field(default_factory=deque, init=False)
+    _bytes: int = field(default=0, init=False)
+    # bulk lane for file chunks: never dropped, bounded by each sender's flow control
+    # window and by max_bulk_bytes, and only written when no chat frames are waiting
+    _bulk: deque[bytes | memoryview] = field(default_factory=deque, init=False)
+    _bulk_bytes: int = field(default=0, init=False)
+    # lane whose head frame has been partially written by consume()
+    _sending: deque[bytes | memoryview] | None = field(default=None, init=False)
+    _cond: threading.Condition = field(default_factory=threading.Condition, init=False)
+    closed: bool = field(default=False, init=False)
+    dropped: int = field(default=0, init=False)
+
+    def __post_init__(self) -> None:
+        assert self.policy in OVERFLOW_POLICIES
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames) + len(self._bulk)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes + self._bulk_bytes
+
+    def _lane(self) -> deque[bytes | memoryview]:
+        if self._sending is not None:
+            return self._sending
+        return self._frames if self._frames else self._bulk
+
+    def _popleft(self, lane: deque[bytes | memoryview]) -> bytes | memoryview:
+        frame = lane.popleft()
+        if lane is self._frames:
+            self._bytes -= len(frame)
+        else:
+            self._bulk_bytes -= len(frame)
+        return frame
+
+    def _full(self, size: int) -> bool:
+        # a single oversized frame is still accepted into an empty queue
+        return len(self._frames) >= self.max_frames or (
+            bool(self._frames) and self._bytes + size > self.max_bytes
+        )
+
+    def put(self, frame: bytes | memoryview) -> bool:
+        # False means the consumer is too slow and should be disconnected;
+        # frames put after close() are discarded
+        size = len(frame)
+        with self._cond:
+            if self.closed:
+                return True
+            if self._full(size):
+                match self.policy:
+                    case "drop_oldest":
+                        # a partially written head frame has to finish, so drop behind it
+                        keep = 1 if self._sending is self._frames else 0
+                        while len(self._frames) > keep and self._full(size):
+                            self._bytes -= len(self._frames[keep])
+                            del self._frames[keep]
+                            self.dropped += 1
+                    case "disconnect":
+                        return False
+                    case "block":
+                        if not self._cond.wait_for(lambda: self.closed or not self._full(size), self.timeout):
+                            return False
+                        if self.closed:
+                            return True
+            self._frames.append(frame)
+            self._bytes += size
+            self._cond.notify_all()
+            return True
+
+    def put_bulk(self, frame: bytes | memoryview) -> bool:
+        # False, like put(), once the chunk would take the lane past max_bulk_bytes
+        with self._cond:
+            if self.closed:
+                return True
+            if self._bulk_bytes + len(frame) > self.max_bulk_bytes:
+                return False
+            self._bulk.append(frame)
+            self._bulk_bytes += len(frame)
+            self._cond.notify_all()
+            return True
+
+    def take(self, min_frames: int = 1, linger: float = 0.0) -> list[bytes | memoryview] | None:
+        # blocking consumer side: up to WRITE_BATCH frames from the head of one lane, after
+        # waiting up to `linger` seconds for min_frames to build up; None once closed and drained
+        with self._cond:
+            self._cond.wait_for(lambda: self._frames or self._bulk or self.closed)
+            if not (self._frames or self._bulk):
+                return None
+            if linger and self.depth < min_frames:
+                self._cond.wait_for(lambda: self.closed or self.depth >= min_frames, linger)
+            lane = self._lane()
+            frames = [self._popleft(lane) for _ in range(min(WRITE_BATCH, len(lane)))]
+            self._cond.notify_all()
+            return frames
+
+    def heads(self) -> list[bytes | memoryview]:
+        # non-blocking consumer side: the frames the next write should try, oldest first
+        lane = self._lane()
+        return [lane[0]] if len(lane) == 1 else list(itertools.islice(lane, WRITE_BATCH))
+
+    def consume(self, sent: int) -> None:
+        # account for `sent` bytes written from the frames heads() returned
+        with self._cond:
+            lane = self._lane()
+            while sent:
+                frame = lane[0]
+                if sent >= len(frame):
+                    self._popleft(lane)
+                    self._sending = None
+                    sent -= len(frame)
+                else:
+                    lane[0] = memoryview(frame)[sent:]
+                    if lane is self._frames:
+                        self._bytes -= sent
+                    else:
+                        self._bulk_bytes -= sent
+                    self._sending = lane
+                    sent = 0
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def clear(self) -> None:
+        with self._cond:
+            self._frames.clear()
+            self._bulk.clear()
+            self._bytes = self._bulk_bytes = 0
+            self._sending = None
+            self._cond.notify_all()
@@ -0,0 +1,54 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from time import monotonic
+
+
+RATE_POLICIES = ("drop", "mute")
+
+
+@dataclass(kw_only=True, slots=True)
+class TokenBucket:
+    # `rate` tokens a second, at most `burst` saved up; refilled lazily when taken from.
+    # Nothing here locks: a bucket shared between receive threads may let the odd extra
+    # message through when two of them race, which is cheaper than serialising them
+    rate: float
+    burst: float
+    _tokens: float = field(init=False)
+    _stamp: float = field(default_factory=monotonic, init=False)
+
+    def __post_init__(self) -> None:
+        self._tokens = self.burst
+
+    def take(self, cost: float = 1.0, now: float | None = None) -> bool:
+        now = monotonic() if now is None else now
+        tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if tokens < cost:
+            self._tokens = tokens
+            return False
+        self._tokens = tokens - cost
+        return True
+
+
+@dataclass(kw_only=True, slots=True)
+class RateLimit:
+    # a message budget and a byte budget checked together; either may be absent
+    messages: TokenBucket | None = None
+    bytes: TokenBucket | None = None
+
+    @classmethod
+    def of(cls, messages: float, nbytes: int, burst: float) -> RateLimit | None:
+        # rates of 0 disable that budget; burst is in seconds' worth of the rate
+        if not messages and not nbytes:
+            return None
+        return cls(
+            messages=TokenBucket(rate=messages, burst=max(1.0, messages * burst)) if messages else None,
+            bytes=TokenBucket(rate=nbytes, burst=max(float(nbytes), nbytes * burst)) if nbytes else None,
+        )
+
+    def allow(self, size: int, now: float) -> bool:
+        # a message refused by the byte budget keeps the message token it took; the
+        # sender was over budget either way
+        if self.messages is not None and not self.messages.take(1.0, now):
+            return False
+        return self.bytes is None or self.bytes.take(size, now)
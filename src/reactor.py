@@ -0,0 +1,139 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from collections import deque
+from collections.abc import Callable
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from socket import socket, socketpair
+from time import monotonic
+import heapq
+import itertools
+import threading
+import traceback
+from timers import TimerWheel
+
+
+@dataclass(kw_only=True, eq=False)
+class Reactor:
+    # single-threaded readiness loop; every socket callback runs on the loop thread
+    _selector: DefaultSelector = field(default_factory=DefaultSelector, init=False)
+    _ready: deque[tuple[Callable, tuple]] = field(default_factory=deque, init=False)
+    _readers: dict[int, Callable[[], None]] = field(default_factory=dict, init=False)
+    _writers: dict[int, Callable[[], None]] = field(default_factory=dict, init=False)
+    # (deadline, sequence, callback, args) heap for delays finer than the timer wheel's ticks
+    _later: list[tuple[float, int, Callable, tuple]] = field(default_factory=list, init=False)
+    _sequence: itertools.count = field(default_factory=itertools.count, init=False)
+    _wake_r: socket = field(init=False)
+    _wake_w: socket = field(init=False)
+    _thread: threading.Thread | None = field(default=None, init=False)
+    # timers fire on the loop thread, between rounds of I/O
+    timers: TimerWheel | None = None
+    running: bool = True
+
+    def __post_init__(self) -> None:
+        if self.timers is not None:
+            self.timers.wakeup = self._wakeup
+        self._wake_r, self._wake_w = socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.add_reader(self._wake_r, self._drain_wakeups)
+
+    def in_loop_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def _update(self, sock: socket) -> None:
+        fd = sock.fileno()
+        mask = (EVENT_READ if fd in self._readers else 0) | (EVENT_WRITE if fd in self._writers else 0)
+        try:
+            key = self._selector.get_key(fd)
+        except KeyError:
+            if mask:
+                self._selector.register(fd, mask)
+            return
+        if mask:
+            if key.events != mask:
+                self._selector.modify(fd, mask)
+        else:
+            self._selector.unregister(fd)
+
+    def add_reader(self, sock: socket, callback: Callable[[], None]) -> None:
+        self._readers[sock.fileno()] = callback
+        self._update(sock)
+
+    def remove_reader(self, sock: socket) -> None:
+        if self._readers.pop(sock.fileno(), None) is not None:
+            self._update(sock)
+
+    def add_writer(self, sock: socket, callback: Callable[[], None]) -> None:
+        self._writers[sock.fileno()] = callback
+        self._update(sock)
+
+    def remove_writer(self, sock: socket) -> None:
+        if self._writers.pop(sock.fileno(), None) is not None:
+            self._update(sock)
+
+    def call_soon(self, callback: Callable, *args) -> None:
+        self._ready.append((callback, args))
+
+    def call_later(self, delay: float, callback: Callable, *args) -> None:
+        # loop thread only; nothing cancels these, so callbacks must tolerate running late
+        heapq.heappush(self._later, (monotonic() + delay, next(self._sequence), callback, args))
+
+    def call_soon_threadsafe(self, callback: Callable, *args) -> None:
+        self._ready.append((callback, args))
+        self._wakeup()
+
+    def _wakeup(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            # the pipe is already full, so the loop is awake anyway
+            pass
+
+    def _drain_wakeups(self) -> None:
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self, callback: Callable, *args) -> None:
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc()
+
+    def _timeout(self) -> float | None:
+        if self._ready:
+            return 0
+        timeout = None if self.timers is None else self.timers.next_tick_in()
+        if self._later:
+            due = max(0.0, self._later[0][0] - monotonic())
+            timeout = due if timeout is None else min(timeout, due)
+        return timeout
+
+    def stop(self) -> None:
+        self.running = False
+        self._wakeup()
+
+    def run(self) -> None:
+        self._thread = threading.current_thread()
+        while self.running:
+            for key, mask in self._selector.select(self._timeout()):
+                fd = key.fd
+                if mask & EVENT_READ and fd in self._readers:
+                    self._run(self._readers[fd])
+                if mask & EVENT_WRITE and fd in self._writers:
+                    self._run(self._writers[fd])
+            # only run what was queued before this pass so call_soon cannot starve I/O
+            for _ in range(len(self._ready)):
+                callback, args = self._ready.popleft()
+                self._run(callback, *args)
+            now = monotonic()
+            while self._later and self._later[0][0] <= now:
+                _, _, callback, args = heapq.heappop(self._later)
+                self._run(callback, *args)
+            if self.timers is not None:
+                self.timers.advance()
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
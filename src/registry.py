@@ -0,0 +1,64 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Generic, TypeVar
+import threading
+
+
+C = TypeVar("C")
+H = TypeVar("H")
+
+
+@dataclass(kw_only=True)
+class Registry(Generic[C, H]):
+    # channels by name and, per channel, the handler holding each username; a name
+    # is held from the handshake until the client leaves, whether seated or waiting
+    _channels: dict[str, C] = field(default_factory=dict, init=False)
+    _holders: dict[str, dict[str, H]] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def add_channel(self, name: str, channel: C) -> None:
+        with self._lock:
+            self._channels[name] = channel
+            self._holders[name] = {}
+
+    def remove_channel(self, name: str) -> None:
+        with self._lock:
+            self._channels.pop(name, None)
+            self._holders.pop(name, None)
+
+    def channel(self, name: str) -> C | None:
+        return self._channels.get(name)
+
+    def holder(self, channel: str, name: str) -> H | None:
+        return self._holders.get(channel, {}).get(name)
+
+    def names(self, channel: str) -> list[str]:
+        with self._lock:
+            return list(self._holders.get(channel, ()))
+
+    def reserve(self, channel: str, name: str, holder: H) -> bool:
+        # atomic check-and-claim; False if someone else already holds the name
+        with self._lock:
+            holders = self._holders.get(channel)
+            if holders is None or name in holders:
+                return False
+            holders[name] = holder
+            return True
+
+    def replace(self, channel: str, name: str, holder: H, successor: H) -> bool:
+        # hands a held name straight on, so nobody can claim it in between; False if
+        # `holder` no longer has it
+        with self._lock:
+            holders = self._holders.get(channel, {})
+            if holders.get(name) is not holder:
+                return False
+            holders[name] = successor
+            return True
+
+    def release(self, channel: str, name: str, holder: H) -> None:
+        # only the holder can give a name back, so a stale release is harmless
+        # the channel itself may already be gone, closed by a reload
+        with self._lock:
+            holders = self._holders.get(channel, {})
+            if holders.get(name) is holder:
+                del holders[name]
@@ -0,0 +1,115 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from collections.abc import Callable
+from time import monotonic
+import math
+import threading
+import traceback
+
+
+@dataclass(kw_only=True, eq=False)
+class Timer:
+    deadline: int
+    callback: Callable
+    args: tuple
+    fired: bool = False
+    cancelled: bool = False
+
+
+@dataclass(kw_only=True)
+class TimerWheel:
+    # hashed timer wheel: a timer lives in the slot for its deadline tick, so scheduling
+    # and cancelling are O(1) and each tick only looks at one slot; timers further out
+    # than one revolution stay in their slot until their deadline comes round
+    resolution: float = 0.1
+    size: int = 1024
+    # called when the first timer is scheduled on an idle wheel, to wake its driver
+    wakeup: Callable[[], None] | None = None
+    # current tick; cheap to read, so activity can be stamped without a clock call
+    now: int = field(default=0, init=False)
+    _start: float = field(default_factory=monotonic, init=False)
+    _slots: list[set[Timer]] = field(init=False)
+    _pending: int = field(default=0, init=False)
+    _cond: threading.Condition = field(default_factory=threading.Condition, init=False)
+    closed: bool = field(default=False, init=False)
+
+    def __post_init__(self) -> None:
+        self._slots = [set() for _ in range(self.size)]
+
+    def _tick_of(self, clock: float) -> int:
+        return int((clock - self._start) / self.resolution)
+
+    def ticks(self, seconds: float) -> int:
+        return max(1, math.ceil(seconds / self.resolution))
+
+    def seconds(self, ticks: int) -> float:
+        return ticks * self.resolution
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def schedule(self, seconds: float, callback: Callable, *args) -> Timer:
+        with self._cond:
+            idle = not self._pending
+            if idle:
+                # nothing was due while idle, so jump straight to the present
+                self.now = self._tick_of(monotonic())
+            timer = Timer(deadline=self.now + self.ticks(seconds), callback=callback, args=args)
+            self._slots[timer.deadline % self.size].add(timer)
+            self._pending += 1
+            if idle:
+                self._cond.notify_all()
+        if idle and self.wakeup is not None:
+            self.wakeup()
+        return timer
+
+    def cancel(self, timer: Timer | None) -> bool:
+        # False if the timer has already fired or been cancelled
+        if timer is None:
+            return False
+        with self._cond:
+            if timer.fired or timer.cancelled:
+                return False
+            timer.cancelled = True
+            self._slots[timer.deadline % self.size].discard(timer)
+            self._pending -= 1
+            return True
+
+    def next_tick_in(self) -> float | None:
+        # seconds until the driver should call advance(); None while no timers are pending
+        if not self._pending:
+            return None
+        return max(0.0, self._start + (self.now + 1) * self.resolution - monotonic())
+
+    def advance(self) -> None:
+        due = []
+        with self._cond:
+            target = self._tick_of(monotonic())
+            while self.now < target and self._pending:
+                self.now += 1
+                slot = self._slots[self.now % self.size]
+                for timer in [t for t in slot if t.deadline <= self.now]:
+                    slot.discard(timer)
+                    timer.fired = True
+                    self._pending -= 1
+                    due.append(timer)
+            self.now = max(self.now, target)
+        for timer in due:
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                traceback.print_exc()
+
+    def wait(self) -> None:
+        # threaded driver: sleep until the next tick, or indefinitely while idle
+        # until a timer is scheduled or wake() is called
+        with self._cond:
+            if not self.closed:
+                self._cond.wait(self.next_tick_in())
+
+    def close(self) -> None:
+        # releases the threaded driver for good
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from collections.abc import Iterator
+from typing import Generic, TypeVar
+
+
+T = TypeVar("T")
+
+
+@dataclass(kw_only=True)
+class Waitlist(Generic[T]):
+    # clients waiting for a seat in arrival order, keyed by name so any of them can leave in O(1)
+    _clients: OrderedDict[str, T] = field(default_factory=OrderedDict, init=False)
+    # the position each client was last told, so a burst of departures sends one update each
+    _told: dict[str, int] = field(default_factory=dict, init=False)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(list(self._clients.values()))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._clients
+
+    def get(self, name: str) -> T | None:
+        return self._clients.get(name)
+
+    def append(self, name: str, client: T) -> int:
+        # returns how many clients are ahead; the caller tells the client
+        position = len(self._clients)
+        self._clients[name] = client
+        self._told[name] = position
+        return position
+
+    def popleft(self) -> T:
+        name, client = self._clients.popitem(last=False)
+        del self._told[name]
+        return client
+
+    def remove(self, name: str) -> T | None:
+        self._told.pop(name, None)
+        return self._clients.pop(name, None)
+
+    def moved(self) -> Iterator[tuple[T, int]]:
+        # clients whose position changed since they were last told, with their new position
+        for position, (name, client) in enumerate(list(self._clients.items())):
+            if self._told.get(name) != position:
+                self._told[name] = position
+                yield client, position
@@ -0,0 +1,137 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from pathlib import Path
+from socket import AF_INET, SOCK_STREAM, create_connection, socket
+from collections.abc import Callable
+import os
+import subprocess
+import sys
+import time
+import pytest
+from chatserver import ChatServer, ChannelConfig, ServerConfig
+from events import FrameReader, NAME_TAKEN, _Event, hello, parse_accept
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def free_port() -> int:
+    # the servers bind without SO_REUSEADDR, so every test takes a port nobody has used
+    with socket(AF_INET, SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def eventually(check: Callable[[], bool], timeout: float = 5) -> bool:
+    # the server settles on its own threads, so tests poll for the state they expect
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def until(sock: socket, reader: FrameReader, wanted: type) -> _Event:
+    # reads frames until one of the wanted type arrives, skipping the rest
+    while True:
+        for frame in reader.frames():
+            if isinstance(event := _Event.deserialise(frame), wanted):
+                return event
+        assert reader.recv_from(sock), f"closed before a {wanted.__name__}"
+
+
+def join(port: int, name: str, **options: str) -> tuple[socket, FrameReader, dict[str, str]]:
+    # a raw client past the handshake, possibly still queued for a seat; a name the server
+    # has not quite let go of yet is retried
+    while True:
+        sock = create_connection(("localhost", port), timeout=10)
+        sock.sendall(hello(name, **options))
+        reply = sock.recv(1024)
+        while options and reply[:1] == b"Y" and b"\n" not in reply:
+            reply += sock.recv(1024)
+        if (accepted := parse_accept(reply, offered=bool(options))) is not None:
+            break
+        sock.close()
+        assert reply[:1] == NAME_TAKEN, reply
+        time.sleep(0.01)
+    reader = FrameReader()
+    # frames may follow the answer in the same segment
+    reader.feed(accepted[1])
+    return sock, reader, accepted[0]
+
+
+@dataclass(kw_only=True)
+class Server:
+    # a chatserver process fed console commands on stdin
+    process: subprocess.Popen
+    port: int
+    config: Path
+    output: str = field(default="", init=False)
+
+    def command(self, line: str) -> None:
+        assert self.process.stdin is not None
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def wait(self, timeout: float) -> int:
+        code = self.process.wait(timeout)
+        assert self.process.stdout is not None
+        self.output = self.process.stdout.read()
+        return code
+
+    def stop(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+@pytest.fixture
+def chatserver(tmp_path: Path):
+    # starts a server with one channel and the given "server" option lines, and waits until it accepts
+    servers: list[Server] = []
+
+    def start(channel: str = "general", capacity: int = 8, options: tuple[str, ...] = ()) -> Server:
+        port = free_port()
+        config = tmp_path / f"{len(servers)}.cfg"
+        config.write_text("".join(f"server {option}\n" for option in options) + f"channel {channel} {port} {capacity}\n")
+        process = subprocess.Popen(
+            [sys.executable, "-u", str(SRC / "chatserver.py"), str(config)],
+            cwd=SRC, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        )
+        server = Server(process=process, port=port, config=config)
+        servers.append(server)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                # a connection that says nothing is dropped again by the handshake timeout
+                create_connection(("localhost", port), timeout=1).close()
+                return server
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise
+                time.sleep(0.05)
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def inprocess(monkeypatch: pytest.MonkeyPatch):
+    # runs a server in this process, so a test can look at its channels; the console reads a pipe
+    started: list[tuple[ChatServer, int]] = []
+
+    def start(*channels: ChannelConfig, **options) -> ChatServer:
+        console, commands = os.pipe()
+        monkeypatch.setattr(sys, "stdin", os.fdopen(console))
+        config = ServerConfig(**options)
+        config.channels.extend(channels)
+        server = ChatServer(config=config)
+        started.append((server, commands))
+        return server
+
+    yield start
+    for server, commands in started:
+        os.write(commands, b"/shutdown\n")
+        server._server_thread.join(10)
+        os.close(commands)
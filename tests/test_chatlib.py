@@ -0,0 +1,86 @@
+from __future__ import annotations
+import asyncio
+import pytest
+from chatlib import ChatConnection, UnknownChannel, connect
+from chatserver import ChannelConfig
+from compress import COMPRESS_THRESHOLD
+from conftest import free_port
+from events import JoinEvent, MessageEvent, SwitchEvent
+
+BOTS = 20
+
+
+async def first(connection: ChatConnection, wanted: type):
+    async for event in connection:
+        if isinstance(event, wanted):
+            return event
+    raise AssertionError(f"connection ended before a {wanted.__name__}")
+
+
+@pytest.mark.parametrize("codecs", [(), ("deflate",)])
+def test_many_bots_share_one_loop(inprocess, codecs):
+    port = free_port()
+    inprocess(ChannelConfig(name="lobby", port=port, capacity=BOTS, large=True))
+    # long enough to be compressed when a codec is agreed
+    long = "x" * 2 * COMPRESS_THRESHOLD
+
+    async def bot(i: int, joined: asyncio.Barrier) -> set[str]:
+        connection = await connect(port, f"bot{i}", codecs=codecs)
+        if codecs:
+            assert connection.codec is not None
+        try:
+            await first(connection, JoinEvent)
+            await joined.wait()
+            await connection.send_message(f"{i} {long}")
+            heard = set()
+            async for event in connection:
+                if isinstance(event, MessageEvent) and event.name.startswith("bot"):
+                    assert event.message.endswith(long)
+                    heard.add(event.name)
+                    if len(heard) == BOTS:
+                        break
+            await connection.quit()
+            return heard
+        finally:
+            await connection.close()
+
+    async def main() -> list[set[str]]:
+        joined = asyncio.Barrier(BOTS)
+        return await asyncio.wait_for(asyncio.gather(*(bot(i, joined) for i in range(BOTS))), 10)
+
+    assert asyncio.run(main()) == [{f"bot{i}" for i in range(BOTS)}] * BOTS
+
+
+def test_iteration_follows_a_switch_to_another_channel_port(inprocess):
+    ports = {"lobby": free_port(), "games": free_port()}
+    inprocess(*(ChannelConfig(name=name, port=port, capacity=4) for name, port in ports.items()))
+
+    async def main() -> None:
+        connection = await connect(ports["lobby"], "alice")
+        try:
+            assert (await first(connection, JoinEvent)).channel == "lobby"
+            await connection.switch("games")
+            await first(connection, SwitchEvent)
+            assert connection.port == ports["games"]
+            assert (await first(connection, JoinEvent)).channel == "games"
+        finally:
+            await connection.close()
+
+    asyncio.run(asyncio.wait_for(main(), 10))
+
+
+def test_unknown_channel_is_raised_on_the_multiplexed_port(inprocess):
+    mux = free_port()
+    inprocess(ChannelConfig(name="lobby", port=free_port(), capacity=4), mux_port=mux)
+
+    async def main() -> None:
+        with pytest.raises(UnknownChannel) as refused:
+            await connect(mux, "alice", channel="nowhere")
+        assert refused.value.channel == "nowhere"
+        connection = await connect(mux, "alice", channel="lobby")
+        try:
+            assert (await first(connection, JoinEvent)).channel == "lobby"
+        finally:
+            await connection.close()
+
+    asyncio.run(asyncio.wait_for(main(), 10))
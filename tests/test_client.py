@@ -0,0 +1,25 @@
+from __future__ import annotations
+import subprocess
+import sys
+import time
+import pytest
+from conftest import SRC
+
+
+@pytest.mark.parametrize("flags, logged", [((), "alice has left the channel."), (("--resume",), "alice lost its connection")])
+def test_a_dropped_client_keeps_its_seat_only_when_resumable(chatserver, flags, logged):
+    server = chatserver()
+    client = subprocess.Popen(
+        [sys.executable, str(SRC / "chatclient.py"), *flags, str(server.port), "alice"],
+        cwd=SRC, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        assert client.stdout is not None and "Welcome to chatclient, alice." in client.stdout.readline()
+        time.sleep(0.2)
+    finally:
+        client.kill()
+        client.wait()
+    time.sleep(0.5)
+    server.command("/shutdown")
+    assert server.wait(timeout=5) == 0
+    assert logged in server.output
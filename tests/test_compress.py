@@ -0,0 +1,83 @@
+from __future__ import annotations
+import os
+import struct
+import zlib
+import pytest
+from chatserver import ChannelConfig
+from compress import CODECS, COMPRESSED, DICTIONARY, compress_frame, decompress_body, negotiate
+from conftest import free_port, join, until
+from events import FileChunkEvent, FrameError, FrameReader, JoinEvent, MAX_FRAME_SIZE, MessageEvent, _Event
+
+CHATTY = "alice has joined the channel. " * 40
+
+
+def body(frame: bytes) -> memoryview:
+    reader = FrameReader()
+    reader.feed(frame)
+    [body] = reader.frames()
+    return body
+
+
+def compressed(body: bytes | memoryview) -> bool:
+    return bool(struct.unpack_from("!I", body)[0] & COMPRESSED)
+
+
+@pytest.mark.parametrize("codec", CODECS.values(), ids=CODECS.keys())
+def test_frames_round_trip(codec):
+    frame = _Event.frame(MessageEvent(name="alice", message=CHATTY))
+    packed = compress_frame(frame, codec)
+    assert len(packed) < len(frame) and compressed(body(packed))
+    event = _Event.deserialise(decompress_body(body(packed), codec, MAX_FRAME_SIZE))
+    assert event == MessageEvent(name="alice", message=CHATTY)
+
+
+@pytest.mark.parametrize("codec", CODECS.values(), ids=CODECS.keys())
+def test_a_frame_that_does_not_shrink_goes_out_as_it_is(codec):
+    frame = _Event.frame(FileChunkEvent(transfer=1, data=memoryview(os.urandom(2048))))
+    assert compress_frame(frame, codec) is frame
+    assert decompress_body(body(frame), codec, MAX_FRAME_SIZE) == body(frame)
+
+
+def test_negotiation_takes_the_first_known_codec():
+    assert negotiate("lz4,deflate") is CODECS["deflate"]
+    assert negotiate(",".join(CODECS)) is next(iter(CODECS.values()))
+    assert negotiate("lz4") is None and negotiate("") is None
+
+
+def test_bad_compressed_frames_are_refused():
+    deflate = CODECS["deflate"]
+    packed = body(compress_frame(_Event.frame(MessageEvent(name="alice", message=CHATTY)), deflate))
+    with pytest.raises(FrameError):
+        decompress_body(packed, None, MAX_FRAME_SIZE)
+    with pytest.raises(FrameError):
+        decompress_body(packed, deflate, 100)
+    with pytest.raises(FrameError):
+        decompress_body(bytes(packed[:4]) + b"\xff" * 20, deflate, MAX_FRAME_SIZE)
+    # a megabyte of zeros packs into a kilobyte and must still stop at the limit
+    bomb = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=DICTIONARY)
+    with pytest.raises(FrameError):
+        decompress_body(bytes(packed[:4]) + bomb.compress(bytes(1 << 20)) + bomb.flush(), deflate, 1 << 16)
+
+
+@pytest.mark.parametrize("mode", ["threaded", "eventloop"])
+def test_only_long_broadcasts_are_compressed_and_only_for_who_asked(inprocess, mode):
+    port = free_port()
+    inprocess(ChannelConfig(name="lobby", port=port, capacity=4), mode=mode)
+    plain, plain_reader, _ = join(port, "plain")
+    packed, packed_reader, agreed = join(port, "packed", compress="lz4,deflate")
+    assert agreed["compress"] == "deflate"
+    with plain, packed:
+        until(plain, plain_reader, JoinEvent)
+        until(packed, packed_reader, JoinEvent)
+        for message in ("short", CHATTY):
+            plain.sendall(_Event.frame(MessageEvent(name="plain", message=message)))
+        raw = []
+        while len(raw) < 2:
+            for frame in packed_reader.frames():
+                if not compressed(frame) and isinstance(_Event.deserialise(frame), JoinEvent):
+                    continue
+                raw.append(bytes(frame))
+            if len(raw) < 2:
+                assert packed_reader.recv_from(packed)
+    assert [compressed(frame) for frame in raw] == [False, True]
+    assert _Event.deserialise(decompress_body(raw[1], CODECS["deflate"], MAX_FRAME_SIZE)).message == CHATTY
@@ -0,0 +1,33 @@
+from __future__ import annotations
+import struct
+from socket import create_connection
+import pytest
+from events import EventType, FrameError, MessageEvent, _Event, hello, parse_accept
+
+SERVER_ONLY = [EventType.MUTE, EventType.EMPTY, EventType.RESIZE, EventType.CLOSE]
+
+
+def test_message_round_trips():
+    event = MessageEvent(name="alice", message="hi")
+    assert _Event.deserialise(_Event.frame(event)[4:]) == event
+
+
+@pytest.mark.parametrize("type", SERVER_ONLY + [999])
+def test_server_only_and_unknown_types_are_frame_errors(type):
+    with pytest.raises(FrameError):
+        _Event.deserialise(struct.pack("!I", type) + b"\0" * 16)
+
+
+@pytest.mark.parametrize("mode", ["threaded", "eventloop"])
+def test_a_client_sending_a_server_only_frame_is_disconnected(chatserver, mode):
+    server = chatserver(options=(f"mode {mode}",))
+    for i, type in enumerate(SERVER_ONLY):
+        with create_connection(("localhost", server.port), timeout=5) as sock:
+            sock.sendall(hello(f"user{i}"))
+            assert parse_accept(sock.recv(1024), offered=False) is not None
+            sock.sendall(struct.pack("!II", 4, type))
+            while sock.recv(4096):
+                pass
+    server.command("/shutdown")
+    assert server.wait(timeout=5) == 0
+    assert "Traceback" not in server.output
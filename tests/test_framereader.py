@@ -0,0 +1,66 @@
+from __future__ import annotations
+from socket import socketpair
+import threading
+import pytest
+from events import FrameError, FrameReader, MessageEvent, _Event
+
+
+def framed(*bodies: bytes) -> bytes:
+    return b"".join(len(body).to_bytes(4, "big") + body for body in bodies)
+
+
+def test_frames_split_anywhere_are_reassembled():
+    data = framed(b"first", b"", b"x" * 1000)
+    for step in (1, 3, 7, 1024):
+        reader = FrameReader()
+        bodies = []
+        for i in range(0, len(data), step):
+            reader.feed(data[i:i + step])
+            bodies += [bytes(frame) for frame in reader.frames()]
+        assert bodies == [b"first", b"", b"x" * 1000]
+
+
+def test_a_partial_frame_waits_for_the_rest():
+    reader = FrameReader()
+    reader.feed(framed(b"hello")[:6])
+    assert reader.next_frame() is None
+    reader.feed(b"llo")
+    assert bytes(reader.next_frame()) == b"hello"
+    assert reader.next_frame() is None
+
+
+def test_frames_larger_than_the_buffer_grow_it():
+    reader = FrameReader()
+    reader.feed(framed(b"kept"))
+    kept = reader.next_frame()
+    body = bytes(range(256)) * 1024
+    reader.feed(framed(body))
+    assert bytes(reader.next_frame()) == body
+    # a view handed out earlier stays valid while the buffer is replaced
+    assert bytes(kept) == b"kept"
+
+
+def test_an_oversized_length_is_a_frame_error():
+    reader = FrameReader(max_frame_size=16)
+    reader.feed((17).to_bytes(4, "big"))
+    with pytest.raises(FrameError):
+        reader.next_frame()
+
+
+def test_recv_from_reads_whole_events_off_a_socket():
+    ours, theirs = socketpair()
+    event = MessageEvent(name="alice", message="y" * 100_000)
+
+    def send() -> None:
+        with theirs:
+            theirs.sendall(_Event.frame(event) * 3)
+
+    sender = threading.Thread(target=send)
+    sender.start()
+    with ours:
+        reader = FrameReader()
+        events = []
+        while reader.recv_from(ours):
+            events += [_Event.deserialise(frame) for frame in reader.frames()]
+    sender.join()
+    assert events == [event] * 3
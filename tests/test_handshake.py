@@ -0,0 +1,51 @@
+from __future__ import annotations
+import asyncio
+from socket import create_connection
+import pytest
+from chatlib import NameTaken, connect
+from events import NAME_TAKEN, UNKNOWN_CHANNEL, accept, hello, parse_accept, refuse
+
+
+def test_accept_round_trips():
+    assert parse_accept(accept(), offered=False) == ({}, b"")
+    assert parse_accept(accept(compress="deflate", resume=""), offered=True) == ({"compress": "deflate", "resume": ""}, b"")
+    # frames may follow the answer in the same segment
+    assert parse_accept(accept() + b"\0\0\0\4abcd", offered=False) == ({}, b"\0\0\0\4abcd")
+
+
+@pytest.mark.parametrize("offered", [False, True])
+def test_refusals_are_never_accepts(offered):
+    for marker in (NAME_TAKEN, UNKNOWN_CHANNEL):
+        assert parse_accept(refuse(marker, "Yard"), offered=offered) is None
+    # an answer to an offer must carry the agreed options
+    assert parse_accept(b"Y", offered=True) is None
+
+
+def handshake(port: int, name: str) -> bytes:
+    with create_connection(("localhost", port), timeout=5) as sock:
+        sock.sendall(hello(name))
+        return sock.recv(1024)
+
+
+def test_taken_name_is_refused_on_a_channel_starting_with_y(chatserver):
+    server = chatserver(channel="Yard")
+    with create_connection(("localhost", server.port), timeout=5) as alice:
+        alice.sendall(hello("alice"))
+        assert parse_accept(alice.recv(1024), offered=False) is not None
+        assert handshake(server.port, "alice") == refuse(NAME_TAKEN, "Yard")
+
+
+@pytest.mark.parametrize("codecs", [(), ("deflate",)])
+def test_chatlib_raises_name_taken(chatserver, codecs):
+    server = chatserver(channel="Yard")
+
+    async def main():
+        first = await connect(server.port, "alice", codecs=codecs)
+        try:
+            with pytest.raises(NameTaken) as refused:
+                await connect(server.port, "alice", codecs=codecs)
+            assert refused.value.channel == "Yard"
+        finally:
+            await first.close()
+
+    asyncio.run(main())
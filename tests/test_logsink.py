@@ -0,0 +1,76 @@
+from __future__ import annotations
+import io
+import json
+import threading
+from logsink import LogSink
+
+
+class Stalled(io.StringIO):
+    # holds the writer inside its first write until released
+    def __init__(self) -> None:
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, text: str) -> int:
+        self.entered.set()
+        self.release.wait()
+        return super().write(text)
+
+
+def test_records_are_written_in_order_by_flush():
+    stream = io.StringIO()
+    sink = LogSink(stream=stream)
+    for i in range(100):
+        sink.emit(f"line {i}")
+    sink.flush()
+    assert stream.getvalue().splitlines() == [f"line {i}" for i in range(100)]
+    sink.close()
+
+
+def test_json_records_carry_their_fields():
+    stream = io.StringIO()
+    sink = LogSink(stream=stream, format="json")
+    sink.emit("alice joined", channel="lobby")
+    sink.close()
+    record = json.loads(stream.getvalue())
+    assert record["message"] == "alice joined" and record["channel"] == "lobby"
+    assert record["time"] > 0
+
+
+def test_close_writes_what_is_still_queued_and_ignores_later_records():
+    stream = io.StringIO()
+    sink = LogSink(stream=stream, flush_interval=60)
+    sink.emit("queued")
+    sink.close()
+    sink.emit("too late")
+    assert stream.getvalue() == "queued\n"
+
+
+def test_drop_policy_counts_what_it_discards():
+    stream = Stalled()
+    sink = LogSink(stream=stream, max_records=2, policy="drop", flush_interval=0)
+    sink.emit("first")
+    assert stream.entered.wait(5)
+    for i in range(5):
+        sink.emit(f"line {i}")
+    stream.release.set()
+    sink.close()
+    assert stream.getvalue().splitlines() == ["first", "line 0", "line 1", "[3 log record(s) dropped]"]
+
+
+def test_lossless_policy_waits_for_room():
+    stream = Stalled()
+    sink = LogSink(stream=stream, max_records=2, flush_interval=0)
+    sink.emit("first")
+    assert stream.entered.wait(5)
+    sink.emit("line 0")
+    sink.emit("line 1")
+    emitter = threading.Thread(target=sink.emit, args=("line 2",))
+    emitter.start()
+    emitter.join(0.2)
+    assert emitter.is_alive()
+    stream.release.set()
+    emitter.join(5)
+    sink.close()
+    assert stream.getvalue().splitlines() == ["first", "line 0", "line 1", "line 2"]
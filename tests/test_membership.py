@@ -0,0 +1,131 @@
+from __future__ import annotations
+from socket import SHUT_RDWR, SO_LINGER, SOL_SOCKET
+import struct
+import threading
+import pytest
+from chatserver import ChannelConfig, ChannelServer
+from conftest import eventually, free_port, join, until
+from events import JoinEvent, MessageEvent, QuitEvent, SwitchEvent, _Event
+
+SPEAKERS = 2
+MESSAGES = 300
+CHURNERS = 8
+ROUNDS = 12
+CAPACITY = 6
+
+
+def consistent(channel: ChannelServer) -> str | None:
+    # what is wrong with the channel's seats right now, if anything
+    with channel._seats_lock:
+        clients, slices = channel._clients, channel._slices
+    seated = {id(c) for c in clients.values()}
+    sliced = [id(c) for members in slices.values() for c in members]
+    if len(sliced) != len(set(sliced)) or set(sliced) != seated:
+        return f"{channel.config.name}: {len(seated)} seated but {len(sliced)} in slices"
+    if len(seated) > channel.config.capacity:
+        return f"{channel.config.name}: {len(seated)} seated of {channel.config.capacity}"
+    return None
+
+
+def speak(port: int, name: str, ready: threading.Barrier, heard: dict[str, int]) -> None:
+    # stays seated throughout, talking and counting what the other speakers said
+    sock, reader, _ = join(port, name)
+    with sock:
+        until(sock, reader, JoinEvent)
+        expected = (SPEAKERS - 1) * MESSAGES
+
+        def listen() -> None:
+            while heard[name] < expected:
+                for frame in reader.frames():
+                    event = _Event.deserialise(frame)
+                    if isinstance(event, MessageEvent) and event.name.startswith("speaker") and event.name != name:
+                        heard[name] += 1
+                if heard[name] < expected and not reader.recv_from(sock):
+                    break
+
+        listener = threading.Thread(target=listen)
+        listener.start()
+        ready.wait()
+        for i in range(MESSAGES):
+            sock.sendall(_Event.frame(MessageEvent(name=name, message=f"{name} {i}")))
+        listener.join()
+        sock.sendall(_Event.frame(QuitEvent(name=name)))
+        until(sock, reader, QuitEvent)
+
+
+def churn(ports: dict[str, int], name: str, ready: threading.Barrier) -> None:
+    # each round leaves "one" a different way: quitting, dropping, dropping and resuming,
+    # or switching to "two" and quitting there
+    ready.wait()
+    for i in range(ROUNDS):
+        match i % 4:
+            case 0:
+                sock, reader, _ = join(ports["one"], name)
+                with sock:
+                    sock.sendall(_Event.frame(QuitEvent(name=name)))
+                    until(sock, reader, QuitEvent)
+            case 1:
+                sock, _, _ = join(ports["one"], name)
+                sock.shutdown(SHUT_RDWR)
+                sock.close()
+            case 2:
+                sock, reader, agreed = join(ports["one"], name, resume="")
+                until(sock, reader, JoinEvent)
+                sock.setsockopt(SOL_SOCKET, SO_LINGER, struct.pack("ii", 1, 0))
+                sock.close()
+                # refused until the server has parked the dropped session
+                sock, reader, _ = join(ports["one"], name, resume=agreed["resume"])
+                with sock:
+                    until(sock, reader, JoinEvent)
+                    sock.sendall(_Event.frame(QuitEvent(name=name)))
+                    until(sock, reader, QuitEvent)
+            case 3:
+                sock, reader, _ = join(ports["one"], name)
+                with sock:
+                    until(sock, reader, JoinEvent)
+                    sock.sendall(_Event.frame(SwitchEvent(name=name, channel="two")))
+                    until(sock, reader, SwitchEvent)
+                sock, reader, _ = join(ports["two"], name)
+                with sock:
+                    sock.sendall(_Event.frame(QuitEvent(name=name)))
+                    until(sock, reader, QuitEvent)
+
+
+@pytest.mark.parametrize("mode", ["threaded", "eventloop"])
+def test_seats_and_slices_agree_through_churn(inprocess, monkeypatch, mode):
+    failures: list[str] = []
+    # a failure on a server thread would otherwise only be printed
+    monkeypatch.setattr(threading, "excepthook", lambda hook: failures.append(f"{hook.thread.name}: {hook.exc_type.__name__}: {hook.exc_value}"))
+    ports = {"one": free_port(), "two": free_port()}
+    server = inprocess(
+        ChannelConfig(name="one", port=ports["one"], capacity=CAPACITY, large=True),
+        ChannelConfig(name="two", port=ports["two"], capacity=CHURNERS, large=True),
+        mode=mode, queue_frames=1 << 16, resume_grace=30,
+    )
+    done = threading.Event()
+
+    def check() -> None:
+        while not done.is_set():
+            failures.extend(problem for channel in server._channels if (problem := consistent(channel)))
+
+    checker = threading.Thread(target=check)
+    checker.start()
+    speakers = [f"speaker{i}" for i in range(SPEAKERS)]
+    heard = dict.fromkeys(speakers, 0)
+    ready = threading.Barrier(SPEAKERS + CHURNERS)
+    threads = [threading.Thread(target=speak, args=(ports["one"], name, ready, heard)) for name in speakers]
+    threads += [threading.Thread(target=churn, args=(ports, f"churner{i}", ready)) for i in range(CHURNERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # once everyone has gone, nothing holds a seat, a name or a slice
+    channels = server._channels
+    assert eventually(lambda: not any(c._clients or len(c._waitlist) or server.registry.names(c.config.name) for c in channels))
+    done.set()
+    checker.join()
+    assert not server._parked
+    assert all(not members for c in channels for members in c._slices.values())
+    assert heard == dict.fromkeys(speakers, (SPEAKERS - 1) * MESSAGES)
+    assert failures == []
@@ -0,0 +1,64 @@
+from __future__ import annotations
+import os
+import struct
+import messagelog
+from messagelog import MessageLog
+
+
+def frame(text: str) -> bytes:
+    body = text.encode()
+    return struct.pack("!I", len(body)) + body
+
+
+def texts(frames) -> list[str]:
+    return [bytes(f[4:]).decode() for f in frames]
+
+
+def test_tail_reads_across_segment_rollover(tmp_path):
+    log = MessageLog(directory=str(tmp_path), segment_bytes=64, fsync_interval=0)
+    for i in range(20):
+        log.append(frame(f"message {i}"))
+    assert len(log._segments) > 1 and len(log) == 20
+    assert texts(log.tail(15)) == [f"message {i}" for i in range(5, 20)]
+    assert texts(log.tail(100)) == [f"message {i}" for i in range(20)]
+    log.close()
+
+
+def test_since_picks_by_append_time_and_keeps_the_newest(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(messagelog.time, "time", lambda: now[0])
+    log = MessageLog(directory=str(tmp_path), segment_bytes=64)
+    for i in range(20):
+        now[0] = 1000.0 + i
+        log.append(frame(f"message {i}"))
+    assert texts(log.since(1012, 100)) == [f"message {i}" for i in range(12, 20)]
+    assert texts(log.since(1012, 3)) == ["message 17", "message 18", "message 19"]
+    assert texts(log.since(0, 100)) == [f"message {i}" for i in range(20)]
+    assert log.since(2000, 100) == []
+    log.close()
+
+
+def test_reopening_recovers_and_cuts_a_torn_record(tmp_path):
+    log = MessageLog(directory=str(tmp_path), segment_bytes=64, fsync_interval=0)
+    for i in range(10):
+        log.append(frame(f"message {i}"))
+    log.close()
+    last = sorted(name for name in os.listdir(tmp_path) if name.endswith(".log"))[-1]
+    with open(tmp_path / last, "ab") as torn:
+        torn.write(struct.pack("<Q", 0) + frame("never finished")[:-3])
+
+    log = MessageLog(directory=str(tmp_path), segment_bytes=64, fsync_interval=0)
+    assert len(log) == 10
+    log.append(frame("message 10"))
+    assert texts(log.tail(11)) == [f"message {i}" for i in range(11)]
+    log.close()
+
+
+def test_views_outlive_a_later_rollover(tmp_path):
+    log = MessageLog(directory=str(tmp_path), segment_bytes=64, fsync_interval=0.01)
+    log.append(frame("kept"))
+    held = log.tail(1)
+    for i in range(20):
+        log.append(frame(f"message {i}"))
+    assert texts(held) == ["kept"]
+    log.close()
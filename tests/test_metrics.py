@@ -0,0 +1,26 @@
+from __future__ import annotations
+import threading
+from metrics import Metrics
+
+
+def test_an_exited_thread_leaves_its_counts_but_not_its_cell():
+    metrics = Metrics()
+    counter = metrics.counter("chat_test_total", "Test.")
+    histogram = metrics.histogram("chat_test_seconds", "Test.")
+
+    def record() -> None:
+        counter.inc(2)
+        histogram.observe(0.001)
+
+    threads = [threading.Thread(target=record) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # nothing has collected yet, and the exited threads hold nothing
+    assert not counter._values._cells and not histogram._values._cells
+    counter.inc()
+    assert counter.value == 101
+    assert len(counter._values._cells) == 1
+    *_, count = histogram.collect()
+    assert count.value == 50
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import threading
+import time
+from outbound import OutboundQueue
+
+
+def test_drop_oldest_makes_room_for_the_newest():
+    queue = OutboundQueue(max_frames=3, max_bytes=1024)
+    for frame in (b"a", b"b", b"c", b"d"):
+        assert queue.put(frame)
+    assert queue.dropped == 1
+    assert queue.take() == [b"b", b"c", b"d"]
+
+
+def test_drop_oldest_keeps_a_partly_written_head():
+    queue = OutboundQueue(max_frames=2, max_bytes=1024)
+    queue.put(b"head")
+    queue.put(b"next")
+    assert queue.heads() == [b"head", b"next"]
+    queue.consume(2)
+    assert queue.put(b"last")
+    # the rest of the head still goes out, so what was dropped is behind it
+    assert [bytes(frame) for frame in queue.heads()] == [b"ad", b"last"]
+
+
+def test_the_byte_limit_counts_but_one_oversized_frame_still_fits():
+    queue = OutboundQueue(max_frames=100, max_bytes=10, policy="disconnect")
+    assert queue.put(b"x" * 50)
+    assert not queue.put(b"y")
+    assert queue.take() == [b"x" * 50]
+    assert queue.put(b"y" * 6)
+    assert queue.nbytes == 6
+
+
+def test_disconnect_refuses_a_frame_it_has_no_room_for():
+    queue = OutboundQueue(max_frames=1, max_bytes=1024, policy="disconnect")
+    assert queue.put(b"a")
+    assert not queue.put(b"b")
+    assert queue.depth == 1
+
+
+def test_block_waits_for_the_consumer():
+    queue = OutboundQueue(max_frames=1, max_bytes=1024, policy="block", timeout=5)
+    queue.put(b"a")
+    taker = threading.Timer(0.05, queue.take)
+    taker.start()
+    started = time.monotonic()
+    assert queue.put(b"b")
+    assert time.monotonic() - started >= 0.04
+    taker.join()
+    assert queue.take() == [b"b"]
+
+
+def test_block_gives_up_after_its_timeout():
+    queue = OutboundQueue(max_frames=1, max_bytes=1024, policy="block", timeout=0.05)
+    queue.put(b"a")
+    assert not queue.put(b"b")
+
+
+def test_frames_after_close_are_discarded_and_take_drains_first():
+    queue = OutboundQueue(max_frames=4, max_bytes=1024)
+    queue.put(b"a")
+    queue.close()
+    assert queue.put(b"b")
+    assert queue.take() == [b"a"]
+    assert queue.take() is None
+
+
+def test_file_chunks_stop_at_the_bulk_cap():
+    queue = OutboundQueue(max_frames=4, max_bytes=64, max_bulk_bytes=10)
+    assert queue.put_bulk(b"x" * 6)
+    assert not queue.put_bulk(b"x" * 6)
+    # chat frames have their own limits
+    assert queue.put(b"y" * 6)
+    assert queue.take() == [b"y" * 6]
+    assert queue.take() == [b"x" * 6]
+    assert queue.put_bulk(b"x" * 10)
+
+
+def test_chat_frames_go_ahead_of_file_chunks():
+    queue = OutboundQueue(max_frames=4, max_bytes=1024, max_bulk_bytes=1024)
+    queue.put_bulk(b"chunk1")
+    queue.put_bulk(b"chunk2")
+    queue.put(b"chat")
+    assert queue.take() == [b"chat"]
+    assert queue.take() == [b"chunk1", b"chunk2"]
+
+
+def test_a_partly_written_chunk_finishes_before_chat_frames():
+    queue = OutboundQueue(max_frames=4, max_bytes=1024, max_bulk_bytes=1024)
+    queue.put_bulk(b"chunk")
+    queue.consume(2)
+    queue.put(b"chat")
+    # the rest of the chunk first, or the frame stream would be corrupt
+    assert [bytes(frame) for frame in queue.heads()] == [b"unk"]
+    queue.consume(3)
+    assert queue.heads() == [b"chat"]
+
+
+def test_file_chunks_are_never_dropped_for_chat():
+    queue = OutboundQueue(max_frames=1, max_bytes=1024, max_bulk_bytes=1024)
+    queue.put_bulk(b"chunk")
+    queue.put(b"a")
+    queue.put(b"b")
+    assert queue.dropped == 1
+    assert queue.depth == 2 and queue.nbytes == len(b"chunk") + 1
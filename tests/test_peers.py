@@ -0,0 +1,15 @@
+from __future__ import annotations
+from chatserver import PeerConfig, ServerConfig, peer_allowed
+
+
+def test_links_are_taken_from_this_host_and_listed_peers_only():
+    peers = [PeerConfig(host="192.0.2.7", port=6000)]
+    assert peer_allowed("127.0.0.1", [])
+    assert peer_allowed("::1", [])
+    assert peer_allowed("192.0.2.7", peers)
+    assert not peer_allowed("198.51.100.1", peers)
+    assert not peer_allowed("192.0.2.7", [])
+
+
+def test_the_peer_port_listens_on_loopback_by_default():
+    assert ServerConfig().peer_bind == "127.0.0.1"
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import pytest
+from chatserver import ChannelConfig
+from conftest import free_port, join, until
+from events import JoinEvent, MessageEvent, QuitEvent, _Event
+from ratelimit import RateLimit, TokenBucket
+
+
+def test_a_bucket_spends_its_burst_then_refills_at_its_rate():
+    bucket = TokenBucket(rate=2, burst=3)
+    start = bucket._stamp
+    assert [bucket.take(now=start) for _ in range(4)] == [True, True, True, False]
+    assert bucket.take(now=start + 0.5)
+    assert not bucket.take(now=start + 0.5)
+    # an idle bucket saves up no more than its burst
+    assert [bucket.take(now=start + 100) for _ in range(4)] == [True, True, True, False]
+
+
+def test_a_refused_take_spends_nothing():
+    bucket = TokenBucket(rate=10, burst=10)
+    start = bucket._stamp
+    assert not bucket.take(11, now=start)
+    assert bucket.take(10, now=start)
+
+
+def test_limits_are_built_only_for_the_budgets_asked_for():
+    assert RateLimit.of(0, 0, 2) is None
+    limit = RateLimit.of(0.2, 0, 2)
+    assert limit is not None and limit.bytes is None
+    # a slow rate still lets one message through
+    assert limit.messages is not None and limit.messages.burst == 1.0
+
+
+def test_either_budget_can_refuse_a_message():
+    limit = RateLimit.of(10, 100, 1)
+    assert limit is not None and limit.messages is not None
+    # late enough that both buckets are full
+    now = limit.messages._stamp + 60
+    assert limit.allow(100, now)
+    assert not limit.allow(1, now)
+    assert [limit.allow(0, now) for _ in range(9)] == [True] * 8 + [False]
+
+
+def speak(port: int, count: int) -> tuple[list[str], list[str]]:
+    # alice sends `count` messages as fast as she can; returns what bob heard from her,
+    # then the notices alice was sent
+    bob, bob_reader, _ = join(port, "bob")
+    alice, alice_reader, _ = join(port, "alice")
+    with alice, bob:
+        until(bob, bob_reader, JoinEvent)
+        until(alice, alice_reader, JoinEvent)
+        for i in range(count):
+            alice.sendall(_Event.frame(MessageEvent(name="alice", message=f"{i}")))
+        # she is told once she goes over, whichever the policy
+        while (event := until(alice, alice_reader, MessageEvent)).name != "Server Message":
+            pass
+        notices = [event.message]
+        alice.sendall(_Event.frame(QuitEvent(name="alice")))
+        while not isinstance(event := until(alice, alice_reader, (MessageEvent, QuitEvent)), QuitEvent):
+            if event.name == "Server Message":
+                notices.append(event.message)
+        heard = []
+        # her departure is announced after everything she sent
+        while (event := until(bob, bob_reader, MessageEvent)).message != "alice has left the channel.":
+            if event.name == "alice":
+                heard.append(event.message)
+    return heard, notices
+
+
+@pytest.mark.parametrize("mode", ["threaded", "eventloop"])
+def test_a_client_over_its_limit_has_the_excess_dropped(inprocess, mode):
+    port = free_port()
+    inprocess(ChannelConfig(name="lobby", port=port, capacity=4), mode=mode, rate_messages=1, rate_burst=3)
+    heard, notices = speak(port, 20)
+    assert heard == ["0", "1", "2"]
+    # one notice per burst of refusals, not one per message
+    assert notices == ["You are sending too fast; your messages are being dropped."]
+
+
+def test_a_client_over_its_limit_can_be_muted(inprocess):
+    port = free_port()
+    inprocess(ChannelConfig(name="lobby", port=port, capacity=4), rate_messages=1, rate_burst=3, rate_policy="mute", rate_mute=30)
+    heard, notices = speak(port, 20)
+    assert heard == ["0", "1", "2"]
+    assert notices == ["You have been muted for 30 seconds."]
+
+
+def test_a_channel_limit_holds_across_senders(inprocess):
+    port = free_port()
+    inprocess(ChannelConfig(name="lobby", port=port, capacity=4), channel_rate_messages=1, rate_burst=5)
+    heard, _ = speak(port, 20)
+    assert heard == ["0", "1", "2", "3", "4"]
@@ -0,0 +1,48 @@
+from __future__ import annotations
+from registry import Registry
+
+
+def registry() -> Registry[str, object]:
+    names: Registry[str, object] = Registry()
+    names.add_channel("lobby", "lobby channel")
+    return names
+
+
+def test_a_name_is_held_by_whoever_reserved_it_first():
+    names, alice, impostor = registry(), object(), object()
+    assert names.reserve("lobby", "alice", alice)
+    assert not names.reserve("lobby", "alice", impostor)
+    assert names.holder("lobby", "alice") is alice
+    assert names.names("lobby") == ["alice"]
+
+
+def test_names_are_per_channel_and_unknown_channels_refuse():
+    names = registry()
+    names.add_channel("games", "games channel")
+    assert names.reserve("lobby", "alice", object())
+    assert names.reserve("games", "alice", object())
+    assert not names.reserve("nowhere", "alice", object())
+    assert names.channel("games") == "games channel" and names.channel("nowhere") is None
+
+
+def test_only_the_holder_can_release_or_hand_on_a_name():
+    names, alice, stale, successor = registry(), object(), object(), object()
+    names.reserve("lobby", "alice", alice)
+    names.release("lobby", "alice", stale)
+    assert not names.replace("lobby", "alice", stale, successor)
+    assert names.holder("lobby", "alice") is alice
+    assert names.replace("lobby", "alice", alice, successor)
+    # the old holder's late release must not free the successor's name
+    names.release("lobby", "alice", alice)
+    assert names.holder("lobby", "alice") is successor
+    names.release("lobby", "alice", successor)
+    assert names.names("lobby") == []
+
+
+def test_a_removed_channel_forgets_its_names():
+    names, alice = registry(), object()
+    names.reserve("lobby", "alice", alice)
+    names.remove_channel("lobby")
+    names.release("lobby", "alice", alice)
+    assert names.channel("lobby") is None and names.names("lobby") == []
+    assert not names.reserve("lobby", "bob", object())
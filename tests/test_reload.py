@@ -0,0 +1,67 @@
+from __future__ import annotations
+import signal
+from socket import create_connection
+from conftest import eventually, free_port, join, until
+from chatserver import ChannelConfig
+from events import JoinEvent, KickEvent, MessageEvent, SwitchEvent
+
+
+def test_a_removed_channel_moves_its_users_and_an_added_one_opens(inprocess, tmp_path):
+    ports = {"lobby": free_port(), "games": free_port(), "arcade": free_port()}
+    server = inprocess(
+        ChannelConfig(name="lobby", port=ports["lobby"], capacity=4),
+        ChannelConfig(name="games", port=ports["games"], capacity=4),
+    )
+    alice, reader, _ = join(ports["lobby"], "alice")
+    with alice:
+        until(alice, reader, JoinEvent)
+        server.config_path = str(tmp_path / "reloaded.cfg")
+        (tmp_path / "reloaded.cfg").write_text(f"channel games {ports['games']} 4\nchannel arcade {ports['arcade']} 2\n")
+        server.reload()
+        assert until(alice, reader, SwitchEvent).channel == str(ports["games"])
+    assert [channel.config.name for channel in server._channels] == ["games", "arcade"]
+    # the closed channel lets go of its name on its own thread
+    assert eventually(lambda: server.find_channel("lobby") is None)
+    bob, reader, _ = join(ports["arcade"], "bob")
+    with bob:
+        assert until(bob, reader, JoinEvent).channel == "arcade"
+
+
+def test_a_moved_user_whose_name_is_taken_is_kicked(inprocess, tmp_path):
+    ports = {"lobby": free_port(), "games": free_port()}
+    server = inprocess(
+        ChannelConfig(name="lobby", port=ports["lobby"], capacity=4),
+        ChannelConfig(name="games", port=ports["games"], capacity=4),
+    )
+    first, first_reader, _ = join(ports["lobby"], "alice")
+    second, second_reader, _ = join(ports["games"], "alice")
+    with first, second:
+        until(first, first_reader, JoinEvent)
+        until(second, second_reader, JoinEvent)
+        server.config_path = str(tmp_path / "reloaded.cfg")
+        (tmp_path / "reloaded.cfg").write_text(f"channel games {ports['games']} 4\n")
+        server.reload()
+        assert until(first, first_reader, MessageEvent).message == 'Channel "lobby" has been closed.'
+        until(first, first_reader, KickEvent)
+
+
+def listening(port: int) -> bool:
+    try:
+        create_connection(("localhost", port), timeout=1).close()
+    except OSError:
+        return False
+    return True
+
+
+def test_sighup_reloads_and_a_broken_file_changes_nothing(chatserver):
+    server = chatserver(channel="lobby")
+    added = free_port()
+    server.config.write_text(f"channel lobby {server.port} 8\nchannel arcade {added} 3\n")
+    server.process.send_signal(signal.SIGHUP)
+    assert eventually(lambda: listening(added))
+    server.config.write_text("channel lobby not-a-port 8\n")
+    server.command("/reload")
+    server.command("/shutdown")
+    assert server.wait(timeout=5) == 0
+    assert "Configuration reloaded: 1 channel(s) added, 0 removed, 0 resized." in server.output
+    assert f'Unable to reload "{server.config}"; the channels are unchanged.' in server.output
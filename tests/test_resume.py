@@ -0,0 +1,98 @@
+from __future__ import annotations
+from socket import SO_LINGER, SOL_SOCKET, socket
+import struct
+import threading
+import time
+import pytest
+from chatserver import ChannelConfig, ChannelServer
+from conftest import eventually, free_port, join
+from events import JoinEvent, MessageEvent, _Event, QuitEvent
+
+MODES = ["threaded", "eventloop"]
+
+
+def drop(sock: socket) -> None:
+    # a reset rather than a goodbye, as when the network fails
+    sock.setsockopt(SOL_SOCKET, SO_LINGER, struct.pack("ii", 1, 0))
+    sock.close()
+
+
+def sliced(channel: ChannelServer) -> list[str]:
+    return sorted(c.name for members in channel._slices.values() for c in members)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_a_resumed_session_replaces_its_parked_one_in_a_large_channel(inprocess, mode):
+    port = free_port()
+    server = inprocess(ChannelConfig(name="big", port=port, capacity=100, large=True), mode=mode, resume_grace=30)
+    channel = server._channels[0]
+    sock, _, agreed = join(port, "alice", resume="")
+    token = agreed["resume"]
+    assert eventually(lambda: "alice" in channel._clients)
+    drop(sock)
+    assert eventually(lambda: token in server._parked)
+    sock, _, _ = join(port, "alice", resume=token)
+    with sock:
+        # the slice holds the new handler alone, not the parked one beside it
+        assert eventually(lambda: not server._parked and channel._clients["alice"].running)
+        assert eventually(lambda: [c for members in channel._slices.values() for c in members] == [channel._clients["alice"]])
+        sock.sendall(_Event.frame(QuitEvent(name="alice")))
+        assert eventually(lambda: not channel._clients)
+        assert sliced(channel) == []
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_a_resumed_session_gets_each_missed_broadcast_once(inprocess, mode):
+    port = free_port()
+    server = inprocess(ChannelConfig(name="general", port=port, capacity=8), mode=mode, resume_grace=30, resume_frames=1 << 16, queue_frames=1 << 16)
+    channel = server._channels[0]
+    sock, _, agreed = join(port, "alice", resume="")
+    token = agreed["resume"]
+    bob, _, _ = join(port, "bob")
+    assert eventually(lambda: len(channel._clients) == 2)
+    resumed = threading.Event()
+    seat = channel._seat
+
+    def slow_seat(*args):
+        # as if preempted just after the seat changed, with bob still talking
+        taken = seat(*args)
+        time.sleep(0.05)
+        return taken
+
+    channel._seat = slow_seat
+
+    def speak() -> None:
+        # numbered messages throughout alice's return, and a while after it
+        i = 0
+        while not resumed.wait(0 if i % 50 else 0.001):
+            bob.sendall(_Event.frame(MessageEvent(name="bob", message=str(i))))
+            i += 1
+        for j in range(i, i + 200):
+            bob.sendall(_Event.frame(MessageEvent(name="bob", message=str(j))))
+        bob.sendall(_Event.frame(MessageEvent(name="bob", message="end")))
+
+    speaker = threading.Thread(target=speak)
+    speaker.start()
+    drop(sock)
+    assert eventually(lambda: token in server._parked)
+    sock, reader, _ = join(port, "alice", resume=token)
+    heard: list[int] = []
+    with sock, bob:
+        while True:
+            for frame in reader.frames():
+                match _Event.deserialise(frame):
+                    case JoinEvent():
+                        resumed.set()
+                    case MessageEvent(name="bob", message="end"):
+                        break
+                    case MessageEvent(name="bob", message=message):
+                        heard.append(int(message))
+                    case MessageEvent(name="Server Message", message=message):
+                        assert "missed" not in message
+            else:
+                assert reader.recv_from(sock)
+                continue
+            break
+        speaker.join()
+    assert len(heard) == len(set(heard))
+    assert set(heard) == set(range(min(heard), max(heard) + 1))
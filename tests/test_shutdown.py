@@ -0,0 +1,49 @@
+from __future__ import annotations
+from socket import create_connection, socket
+import time
+import pytest
+from events import hello, parse_accept
+
+MODES = ["threaded", "eventloop"]
+
+
+def joined(port: int, name: str) -> socket:
+    sock = create_connection(("localhost", port), timeout=5)
+    sock.sendall(hello(name))
+    assert parse_accept(sock.recv(1024), offered=False) is not None
+    return sock
+
+
+def closed_by_server(sock: socket) -> bool:
+    # reads whatever the server sent until it hangs up
+    try:
+        while sock.recv(4096):
+            pass
+    except ConnectionResetError:
+        pass
+    return True
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_shutdown_drops_a_connection_that_never_sends_its_name(chatserver, mode):
+    # the handshake timeout is far longer than the test waits, so it cannot be what ends it
+    server = chatserver(options=(f"mode {mode}", "handshake_timeout 60"))
+    with create_connection(("localhost", server.port), timeout=5) as silent:
+        time.sleep(0.2)
+        server.command("/shutdown")
+        assert server.wait(timeout=5) == 0
+        assert closed_by_server(silent)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_shutdown_drops_clients_that_never_hang_up(chatserver, mode):
+    server = chatserver(options=(f"mode {mode}",))
+    # one stays seated and ignores the shutdown notice, the other was kicked but never left
+    seated, kicked = joined(server.port, "alice"), joined(server.port, "bob")
+    with seated, kicked:
+        server.command("/kick general bob")
+        time.sleep(0.2)
+        server.command("/shutdown")
+        assert server.wait(timeout=5) == 0
+        assert closed_by_server(seated) and closed_by_server(kicked)
+    assert "Server shuts down." in server.output
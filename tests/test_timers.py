@@ -0,0 +1,24 @@
+from __future__ import annotations
+from socket import create_connection
+import time
+import pytest
+from events import hello, parse_accept
+
+
+@pytest.mark.parametrize("mode", ["threaded", "eventloop"])
+def test_a_mute_expires_on_the_channel(chatserver, mode):
+    server = chatserver(options=(f"mode {mode}",))
+    with create_connection(("localhost", server.port), timeout=5) as alice:
+        alice.sendall(hello("alice"))
+        assert (accepted := parse_accept(alice.recv(1024), offered=False)) is not None
+        time.sleep(0.2)
+        server.command("/mute general alice 1")
+        # the notice is a message frame, so its text shows up in the raw stream
+        received, deadline = accepted[1], time.monotonic() + 5
+        while b"You are no longer muted." not in received and time.monotonic() < deadline:
+            received += alice.recv(4096)
+        assert b"You have been muted for 1 seconds." in received
+        assert b"You are no longer muted." in received
+    server.command("/shutdown")
+    assert server.wait(timeout=5) == 0
+    assert "Traceback" not in server.output
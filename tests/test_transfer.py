@@ -0,0 +1,41 @@
+from __future__ import annotations
+from socket import create_connection, socket
+import pytest
+from events import FILE_CHUNK_SIZE, FILE_WINDOW, TRANSFER_ABORTED, FileAckEvent, JoinEvent, FileChunkEvent, FrameReader, SendEvent, _Event, hello, parse_accept
+
+
+def join(port: int, name: str) -> tuple[socket, FrameReader]:
+    sock = create_connection(("localhost", port), timeout=5)
+    sock.sendall(hello(name))
+    accepted = parse_accept(sock.recv(1024), offered=False)
+    assert accepted is not None
+    reader = FrameReader()
+    reader.feed(accepted[1])
+    until(sock, reader, JoinEvent)
+    return sock, reader
+
+
+def until(sock: socket, reader: FrameReader, wanted: type) -> _Event:
+    while True:
+        for frame in reader.frames():
+            if isinstance(event := _Event.deserialise(frame), wanted):
+                return event
+        assert reader.recv_from(sock)
+
+
+@pytest.mark.parametrize("mode", ["threaded", "eventloop"])
+def test_a_sender_ignoring_acks_is_cut_off_past_the_window(chatserver, mode):
+    server = chatserver(options=(f"mode {mode}",))
+    (alice, alice_reader), (bob, _) = join(server.port, "alice"), join(server.port, "bob")
+    with alice, bob:
+        size = 4 * FILE_WINDOW
+        alice.sendall(_Event.frame(SendEvent(name="alice", target="bob", file="big", size=size)))
+        offer = until(alice, alice_reader, SendEvent)
+        assert offer.transfer
+        # bob never reads or acknowledges, and alice keeps sending regardless
+        chunk = b"x" * FILE_CHUNK_SIZE
+        for _ in range(FILE_WINDOW // FILE_CHUNK_SIZE + 2):
+            alice.sendall(_Event.frame(FileChunkEvent(transfer=offer.transfer, data=chunk)))
+        assert until(alice, alice_reader, FileAckEvent) == FileAckEvent(transfer=offer.transfer, received=TRANSFER_ABORTED)
+    server.command("/shutdown")
+    assert server.wait(timeout=5) == 0
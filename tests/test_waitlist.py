@@ -0,0 +1,77 @@
+from __future__ import annotations
+import threading
+import time
+import pytest
+from chatserver import ChannelConfig
+from conftest import eventually, free_port, join, until
+from events import QuitEvent, _Event
+from waitlist import Waitlist
+
+
+def test_clients_are_seated_in_arrival_order():
+    waitlist: Waitlist[str] = Waitlist()
+    assert [waitlist.append(name, name.upper()) for name in ("a", "b", "c")] == [0, 1, 2]
+    assert "b" in waitlist and waitlist.get("b") == "B" and len(waitlist) == 3
+    assert waitlist.popleft() == "A"
+    assert list(waitlist) == ["B", "C"]
+
+
+def test_anyone_can_leave_and_a_missing_name_is_ignored():
+    waitlist: Waitlist[str] = Waitlist()
+    for name in ("a", "b", "c"):
+        waitlist.append(name, name)
+    assert waitlist.remove("b") == "b"
+    assert waitlist.remove("b") is None
+    assert list(waitlist) == ["a", "c"]
+
+
+def test_each_client_hears_once_however_many_left_ahead():
+    waitlist: Waitlist[str] = Waitlist()
+    for name in ("a", "b", "c", "d"):
+        waitlist.append(name, name)
+    waitlist.popleft()
+    waitlist.remove("b")
+    assert list(waitlist.moved()) == [("c", 0), ("d", 1)]
+    # told already, so nothing more until someone else moves
+    assert list(waitlist.moved()) == []
+    waitlist.remove("c")
+    assert list(waitlist.moved()) == [("d", 0)]
+
+
+@pytest.mark.parametrize("mode", ["threaded", "eventloop"])
+def test_concurrent_leaves_never_overfill_the_channel(inprocess, monkeypatch, mode):
+    failures: list[str] = []
+    # a failure on a server thread would otherwise only be printed
+    monkeypatch.setattr(threading, "excepthook", lambda hook: failures.append(f"{hook.thread.name}: {hook.exc_type.__name__}: {hook.exc_value}"))
+    port = free_port()
+    server = inprocess(ChannelConfig(name="small", port=port, capacity=2), mode=mode, resume_grace=0)
+    channel = server._channels[0]
+    seat, join_ = channel._seat, channel._join
+
+    def checked_seat(client, parked=None) -> None:
+        seat(client, parked)
+        if (seated := len(channel._clients)) > 2:
+            failures.append(f"{seated} seated in a channel of 2")
+
+    def slow_join(client) -> None:
+        # as if preempted between deciding on the seat and taking it
+        time.sleep(0.001)
+        join_(client)
+
+    channel._seat, channel._join = checked_seat, slow_join
+
+    def churn(name: str) -> None:
+        # quits seated or still queued, so departures free seats from both sides at once
+        for _ in range(40):
+            sock, reader, _ = join(port, name)
+            with sock:
+                sock.sendall(_Event.frame(QuitEvent(name=name)))
+                until(sock, reader, QuitEvent)
+
+    churners = [threading.Thread(target=churn, args=(f"churner{i}",)) for i in range(8)]
+    for thread in churners:
+        thread.start()
+    for thread in churners:
+        thread.join()
+    assert eventually(lambda: not channel._clients and not len(channel._waitlist) and not server.registry.names("small"))
+    assert failures == []